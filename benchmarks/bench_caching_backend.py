@@ -0,0 +1,78 @@
+"""
+Benchmark CachingBackend in front of a FilesystemBackend
+
+Replays an agent-like workload over a directory of paper texts: most calls
+re-read a small working set of files, list their directory or grep it, and
+an occasional edit invalidates what it touches. Compares the wrapped and
+the bare backend, and reports the hit rate of the cache.
+
+Run with: uv run python benchmarks/bench_caching_backend.py --calls 5000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from deepagents.backends import FilesystemBackend
+
+from src.backends.cache import ByteLRU, CachingBackend
+
+
+def workload(backend, calls: int, files: int, seed: int = 0):
+    rng = random.Random(seed)
+    hot = [f"/papers/p{i}.txt" for i in range(8)]
+    for _ in range(calls):
+        op = rng.random()
+        if op < 0.7:
+            path = (
+                rng.choice(hot)
+                if rng.random() < 0.9
+                else f"/papers/p{rng.randrange(files)}.txt"
+            )
+            backend.read(path)
+        elif op < 0.85:
+            backend.ls_info("/papers")
+        elif op < 0.98:
+            backend.grep_raw("phase 7$", "/papers")
+        else:
+            path = rng.choice(hot)
+            backend.edit(path, "cubic", "cubic", replace_all=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--cache-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    disk = FilesystemBackend(root_dir=tmp.name, virtual_mode=True)
+    line = "the lattice parameter of the cubic phase was refined\n"
+    disk.upload_files(
+        [
+            (f"/papers/p{i}.txt", (line * 200 + f"phase {i % 50}\n").encode())
+            for i in range(args.files)
+        ]
+    )
+    cached = CachingBackend(disk, ByteLRU(args.cache_mb * 1024 * 1024))
+
+    print(f"{'backend':>8} {'per call (us)':>14} {'hit rate':>9}")
+    for name, backend in (("bare", disk), ("cached", cached)):
+        t0 = time.perf_counter()
+        workload(backend, args.calls, args.files)
+        cost = (time.perf_counter() - t0) / args.calls * 1e6
+        rate = f"{cached.stats()['hit_rate']:.1%}" if backend is cached else "-"
+        print(f"{name:>8} {cost:>14.1f} {rate:>9}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark the per tool call overhead of resolving the CustomBackend
+
+Resolves the backend for many tool calls, as the filesystem middleware does
+on every invocation, and runs a cheap state read through it. 'fresh' builds
+the composite, state, memories and artifacts backends for each call, as before
+pooling. 'pooled' reuses the composite of the calling thread and rebinds its
+state backend to the call's runtime.
+
+Run with: uv run python benchmarks/bench_custom_backend.py --calls 20000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from deepagents.backends import CompositeBackend, FilesystemBackend
+from langchain.tools import ToolRuntime
+
+from src.backends import CustomBackend
+from src.backends.blobs import BlobStateBackend
+from src.backends.sqlite import SQLiteBackend
+
+
+def fresh_backend(custom: CustomBackend, rt: ToolRuntime) -> CompositeBackend:
+    """Build the composite backend from scratch, as every call used to."""
+    return CompositeBackend(
+        default=BlobStateBackend(rt, custom.blobs),
+        routes={
+            "/notes/": BlobStateBackend(rt, custom.blobs),
+            "/memories/": SQLiteBackend(custom.memories_store),
+            "/artifacts/": FilesystemBackend(
+                root_dir=custom.artifacts_fs.getsyspath("/"), virtual_mode=True
+            ),
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    custom = CustomBackend(
+        memories_db=Path(tmp.name) / "memories.sqlite3",
+        blobs_dir=Path(tmp.name) / "blobs",
+    )
+    runtimes = [
+        ToolRuntime(
+            state={"files": {}},
+            context=None,
+            config={"configurable": {"thread_id": f"thread-{i % args.threads}"}},
+            stream_writer=None,
+            tool_call_id=f"call-{i}",
+            store=None,
+        )
+        for i in range(args.calls)
+    ]
+    targets = {
+        "fresh": lambda rt: fresh_backend(custom, rt),
+        "pooled": custom,
+    }
+
+    print(f"{'backend':>8} {'per call (us)':>14}")
+    for name, resolve in targets.items():
+        t0 = time.perf_counter()
+        for rt in runtimes:
+            resolve(rt).ls_info("/notes/")
+        cost = (time.perf_counter() - t0) / args.calls * 1e6
+        print(f"{name:>8} {cost:>14.2f}")
+    custom.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
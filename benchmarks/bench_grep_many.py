@@ -0,0 +1,86 @@
+"""
+Benchmark LiteralSet against other ways of finding many literals
+
+Scans synthetic paper text for a set of keywords with LiteralSet, one plain
+str.find loop per keyword and a single compiled alternation, and reports the
+occurrences each finds. The alternation misses occurrences overlapping
+another keyword's.
+
+Run with: uv run python benchmarks/bench_grep_many.py --mb 4 --patterns 10
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from src.backends.literals import LiteralSet
+
+WORDS = (
+    "the lattice parameter of the cubic phase was refined against dark matter "
+    "energy hubble tension axion neutrino spin gravitational waves"
+).split()
+
+
+def timed(fn, repeat: int):
+    """Return the best wall time of `repeat` calls in milliseconds, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, result
+
+
+def find_loop(text: str, patterns):
+    n = 0
+    for pattern in patterns:
+        i = text.find(pattern)
+        while i >= 0:
+            n += 1
+            i = text.find(pattern, i + len(pattern))
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=4)
+    parser.add_argument("--patterns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    lines, size = [], 0
+    while size < args.mb * 1e6:
+        line = " ".join(rng.choice(WORDS) for _ in range(12))
+        lines.append(line)
+        size += len(line) + 1
+    text = "\n".join(lines)
+    patterns = (WORDS[-8:] + [f"missing{i}" for i in range(args.patterns)])[
+        : args.patterns
+    ]
+
+    literals = LiteralSet(patterns)
+    folded = LiteralSet(patterns, ignore_case=True)
+    alternation = re.compile("|".join(map(re.escape, patterns)))
+    runs = [
+        ("LiteralSet", lambda: sum(1 for _ in literals.iter_matches(text))),
+        ("LiteralSet -i", lambda: sum(1 for _ in folded.iter_matches(text))),
+        ("str.find", lambda: find_loop(text, patterns)),
+        ("alternation", lambda: sum(1 for _ in alternation.finditer(text))),
+    ]
+    print(f"{len(text) / 1e6:.2f} MB, {len(patterns)} patterns")
+    print(f"{'method':<14} {'time (ms)':>10} {'found':>9}")
+    for name, fn in runs:
+        ms, found = timed(fn, args.repeat)
+        print(f"{name:<14} {ms:>10.1f} {found:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark SQLiteBackend.grep_raw against FilesystemBackend on a growing store
+
+Writes memory files of a few lines each, where only one file in a hundred
+mentions a rare term, and times grepping for it as the store grows. The
+trigram index of the SQLite backend only hands the regex the candidate files,
+so its latency follows the number of matches rather than the number of files.
+
+Run with: uv run python benchmarks/bench_sqlite_grep.py --files 20000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from deepagents.backends import FilesystemBackend
+
+from src.backends.sqlite import SQLiteBackend, SQLiteStore
+
+PATTERN = r"zeolite\w*"
+LINE = "the user prefers concise answers about materials and their synthesis"
+
+
+def timed(fn, repeat: int) -> float:
+    """Return the best wall time of `repeat` calls in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    sqlite = SQLiteBackend(SQLiteStore(Path(tmp.name) / "memories.sqlite3"))
+    disk = FilesystemBackend(root_dir=Path(tmp.name) / "fs", virtual_mode=True)
+    print(f"{'files':>8} {'sqlite (ms)':>12} {'filesystem (ms)':>16}")
+    checkpoint = args.files // 4
+    batch = []
+    for n in range(args.files):
+        term = "zeolites" if n % 100 == 0 else "polymers"
+        content = "\n".join([LINE] * 4 + [f"topic: {term}"])
+        batch.append((f"/d{n // 100}/m{n}.md", content.encode()))
+        if (n + 1) % checkpoint == 0:
+            sqlite.upload_files(batch)
+            disk.upload_files(batch)
+            batch = []
+            indexed = timed(lambda: sqlite.grep_raw(PATTERN), args.repeat)
+            scanned = timed(lambda: disk.grep_raw(PATTERN), 1)
+            print(f"{n + 1:>8} {indexed:>12.2f} {scanned:>16.1f}")
+    sqlite.store.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
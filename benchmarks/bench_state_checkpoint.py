@@ -0,0 +1,73 @@
+"""
+Benchmark the checkpoint cost of notes kept in graph state
+
+Writes notes through a StateBackend and a BlobStateBackend, merging their
+state updates as the files reducer does, and serializes the files of the
+state with the LangGraph checkpoint serializer as the notes grow. Inline
+state grows with the note bodies, digest state only with the number of notes.
+
+Run with: uv run python benchmarks/bench_state_checkpoint.py --notes 2000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from deepagents.backends import StateBackend
+from langchain.tools import ToolRuntime
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.backends.blobs import BlobStateBackend, BlobStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--note-kb", type=int, default=8)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    blobs = BlobStore(tmp.name)
+    serde = JsonPlusSerializer()
+    rts = {
+        name: ToolRuntime(
+            state={"files": {}},
+            context=None,
+            config={},
+            stream_writer=None,
+            tool_call_id="call",
+            store=None,
+        )
+        for name in ("inline", "digest")
+    }
+    backends = {
+        "inline": StateBackend(rts["inline"]),
+        "digest": BlobStateBackend(rts["digest"], blobs),
+    }
+    line = "x" * 79 + "\n"
+    print(
+        f"{'notes':>6} {'backend':>8} {'checkpoint (KiB)':>17} {'serialize (ms)':>15}"
+    )
+    checkpoint = args.notes // 4
+    for n in range(args.notes):
+        body = f"note {n}\n" + line * (args.note_kb * 1024 // len(line))
+        for name, backend in backends.items():
+            update = backend.write(f"/n{n}.md", body).files_update
+            rts[name].state["files"].update(update)
+        if (n + 1) % checkpoint == 0:
+            for name, rt in rts.items():
+                t0 = time.perf_counter()
+                _, data = serde.dumps_typed(rt.state["files"])
+                cost = (time.perf_counter() - t0) * 1000
+                print(f"{n + 1:>6} {name:>8} {len(data) / 1024:>17.0f} {cost:>15.2f}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark TieredBackend against the FilesystemBackend it fronts
+
+Replays an /artifacts/ like workload: a few working files are read over and
+over at varying offsets while many paper texts are each read once or twice.
+Reports the per read latency, the share of reads served from RAM and how
+much of the directory ends up there.
+
+Run with: uv run python benchmarks/bench_tiered_backend.py --reads 20000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from deepagents.backends import FilesystemBackend
+
+from src.backends.tiered import TieredBackend
+
+
+def workload(backend, reads: int, papers: int, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(reads):
+        if rng.random() < 0.8:
+            path = f"/work/w{rng.randrange(4)}.md"
+        else:
+            path = f"/papers/p{rng.randrange(papers)}.txt"
+        backend.read(path, offset=rng.randrange(0, 400, 50), limit=100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--papers", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    disk = FilesystemBackend(root_dir=tmp.name, virtual_mode=True)
+    line = "the refined lattice parameter of the cubic phase\n"
+    files = [(f"/work/w{i}.md", (line * 400).encode()) for i in range(4)]
+    files += [(f"/papers/p{i}.txt", (line * 400).encode()) for i in range(args.papers)]
+    disk.upload_files(files)
+    total = sum(len(data) for _, data in files)
+    tiered = TieredBackend(disk)
+
+    print(f"{'backend':>8} {'per read (us)':>14} {'hot hits':>9} {'in RAM':>8}")
+    for name, backend in (("disk", disk), ("tiered", tiered)):
+        t0 = time.perf_counter()
+        workload(backend, args.reads, args.papers)
+        cost = (time.perf_counter() - t0) / args.reads * 1e6
+        stats = tiered.stats()
+        hits = stats["hot_hits"] / args.reads if backend is tiered else 0
+        resident = stats["resident_bytes"] if backend is tiered else 0
+        print(f"{name:>8} {cost:>14.1f} {hits:>9.1%} {resident / total:>8.1%}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark building a file from many small appends
+
+Appends short lines to a single file and reports the average cost of an
+append as the file grows, for in-memory and deduplicated storage, with
+MemoryFS.appendtext as a baseline. Costs should stay flat as the file grows:
+appends extend the last buffer in place and deduplicated files only hash
+their tail once it fills a chunk.
+
+Run with: uv run python benchmarks/bench_vfs_append.py --appends 20000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from fs.memoryfs import MemoryFS
+
+from src.backends.filesystem import VirtualFilesystem
+
+LINE = "- observation: the quick brown fox jumps over the lazy dog\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--appends", type=int, default=20000)
+    parser.add_argument("--checkpoints", type=int, default=4)
+    args = parser.parse_args()
+
+    targets = {
+        "memory": VirtualFilesystem().write,
+        "dedup": VirtualFilesystem(dedup=True).write,
+    }
+    memfs = MemoryFS()
+    memfs.writetext("/notes.md", "")
+
+    print(
+        f"{'appends':>8} {'size (KB)':>10} "
+        + " ".join(f"{name + ' (us)':>12}" for name in [*targets, "MemoryFS"])
+    )
+    step = args.appends // args.checkpoints
+    for done in range(step, args.appends + 1, step):
+        costs = []
+        for write in targets.values():
+            t0 = time.perf_counter()
+            for _ in range(step):
+                write("/memories/notes.md", LINE, mode="append")
+            costs.append((time.perf_counter() - t0) / step * 1e6)
+        t0 = time.perf_counter()
+        for _ in range(step):
+            memfs.appendtext("/notes.md", LINE)
+        costs.append((time.perf_counter() - t0) / step * 1e6)
+        size = done * len(LINE) / 1024
+        print(f"{done:>8} {size:>10.0f} " + " ".join(f"{c:>12.1f}" for c in costs))
+
+
+if __name__ == "__main__":
+    main()
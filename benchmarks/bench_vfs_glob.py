@@ -0,0 +1,61 @@
+"""
+Benchmark VirtualFilesystem.glob on a growing tree
+
+Creates directories of small files under /artifacts and times a few common
+patterns as the tree grows. Latency of the path tree should stay flat for
+targeted patterns, and is compared against walking the tree with MemoryFS.glob.
+
+Run with: uv run python benchmarks/bench_vfs_glob.py --files 20000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from src.backends.filesystem import VirtualFilesystem
+
+PATTERNS = ["/artifacts/d0/*.md", "/artifacts/**/*.md", "/artifacts/d1/**/*.txt"]
+
+
+def timed(fn, repeat: int) -> float:
+    """Return the best wall time of `repeat` calls in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--per-dir", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    vfs = VirtualFilesystem()
+    print(f"{'files':>8} {'pattern':<26} {'trie (ms)':>10} {'walk (ms)':>10}")
+    n = 0
+    checkpoint = args.files // 4
+    while n < args.files:
+        directory = f"/artifacts/d{n // args.per_dir}"
+        if n % args.per_dir == 0:
+            vfs.mkdir(directory)
+        ext = "md" if n % 10 == 0 else "txt"
+        vfs.write(f"{directory}/f{n}.{ext}", "x")
+        n += 1
+        if n % checkpoint == 0:
+            for pattern in PATTERNS:
+                trie = timed(lambda: vfs.glob(pattern), args.repeat)
+                walk = timed(lambda: list(vfs.fs.glob(pattern)), 1)
+                print(f"{n:>8} {pattern:<26} {trie:>10.2f} {walk:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark paging through a large file with VirtualFilesystem.read
+
+Writes a single large file and reads it page by page at increasing offsets.
+Per-page latency should stay flat regardless of where the page sits in the
+file, and is compared against the previous split-and-join implementation.
+
+Run with: uv run python benchmarks/bench_vfs_read.py --size-mb 100
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from src.backends.filesystem import VirtualFilesystem
+
+
+def naive_read(vfs: VirtualFilesystem, path: str, start: int, end: int) -> str:
+    """Read a line range the way VirtualFilesystem.read used to."""
+    lines = vfs.fs.readtext(path).split("\n")
+    return "\n".join(lines[start:end])
+
+
+def timed(fn, repeat: int) -> float:
+    """Return the best wall time of `repeat` calls in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--page", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    line = "x" * 79
+    n_lines = args.size_mb * 1024 * 1024 // (len(line) + 1)
+    vfs = VirtualFilesystem()
+
+    t0 = time.perf_counter()
+    vfs.write("/artifacts/big.txt", "\n".join([line] * n_lines))
+    print(
+        f"wrote {args.size_mb} MB ({n_lines} lines) in {time.perf_counter() - t0:.2f}s"
+    )
+
+    print(f"{'offset':>12} {'indexed (ms)':>14} {'naive (ms)':>12}")
+    for frac in (0.0, 0.25, 0.5, 0.75, 0.99):
+        start = int(n_lines * frac)
+        end = start + args.page
+        indexed = timed(lambda: vfs.read("/artifacts/big.txt", start, end), args.repeat)
+        naive = timed(lambda: naive_read(vfs, "/artifacts/big.txt", start, end), 1)
+        print(f"{start:>12} {indexed:>14.3f} {naive:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import hashlib
+import os
+import tempfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+from deepagents.backends import StateBackend
+from deepagents.backends.protocol import (
+    EditResult,
+    FileDownloadResponse,
+    FileInfo,
+    GrepMatch,
+    WriteResult,
+)
+from deepagents.backends.utils import (
+    _glob_search_files,
+    create_file_data,
+    file_data_to_string,
+    format_read_response,
+    grep_matches_from_files,
+    perform_string_replacement,
+)
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+# prefix of the blobs being written, which are not swept
+_TMP_PREFIX = ".tmp"
+
+
+class BlobStore:
+    """Content-addressed store of immutable blobs in a local directory.
+
+    Blobs are named by the SHA-256 of their content, so identical contents
+    are stored once and a digest always reads back the same bytes. Every
+    edit of a file stores a new blob, so the blobs no retained checkpoint
+    references any more are collected by sweep.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Args:
+            root (Union[str, Path]): Directory holding the blobs, created by the first put if missing.
+        """
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        # fan out over subdirectories, so no directory grows too large
+        return self.root / digest[:2] / digest[2:]
+
+    def put(self, data: bytes) -> str:
+        """Store a blob, unless a blob with the same content exists.
+
+        Args:
+            data (bytes): Blob content.
+
+        Returns:
+            str: Hex digest of the blob.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        try:
+            # a blob stored again is as young as a new one, see sweep
+            os.utime(path)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # readers never see a partially written blob
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=_TMP_PREFIX)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Read a blob.
+
+        Args:
+            digest (str): Hex digest of the blob.
+
+        Raises:
+            FileNotFoundError: If no blob has the digest.
+
+        Returns:
+            bytes: Blob content.
+        """
+        return self._path(digest).read_bytes()
+
+    def __contains__(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def sweep(self, live: Iterable[str], min_age: float = 3600.0) -> int:
+        """Delete the blobs that are not live, the sweep of a mark-and-sweep.
+
+        Blobs stored by a step that is still running are not referenced by
+        any checkpoint yet, so blobs stored or stored again within min_age
+        seconds are kept whether they are live or not.
+
+        Args:
+            live (Iterable[str]): Digests still referenced, see referenced_digests.
+            min_age (float, optional): Seconds since their last put before unreferenced blobs are deleted. Defaults to 3600.
+
+        Returns:
+            int: Number of blobs deleted.
+        """
+        live = set(live)
+        cutoff = time.time() - min_age
+        deleted = 0
+        if not self.root.is_dir():
+            return deleted
+        for fan_out in self.root.iterdir():
+            for path in fan_out.iterdir():
+                if path.name.startswith(_TMP_PREFIX):
+                    continue
+                if fan_out.name + path.name in live:
+                    continue
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+
+def referenced_digests(checkpointer: BaseCheckpointSaver) -> Set[str]:
+    """Digests of the file bodies referenced by the checkpoints of a saver.
+
+    The mark of a mark-and-sweep over a BlobStore: every retained checkpoint
+    of every thread, and the writes still pending on them, are scanned for
+    the files of BlobStateBackend.
+
+    Args:
+        checkpointer (BaseCheckpointSaver): Checkpointer of the graphs using the store.
+
+    Returns:
+        Set[str]: Hex digests of the referenced blobs.
+    """
+    digests = set()
+    for checkpoint in checkpointer.list(None):
+        updates = [checkpoint.checkpoint["channel_values"].get("files") or {}]
+        updates += [
+            value
+            for _, channel, value in checkpoint.pending_writes or []
+            if channel == "files" and value
+        ]
+        for files in updates:
+            for file_data in files.values():
+                if file_data and "hash" in file_data:
+                    digests.add(file_data["hash"])
+    return digests
+
+
+class BlobStateBackend(StateBackend):
+    """StateBackend keeping file bodies in a BlobStore.
+
+    Graph state only maps each path to the digest and size of its content
+    and its timestamps, so checkpoints do not grow with the size of the
+    files. Entries holding their content inline, as StateBackend writes
+    them, are still read.
+    """
+
+    def __init__(self, runtime, blobs: BlobStore):
+        """
+        Args:
+            runtime (ToolRuntime): Runtime of the tool call, holding the graph state.
+            blobs (BlobStore): Store of the file bodies.
+        """
+        super().__init__(runtime)
+        self.blobs = blobs
+
+    def _files(self) -> Dict[str, Dict[str, Any]]:
+        return self.runtime.state.get("files", {})
+
+    def _content(self, file_data: Dict[str, Any]) -> str:
+        if "hash" in file_data:
+            return self.blobs.get(file_data["hash"]).decode("utf-8")
+        return file_data_to_string(file_data)
+
+    def _file_data(self, content: str, created_at: Optional[str] = None) -> dict:
+        data = content.encode("utf-8")
+        now = datetime.now(UTC).isoformat()
+        return {
+            "hash": self.blobs.put(data),
+            "size": len(data),
+            "created_at": created_at or now,
+            "modified_at": now,
+        }
+
+    @staticmethod
+    def _size(file_data: Dict[str, Any]) -> int:
+        if "size" in file_data:
+            return file_data["size"]
+        return len("\n".join(file_data.get("content", [])))
+
+    def _info(self, path: str, file_data: Dict[str, Any]) -> FileInfo:
+        return {
+            "path": path,
+            "is_dir": False,
+            "size": int(self._size(file_data)),
+            "modified_at": file_data.get("modified_at", ""),
+        }
+
+    def ls_info(self, path: str) -> List[FileInfo]:
+        prefix = path if path.endswith("/") else path + "/"
+        infos: List[FileInfo] = []
+        subdirs = set()
+        for file_path, file_data in self._files().items():
+            if not file_path.startswith(prefix):
+                continue
+            relative = file_path[len(prefix) :]
+            if "/" in relative:
+                subdirs.add(prefix + relative.split("/")[0] + "/")
+                continue
+            infos.append(self._info(file_path, file_data))
+        for subdir in subdirs:
+            infos.append({"path": subdir, "is_dir": True, "size": 0, "modified_at": ""})
+        infos.sort(key=lambda fi: fi["path"])
+        return infos
+
+    def read(self, file_path: str, offset: int = 0, limit: int = 2000) -> str:
+        file_data = self._files().get(file_path)
+        if file_data is None:
+            return f"Error: File '{file_path}' not found"
+        return format_read_response(
+            create_file_data(self._content(file_data)), offset, limit
+        )
+
+    def write(self, file_path: str, content: str) -> WriteResult:
+        if file_path in self._files():
+            return WriteResult(
+                error=f"Cannot write to {file_path} because it already exists. "
+                "Read and then make an edit, or write to a new path."
+            )
+        return WriteResult(
+            path=file_path, files_update={file_path: self._file_data(content)}
+        )
+
+    def edit(
+        self,
+        file_path: str,
+        old_string: str,
+        new_string: str,
+        replace_all: bool = False,
+    ) -> EditResult:
+        file_data = self._files().get(file_path)
+        if file_data is None:
+            return EditResult(error=f"Error: File '{file_path}' not found")
+        result = perform_string_replacement(
+            self._content(file_data), old_string, new_string, replace_all
+        )
+        if isinstance(result, str):
+            return EditResult(error=result)
+        content, occurrences = result
+        new_file_data = self._file_data(content, file_data.get("created_at"))
+        return EditResult(
+            path=file_path,
+            files_update={file_path: new_file_data},
+            occurrences=int(occurrences),
+        )
+
+    def grep_raw(
+        self, pattern: str, path: str = "/", glob: Optional[str] = None
+    ) -> Union[List[GrepMatch], str]:
+        prefix = path or "/"
+        if not prefix.endswith("/"):
+            prefix += "/"
+        # only fetch the bodies of the files the search can reach
+        files = {
+            file_path: {"content": self._content(file_data).split("\n")}
+            for file_path, file_data in self._files().items()
+            if file_path.startswith(prefix)
+        }
+        return grep_matches_from_files(files, pattern, path, glob)
+
+    def glob_info(self, pattern: str, path: str = "/") -> List[FileInfo]:
+        files = self._files()
+        result = _glob_search_files(files, pattern, path)
+        if result == "No files found":
+            return []
+        return [self._info(p, files[p]) for p in result.split("\n")]
+
+    def download_files(self, paths: List[str]) -> List[FileDownloadResponse]:
+        files = self._files()
+        responses = []
+        for path in paths:
+            file_data = files.get(path)
+            if file_data is None:
+                responses.append(
+                    FileDownloadResponse(
+                        path=path, content=None, error="file_not_found"
+                    )
+                )
+                continue
+            content = self._content(file_data).encode("utf-8")
+            responses.append(
+                FileDownloadResponse(path=path, content=content, error=None)
+            )
+        return responses
@@ -0,0 +1,253 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+from deepagents.backends.protocol import (
+    BackendProtocol,
+    EditResult,
+    FileDownloadResponse,
+    FileInfo,
+    FileUploadResponse,
+    GrepMatch,
+    WriteResult,
+)
+
+# default budget of a ByteLRU
+CACHE_BYTES = 64 * 1024 * 1024
+# rough per entry overhead of a cached listing or grep match
+_ENTRY_OVERHEAD = 64
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate size in bytes of a cached result."""
+    if isinstance(value, str):
+        return len(value) + _ENTRY_OVERHEAD
+    if isinstance(value, list):
+        return sum(
+            _ENTRY_OVERHEAD + sum(len(str(v)) for v in item.values()) for item in value
+        )
+    return _ENTRY_OVERHEAD
+
+
+def _copy(value: Any) -> Any:
+    """Copy of a cached listing, so callers cannot mutate the cached one."""
+    if isinstance(value, list):
+        return [dict(item) for item in value]
+    return value
+
+
+class ByteLRU:
+    """Thread-safe LRU of values bounded by their total size in bytes.
+
+    Entries belong to a partition and cover a scope, a path with no
+    trailing slash, and everything below it. Invalidating a path drops the
+    entries of its partition whose scope covers it. Every invalidation
+    bumps a generation, so a value computed while a path changed is not
+    stored.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        """
+        Args:
+            max_bytes (int, optional): Total size the cached values may take. Defaults to 64 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        # key -> (value, size, partition, scope)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        partition: Hashable,
+        scope: str,
+        load: Callable[[], Any],
+    ) -> Any:
+        """Return the cached value of a key, loading and caching it on a miss.
+
+        Args:
+            key (Hashable): Cache key, unique across partitions.
+            partition (Hashable): Partition the entry belongs to.
+            scope (str): Path the value depends on, without a trailing slash.
+            load (Callable[[], Any]): Computes the value on a miss.
+
+        Returns:
+            Any: The cached or loaded value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry[0])
+            self.misses += 1
+            generation = self.generation
+        value = load()
+        size = _sizeof(value)
+        with self._lock:
+            if self.generation != generation or size > self.max_bytes:
+                return _copy(value)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size, partition, scope)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return _copy(value)
+
+    def invalidate(self, partition: Hashable, path: str):
+        """Drop the entries of a partition whose scope covers a path.
+
+        Args:
+            partition (Hashable): Partition the path belongs to.
+            path (str): Path of a file that changed.
+        """
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key
+                for key, (_, _, part, scope) in self._entries.items()
+                if part == partition and (path == scope or path.startswith(scope + "/"))
+            ]
+            for key in stale:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Hit and size statistics of the cache.
+
+        Returns:
+            Dict[str, float]: hits, misses, hit_rate, evictions, entries and bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+            }
+
+
+def _scope(path: Optional[str]) -> str:
+    path = path or "/"
+    if not path.startswith("/"):
+        path = "/" + path
+    return path.rstrip("/")
+
+
+class CachingBackend(BackendProtocol):
+    """Read-through cache in front of another backend.
+
+    read, ls_info, glob_info and grep_raw results are cached in a ByteLRU,
+    and writes, edits and uploads through the wrapper invalidate the
+    results they affect. Changes made to the wrapped backend by anything
+    else, such as another process, are not seen until the entries are
+    evicted.
+
+    Wrappers sharing a cache and a partition share their entries, so
+    several wrappers over the same files stay consistent with each other.
+    """
+
+    def __init__(
+        self,
+        backend: BackendProtocol,
+        cache: Optional[ByteLRU] = None,
+        partition: Hashable = None,
+        cache_reads: bool = True,
+    ):
+        """
+        Args:
+            backend (BackendProtocol): Backend the reads go through to on a miss.
+            cache (Optional[ByteLRU], optional): Cache of the results. Defaults to a new ByteLRU.
+            partition (Hashable, optional): Partition of the cache the files of the backend live in. Defaults to the wrapper itself.
+            cache_reads (bool, optional): Whether file reads are cached, or only listings and searches, e.g. below a TieredBackend that keeps the contents. Defaults to True.
+        """
+        self.backend = backend
+        self.cache = cache if cache is not None else ByteLRU()
+        self.partition = partition if partition is not None else id(self)
+        self.cache_reads = cache_reads
+
+    def _cached(self, op: str, scope: str, args: Tuple, load: Callable[[], Any]):
+        key = (self.partition, op, *args)
+        return self.cache.get_or_load(key, self.partition, scope, load)
+
+    def stats(self) -> Dict[str, float]:
+        """Statistics of the underlying cache, see ByteLRU.stats."""
+        return self.cache.stats()
+
+    def ls_info(self, path: str) -> List[FileInfo]:
+        return self._cached(
+            "ls", _scope(path), (path,), lambda: self.backend.ls_info(path)
+        )
+
+    def read(self, file_path: str, offset: int = 0, limit: int = 2000) -> str:
+        if not self.cache_reads:
+            return self.backend.read(file_path, offset, limit)
+        return self._cached(
+            "read",
+            _scope(file_path),
+            (file_path, offset, limit),
+            lambda: self.backend.read(file_path, offset, limit),
+        )
+
+    def grep_raw(
+        self, pattern: str, path: Optional[str] = None, glob: Optional[str] = None
+    ) -> Union[List[GrepMatch], str]:
+        return self._cached(
+            "grep",
+            _scope(path),
+            (pattern, path, glob),
+            lambda: self.backend.grep_raw(pattern, path, glob),
+        )
+
+    def glob_info(self, pattern: str, path: str = "/") -> List[FileInfo]:
+        return self._cached(
+            "glob",
+            _scope(path),
+            (pattern, path),
+            lambda: self.backend.glob_info(pattern, path),
+        )
+
+    def write(self, file_path: str, content: str) -> WriteResult:
+        try:
+            return self.backend.write(file_path, content)
+        finally:
+            self.cache.invalidate(self.partition, file_path)
+
+    def edit(
+        self,
+        file_path: str,
+        old_string: str,
+        new_string: str,
+        replace_all: bool = False,
+    ) -> EditResult:
+        try:
+            return self.backend.edit(file_path, old_string, new_string, replace_all)
+        finally:
+            self.cache.invalidate(self.partition, file_path)
+
+    def upload_files(self, files: List[Tuple[str, bytes]]) -> List[FileUploadResponse]:
+        try:
+            return self.backend.upload_files(files)
+        finally:
+            for path, _ in files:
+                self.cache.invalidate(self.partition, path)
+
+    def download_files(self, paths: List[str]) -> List[FileDownloadResponse]:
+        return self.backend.download_files(paths)
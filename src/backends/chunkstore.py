@@ -0,0 +1,270 @@
+import hashlib
+import threading
+import weakref
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# size of the pieces file content is split into before hashing
+DEDUP_CHUNK_SIZE = 64 * 1024
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ChunkStore:
+    """Content-addressed store of reference counted chunks.
+
+    Identical chunks are stored once, however many files and filesystems
+    reference them, and are dropped when the last reference goes away.
+    """
+
+    def __init__(self, chunk_size: int = DEDUP_CHUNK_SIZE):
+        """
+        Args:
+            chunk_size (int, optional): Size of the chunks files are split into. Defaults to 64 KiB.
+        """
+        self.chunk_size = chunk_size
+        self._chunks: Dict[bytes, bytes] = {}
+        self._refs: Dict[bytes, int] = {}
+        self._lock = threading.Lock()
+        # bytes written through the store, counting every duplicate
+        self.logical_bytes = 0
+
+    def put(self, data: bytes) -> bytes:
+        """Add a reference to a chunk, storing it if it is new.
+
+        Args:
+            data (bytes): Chunk content.
+
+        Returns:
+            bytes: Digest of the chunk.
+        """
+        digest = _digest(data)
+        with self._lock:
+            if digest in self._refs:
+                self._refs[digest] += 1
+            else:
+                self._chunks[digest] = bytes(data)
+                self._refs[digest] = 1
+            self.logical_bytes += len(data)
+        return digest
+
+    def ref(self, digest: bytes) -> None:
+        """Add a reference to a chunk that is already stored.
+
+        Args:
+            digest (bytes): Digest returned by put.
+        """
+        with self._lock:
+            self._refs[digest] += 1
+            self.logical_bytes += len(self._chunks[digest])
+
+    def get(self, digest: bytes) -> bytes:
+        """Content of a stored chunk.
+
+        Args:
+            digest (bytes): Digest returned by put.
+
+        Returns:
+            bytes: Chunk content.
+        """
+        return self._chunks[digest]
+
+    def release(self, digests: Tuple[bytes, ...]) -> None:
+        """Drop one reference to each chunk, deleting unreferenced ones.
+
+        Args:
+            digests (Tuple[bytes, ...]): Digests returned by put, duplicates allowed.
+        """
+        with self._lock:
+            for digest in digests:
+                self.logical_bytes -= len(self._chunks[digest])
+                self._refs[digest] -= 1
+                if not self._refs[digest]:
+                    del self._refs[digest]
+                    del self._chunks[digest]
+
+    def stats(self) -> Dict:
+        """Deduplication statistics.
+
+        Returns:
+            Dict: chunks, stored_bytes, logical_bytes and dedup_ratio, the
+            logical bytes referenced per stored byte (1.0 without sharing).
+        """
+        with self._lock:
+            stored = sum(map(len, self._chunks.values()))
+            return {
+                "chunks": len(self._chunks),
+                "stored_bytes": stored,
+                "logical_bytes": self.logical_bytes,
+                "dedup_ratio": self.logical_bytes / stored if stored else 1.0,
+            }
+
+
+_shared_store: Optional[ChunkStore] = None
+_shared_lock = threading.Lock()
+
+
+def shared_chunk_store() -> ChunkStore:
+    """The chunk store shared by every filesystem in the process.
+
+    Returns:
+        ChunkStore: The process-wide store, created on first use.
+    """
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ChunkStore()
+        return _shared_store
+
+
+class _ChunkList:
+    """Append-only list of chunk references shared by the versions of a file.
+
+    The list holds one reference to each of its chunks, released when the
+    last blob using the list is garbage collected.
+    """
+
+    __slots__ = ("store", "digests", "ends", "lock", "__weakref__")
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self.digests: List[bytes] = []
+        self.ends = array("q")
+        # serializes appends of the blobs sharing the list and their tails,
+        # which may belong to filesystems with their own locks
+        self.lock = threading.Lock()
+        # the finalizer gets the list itself, so it releases every chunk
+        # added until then without keeping this object alive
+        weakref.finalize(self, store.release, self.digests)
+
+    def seal(self, data: bytes) -> None:
+        """Store data as the next chunks, splitting it at the chunk size."""
+        chunk_size = self.store.chunk_size
+        offset = self.ends[-1] if self.ends else 0
+        view = memoryview(data)
+        for start in range(0, len(data), chunk_size):
+            chunk = view[start : start + chunk_size]
+            self.digests.append(self.store.put(chunk))
+            offset += len(chunk)
+            self.ends.append(offset)
+
+    def prefix(self, n: int) -> "_ChunkList":
+        """Copy of the first n references, for a version that diverged."""
+        chunks = _ChunkList(self.store)
+        for digest in self.digests[:n]:
+            self.store.ref(digest)
+        chunks.digests.extend(self.digests[:n])
+        chunks.ends = self.ends[:n]
+        return chunks
+
+
+class ChunkedBlob:
+    """Immutable file content as chunks in a ChunkStore plus an append log.
+
+    Written content is split into stored chunks right away. Appended bytes
+    go to an unsealed tail that is extended in place, like `Blob`, and is
+    only hashed and stored once it reaches the chunk size, so appends are
+    O(1) amortized however often a file grows. Versions share a chunk list
+    and tail buffer as long as they only append to the newest version.
+    """
+
+    __slots__ = ("chunks", "n", "tail", "tail_size", "size")
+
+    def __init__(self, chunks: _ChunkList, n: int, tail: bytearray, tail_size: int):
+        """
+        Args:
+            chunks (_ChunkList): Stored chunks, possibly longer than this blob's.
+            n (int): Number of stored chunks that belong to this blob.
+            tail (bytearray): Append log, possibly longer than this blob's.
+            tail_size (int): Number of tail bytes that belong to this blob.
+        """
+        self.chunks = chunks
+        self.n = n
+        self.tail = tail
+        self.tail_size = tail_size
+        self.size = (chunks.ends[n - 1] if n else 0) + tail_size
+
+    @classmethod
+    def from_bytes(cls, store: ChunkStore, data: bytes) -> "ChunkedBlob":
+        """Split content into chunks and store them.
+
+        Args:
+            store (ChunkStore): Store for the chunks.
+            data (bytes): File content.
+
+        Returns:
+            ChunkedBlob: The new blob.
+        """
+        chunks = _ChunkList(store)
+        chunks.seal(data)
+        return cls(chunks, len(chunks.digests), bytearray(), 0)
+
+    @property
+    def digests(self) -> List[bytes]:
+        """Digests of the stored chunks, the unsealed tail excluded."""
+        return self.chunks.digests[: self.n]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def tobytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Copy out a byte range of the content, see `Blob.tobytes`."""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return b""
+        ends, digests, store = self.chunks.ends, self.chunks.digests, self.chunks.store
+        sealed = ends[self.n - 1] if self.n else 0
+        parts = []
+        for i in range(bisect_right(ends, start, 0, self.n), self.n):
+            chunk_start = ends[i - 1] if i else 0
+            if chunk_start >= end:
+                break
+            chunk = store.get(digests[i])
+            parts.append(chunk[max(start - chunk_start, 0) : end - chunk_start])
+        if end > sealed:
+            parts.append(bytes(self.tail[max(start - sealed, 0) : end - sealed]))
+        return b"".join(parts)
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the content chunk by chunk.
+
+        Args:
+            chunk_size (Optional[int], optional): Ignored, chunks keep their stored size. Defaults to None.
+
+        Yields:
+            bytes: Consecutive pieces of the content.
+        """
+        for digest in self.digests:
+            yield self.chunks.store.get(digest)
+        if self.tail_size:
+            yield bytes(self.tail[: self.tail_size])
+
+    def append(self, data: bytes) -> "ChunkedBlob":
+        """Content of this blob followed by data, as a new blob.
+
+        The tail is compacted into stored chunks once it reaches the chunk
+        size.
+        """
+        with self.chunks.lock:
+            if self.tail_size == len(self.tail):
+                tail = self.tail
+                tail.extend(data)
+            else:
+                # the tail was already extended past this blob by another version
+                tail = self.tail[: self.tail_size]
+                tail.extend(data)
+            size = self.tail_size + len(data)
+            chunks, n = self.chunks, self.n
+            chunk_size = chunks.store.chunk_size
+            if size < chunk_size:
+                return ChunkedBlob(chunks, n, tail, size)
+            if n != len(chunks.digests):
+                chunks = chunks.prefix(n)
+            keep = size - size % chunk_size
+            chunks.seal(bytes(tail[:keep]))
+            return ChunkedBlob(
+                chunks, len(chunks.digests), tail[keep:size], size - keep
+            )
@@ -2,35 +2,176 @@ import warnings
 
 warnings.simplefilter("ignore")
 
-from deepagents.backends import CompositeBackend, FilesystemBackend, StateBackend
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Literal, Optional, Union
+
+from deepagents.backends import CompositeBackend, FilesystemBackend
 from deepagents.backends.protocol import BackendFactory
 from fs.tempfs import TempFS
 from langchain.tools import ToolRuntime
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from .blobs import BlobStateBackend, BlobStore, referenced_digests
+from .cache import CACHE_BYTES, ByteLRU, CachingBackend
+from .sqlite import SQLiteBackend, SQLiteStore
+from .tiered import TieredBackend
+
+
+def _thread_id(rt: ToolRuntime) -> Optional[Hashable]:
+    """Graph thread a tool call runs in, None outside of a checkpointed run."""
+    config = getattr(rt, "config", None) or {}
+    return config.get("configurable", {}).get("thread_id")
+
+
+def _namespace(rt: ToolRuntime, scope: str) -> str:
+    """Memories namespace of a tool call: its user or its graph thread."""
+    config = getattr(rt, "config", None) or {}
+    key = "user_id" if scope == "user" else "thread_id"
+    return str(config.get("configurable", {}).get(key) or "default")
 
 
 class CustomBackend:
-    def __init__(self):
-        self.memories_fs = TempFS("memories")
+    def __init__(
+        self,
+        pool_size: int = 64,
+        memories_db: Optional[Union[str, Path]] = None,
+        memories_scope: Literal["user", "thread"] = "user",
+        blobs_dir: Optional[Union[str, Path]] = None,
+        cache_bytes: int = CACHE_BYTES,
+    ):
+        """
+        Backend factory routing /notes/ to graph state, /memories/ to a
+        SQLite database and /artifacts/ to a temporary directory.
+
+        Graph state only holds the digest and size of each file, the bodies
+        live in a content-addressed blob store, so checkpoints do not grow
+        with the notes.
+
+        Memories persist across restarts. Each user, or each graph thread,
+        sees only its own memories, read from the `user_id` or `thread_id`
+        of the run config and falling back to a shared "default" namespace.
+        The database and the blob directory are created on first use, so
+        constructing the factory, e.g. when a graph module is imported,
+        touches no files.
+
+        Reads, listings and searches of /memories/ go through a shared
+        read-through cache, invalidated by writes and edits made through
+        this factory's backends. The frequently read working files of
+        /artifacts/ are kept in a hot tier in memory while the bulk of its
+        paper texts stay on disk, and its listings and searches go through
+        the shared cache.
+
+        Composite backends are pooled per OS thread, graph thread and
+        memories namespace in an LRU, so resolving the backend of a tool
+        call does not rebuild it. A pooled composite has a single
+        BlobStateBackend, rebound to the runtime of every call it serves,
+        so it always reads the current state. Calls running concurrently in
+        the same OS thread and graph thread are parallel tool calls of one
+        step, which share that state. Calls without a graph thread cannot
+        be told apart, so they get a composite of their own.
+
+        Args:
+            pool_size (int, optional): Maximum number of pooled composite backends. Defaults to 64.
+            memories_db (Optional[Union[str, Path]], optional): Database file of the memories. Defaults to memories.sqlite3 in the data directory.
+            memories_scope (Literal["user", "thread"], optional): Whether memories are namespaced by user or graph thread. Defaults to "user".
+            blobs_dir (Optional[Union[str, Path]], optional): Directory of the file bodies of graph state. Defaults to blobs in the data directory.
+            cache_bytes (int, optional): Size of the cache of /memories/ and /artifacts/. Defaults to 64 MiB.
+        """
+        if memories_db is None or blobs_dir is None:
+            # settings load the .env file, so only import them when needed
+            from src.config.settings import get_settings
+
+            data_dir = get_settings().paths.data_dir
+            memories_db = memories_db or data_dir / "memories.sqlite3"
+            blobs_dir = blobs_dir or data_dir / "blobs"
+        self.blobs = BlobStore(blobs_dir)
+        self.memories_store = SQLiteStore(memories_db)
+        self.memories_scope = memories_scope
+        self.cache = ByteLRU(cache_bytes)
         self.artifacts_fs = TempFS("artifacts")
+        # the artifacts route holds no per-call state, so every composite
+        # shares it. The tiers sit above the cache so they see every read,
+        # and the cache below only keeps listings and searches, so no file
+        # content is held in memory twice
+        self.artifacts_backend = TieredBackend(
+            CachingBackend(
+                FilesystemBackend(
+                    root_dir=self.artifacts_fs.getsyspath("/"), virtual_mode=True
+                ),
+                self.cache,
+                partition="/artifacts/",
+                cache_reads=False,
+            )
+        )
+        self.pool_size = pool_size
+        self._pool: OrderedDict = OrderedDict()
+        self._pool_lock = threading.Lock()
 
-    def __call__(self, rt: ToolRuntime) -> BackendFactory:
+    def _memories(self, namespace: str) -> CachingBackend:
+        # wrappers of one namespace share its cache partition, so a write
+        # through any composite invalidates the entries of every other one
+        return CachingBackend(
+            SQLiteBackend(self.memories_store, namespace),
+            self.cache,
+            partition=("/memories/", namespace),
+        )
+
+    def _build(self, rt: ToolRuntime) -> CompositeBackend:
+        state = BlobStateBackend(rt, self.blobs)
         return CompositeBackend(
-            default=StateBackend(rt),
+            default=state,
             routes={
-                "/notes/": StateBackend(rt),
-                "/memories/": FilesystemBackend(
-                    root_dir=self.memories_fs.getsyspath("/"), virtual_mode=True
-                ),
-                "/artifacts/": FilesystemBackend(
-                    root_dir=self.artifacts_fs.getsyspath("/"), virtual_mode=True
-                ),
+                "/notes/": state,
+                "/memories/": self._memories(_namespace(rt, self.memories_scope)),
+                "/artifacts/": self.artifacts_backend,
             },
         )
 
+    def __call__(self, rt: ToolRuntime) -> BackendFactory:
+        thread_id = _thread_id(rt)
+        if thread_id is None:
+            return self._build(rt)
+        namespace = _namespace(rt, self.memories_scope)
+        key = (threading.get_ident(), thread_id, namespace)
+        with self._pool_lock:
+            composite = self._pool.get(key)
+            if composite is None:
+                composite = self._build(rt)
+                self._pool[key] = composite
+                if len(self._pool) > self.pool_size:
+                    self._pool.popitem(last=False)
+            else:
+                self._pool.move_to_end(key)
+                # also the /notes/ route, which shares the BlobStateBackend
+                composite.default.runtime = rt
+        return composite
+
+    def sweep_blobs(
+        self, checkpointer: BaseCheckpointSaver, min_age: float = 3600.0
+    ) -> int:
+        """Delete the note bodies no retained checkpoint references.
+
+        Every edit of a note stores its new body, so this should run
+        periodically, e.g. after old checkpoints are pruned.
+
+        Args:
+            checkpointer (BaseCheckpointSaver): Checkpointer of the graphs using this backend.
+            min_age (float, optional): Seconds since they were stored before unreferenced bodies are deleted. Defaults to 3600.
+
+        Returns:
+            int: Number of bodies deleted.
+        """
+        return self.blobs.sweep(referenced_digests(checkpointer), min_age)
+
     def close(self):
-        for fs in (self.memories_fs, self.artifacts_fs):
-            try:
-                if not fs.isclosed():
-                    fs.close()
-            except Exception:
-                pass
+        with self._pool_lock:
+            self._pool.clear()
+        self.cache.clear()
+        self.memories_store.close()
+        try:
+            if not self.artifacts_fs.isclosed():
+                self.artifacts_fs.close()
+        except Exception:
+            pass
@@ -10,29 +10,536 @@ import warnings
 warnings.simplefilter("ignore", category=UserWarning)
 
 # now we can import fs without seeing these warnings
+import asyncio
+import functools
+import os
 import re
-from typing import Dict, List, Literal, Optional
+import threading
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from fs import path as fs_path
-from fs.memoryfs import MemoryFS
+from fs.errors import DirectoryExpected, FSError
+from fs.info import Info as FSInfo
 
 from src.schemas.filesystem import FileContent, Info
 
+from .indexes import (
+    BM25Index,
+    BlobLines,
+    JoinedLines,
+    LineIndex,
+    PathTrie,
+    TrigramIndex,
+    char_line_starts,
+    extract_literals,
+)
+from .chunkstore import shared_chunk_store
+from .literals import LiteralSet
+from .locks import RWLock
+from .snapshotfs import Snapshot, SnapshotFS
+
+GrepOutputMode = Literal["content", "files_with_matches", "count"]
+
+
+def _match_lines(
+    file_path: str,
+    lines: Sequence[str],
+    pattern: re.Pattern,
+    character_window: Optional[int] = None,
+    line_window: Optional[int] = None,
+) -> Iterator[Dict]:
+    """Lazily yield the grep matches of a file's text, line by line.
+
+    Args:
+        file_path (str): Absolute path of the file, reported in the matches.
+        lines (Sequence[str]): Lines of the file.
+        pattern (re.Pattern): Compiled regex pattern to search for.
+        character_window (Optional[int], optional): Context characters around match. Defaults to None.
+        line_window (Optional[int], optional): Context lines around match. Takes precedence over character_window. Defaults to None.
+
+    Yields:
+        Match dictionaries with keys: 'path', 'snippet', 'line_number', 'match_range', 'match'.
+    """
+    for row, line in enumerate(lines):
+        for match in pattern.finditer(line):
+            match_start = match.start()
+            match_end = match.end()
+            if line_window is not None:
+                start = max(0, row - line_window)
+                end = min(len(lines), row + line_window + 1)
+                snippet = "\n".join(lines[start:end])
+            elif character_window is not None:
+                char_start = max(0, match_start - character_window)
+                char_end = min(len(line), match_end + character_window)
+                snippet = line[char_start:char_end]
+            else:
+                snippet = line
+            yield {
+                "path": file_path,
+                "snippet": snippet,
+                "line_number": row,
+                "match_range": [match_start, match_end],
+                "match": match.group(0),
+            }
+
+
+def _match_buffer(
+    file_path: str,
+    text: str,
+    line_starts: Sequence[int],
+    pattern: re.Pattern,
+    character_window: Optional[int] = None,
+    line_window: Optional[int] = None,
+) -> Iterator[Dict]:
+    """Lazily yield the grep matches of a file's text, matching the whole buffer.
+
+    Matches may span line breaks. Their offsets are mapped back to line
+    numbers by bisecting the line start offsets of the text.
+
+    Args:
+        file_path (str): Absolute path of the file, reported in the matches.
+        text (str): Full text of the file.
+        line_starts (Sequence[int]): Character offsets of the line starts of text.
+        pattern (re.Pattern): Compiled regex pattern to search for.
+        character_window (Optional[int], optional): Context characters around match. Defaults to None.
+        line_window (Optional[int], optional): Context lines around match. Takes precedence over character_window. Defaults to None.
+
+    Yields:
+        Match dictionaries with keys: 'path', 'snippet', 'line_number', 'end_line_number', 'match_range', 'match'. 'match_range' is relative to the start of the first matched line.
+    """
+    n_lines = len(line_starts)
+
+    def line_end(row: int) -> int:
+        return line_starts[row + 1] - 1 if row + 1 < n_lines else len(text)
+
+    for match in pattern.finditer(text):
+        match_start = match.start()
+        match_end = match.end()
+        row = bisect_right(line_starts, match_start) - 1
+        end_row = bisect_right(line_starts, max(match_start, match_end - 1)) - 1
+        if line_window is not None:
+            start = max(0, row - line_window)
+            end = min(n_lines - 1, end_row + line_window)
+            snippet = text[line_starts[start] : line_end(end)]
+        elif character_window is not None:
+            snippet = text[
+                max(0, match_start - character_window) : match_end + character_window
+            ]
+        else:
+            snippet = text[line_starts[row] : line_end(end_row)]
+        yield {
+            "path": file_path,
+            "snippet": snippet,
+            "line_number": row,
+            "end_line_number": end_row,
+            "match_range": [
+                match_start - line_starts[row],
+                match_end - line_starts[row],
+            ],
+            "match": match.group(0),
+        }
+
+
+def _match_spans(
+    text: Union[str, Sequence[str]], pattern: re.Pattern, multiline: bool = False
+) -> Iterator[Tuple[int, int]]:
+    """Lazily yield the character spans of the matches in a file's text.
+
+    Args:
+        text (Union[str, Sequence[str]]): Full text of the file, or its lines when not multiline.
+        pattern (re.Pattern): Compiled regex pattern to search for.
+        multiline (bool, optional): Match the whole buffer instead of each line. Defaults to False.
+
+    Yields:
+        Tuple[int, int]: Start and end (exclusive) offsets into text, in order.
+    """
+    if multiline:
+        for match in pattern.finditer(text):
+            yield match.start(), match.end()
+        return
+    offset = 0
+    lines = text.split("\n") if isinstance(text, str) else text
+    for line in lines:
+        for match in pattern.finditer(line):
+            yield offset + match.start(), offset + match.end()
+        offset += len(line) + 1
+
+
+def _merge_context(
+    file_path: str,
+    text: Union[str, JoinedLines],
+    line_starts: Sequence[int],
+    spans: Iterator[Tuple[int, int]],
+    character_window: Optional[int] = None,
+    line_window: Optional[int] = None,
+    multiline: bool = False,
+) -> Iterator[Dict]:
+    """Group matches whose context windows overlap or touch into single blocks.
+
+    Works like ripgrep's context output: every match gets the same window as
+    in `_match_lines` (or `_match_buffer` when multiline), but consecutive
+    windows that overlap or are adjacent are merged, so each line of context
+    is emitted at most once.
+
+    Args:
+        file_path (str): Absolute path of the file, reported in the blocks.
+        text (Union[str, JoinedLines]): Full text of the file, or a view slicing it from its lines.
+        line_starts (Sequence[int]): Character offsets of the line starts of text.
+        spans (Iterator[Tuple[int, int]]): Match spans in order, see `_match_spans`.
+        character_window (Optional[int], optional): Context characters around match. Defaults to None.
+        line_window (Optional[int], optional): Context lines around match. Takes precedence over character_window. Defaults to None.
+        multiline (bool, optional): Let character windows cross line breaks. Defaults to False.
+
+    Yields:
+        Block dictionaries with keys: 'path', 'snippet', 'line_number', 'end_line_number' (first and last line of the snippet) and 'matches', a list of {'line_number', 'match_range', 'match'} where 'match_range' is relative to the start of the snippet.
+    """
+    n_lines = len(line_starts)
+
+    def line_of(offset: int) -> int:
+        return bisect_right(line_starts, offset) - 1
+
+    def line_end(row: int) -> int:
+        return line_starts[row + 1] - 1 if row + 1 < n_lines else len(text)
+
+    def block(lo: int, hi: int, lo_row: int, hi_row: int, matches: List) -> Dict:
+        return {
+            "path": file_path,
+            "snippet": text[lo:hi],
+            "line_number": lo_row,
+            "end_line_number": hi_row,
+            "matches": [
+                {
+                    "line_number": row,
+                    "match_range": [start - lo, end - lo],
+                    "match": text[start:end],
+                }
+                for start, end, row in matches
+            ],
+        }
+
+    current = None
+    for start, end in spans:
+        row = line_of(start)
+        end_row = line_of(max(start, end - 1))
+        if line_window is not None:
+            lo_row = max(0, row - line_window)
+            hi_row = min(n_lines - 1, end_row + line_window)
+            lo, hi = line_starts[lo_row], line_end(hi_row)
+        elif character_window is not None:
+            lo = max(0, start - character_window)
+            hi = min(len(text), end + character_window)
+            if not multiline:
+                lo = max(lo, line_starts[row])
+                hi = min(hi, line_end(end_row))
+            lo_row, hi_row = line_of(lo), line_of(max(lo, hi - 1))
+        else:
+            lo_row, hi_row = row, end_row
+            lo, hi = line_starts[row], line_end(end_row)
+        if current is not None and lo <= current[1] + 1:
+            if hi > current[1]:
+                current[1], current[3] = hi, hi_row
+            current[4].append((start, end, row))
+            continue
+        if current is not None:
+            yield block(*current)
+        current = [lo, hi, lo_row, hi_row, [(start, end, row)]]
+    if current is not None:
+        yield block(*current)
+
+
+def _cap_snippet_bytes(
+    entries: Iterator[Dict], max_snippet_bytes: int
+) -> Iterator[Dict]:
+    """Stop yielding entries once their snippets exceed a byte budget.
+
+    The entry crossing the budget has its snippet cut at the budget, is
+    flagged with 'truncated' and, for merged blocks, keeps only the matches
+    that still fit in the snippet.
+
+    Args:
+        entries (Iterator[Dict]): Content mode entries of a single file.
+        max_snippet_bytes (int): Budget of UTF-8 encoded snippet bytes.
+
+    Yields:
+        Dict: The entries that fit in the budget.
+    """
+    budget = max_snippet_bytes
+    for entry in entries:
+        data = entry["snippet"].encode("utf-8")
+        if len(data) <= budget:
+            budget -= len(data)
+            yield entry
+            continue
+        snippet = data[:budget].decode("utf-8", errors="ignore")
+        if snippet:
+            entry["snippet"] = snippet
+            entry["truncated"] = True
+            if "matches" in entry:
+                entry["matches"] = [
+                    m for m in entry["matches"] if m["match_range"][1] <= len(snippet)
+                ]
+            yield entry
+        return
+
+
+def _count_matches(
+    text: Union[str, Sequence[str]],
+    pattern: re.Pattern,
+    stop_at_first: bool = False,
+    multiline: bool = False,
+) -> int:
+    """Count the matches in a file's text without building snippets.
+
+    Args:
+        text (Union[str, Sequence[str]]): Full text of the file, or its lines when not multiline.
+        pattern (re.Pattern): Compiled regex pattern to search for.
+        stop_at_first (bool, optional): Return as soon as one match is found. Defaults to False.
+        multiline (bool, optional): Match the whole buffer instead of each line. Defaults to False.
+
+    Returns:
+        int: Number of matches, at most 1 if stop_at_first is set.
+    """
+    if multiline:
+        if stop_at_first:
+            return 1 if pattern.search(text) else 0
+        return sum(1 for _ in pattern.finditer(text))
+    count = 0
+    lines = text.split("\n") if isinstance(text, str) else text
+    for line in lines:
+        if stop_at_first:
+            if pattern.search(line):
+                return 1
+        else:
+            for _ in pattern.finditer(line):
+                count += 1
+    return count
+
+
+def _grep_text(
+    file_path: str,
+    text: Union[str, Sequence[str]],
+    pattern: re.Pattern,
+    character_window: Optional[int] = None,
+    line_window: Optional[int] = None,
+    output_mode: GrepOutputMode = "content",
+    multiline: bool = False,
+    line_starts: Optional[Sequence[int]] = None,
+    merge_context: bool = False,
+    max_snippet_bytes: Optional[int] = None,
+) -> Iterator[Dict]:
+    """Grep entries of a single file for the given output mode.
+
+    Args:
+        file_path (str): Absolute path of the file, reported in the entries.
+        text (Union[str, Sequence[str]]): Full text of the file. A sequence of its lines is enough unless multiline is set.
+        pattern (re.Pattern): Compiled regex pattern to search for.
+        character_window (Optional[int], optional): Context characters around match. Defaults to None.
+        line_window (Optional[int], optional): Context lines around match. Defaults to None.
+        output_mode (GrepOutputMode, optional): See VirtualFilesystem.iter_grep. Defaults to 'content'.
+        multiline (bool, optional): Match the whole buffer at once, see `_match_buffer`. Defaults to False.
+        line_starts (Optional[Sequence[int]], optional): Character offsets of the line starts of text, used by multiline and merged output. Built from text when missing. Defaults to None.
+        merge_context (bool, optional): Merge overlapping context windows into blocks, see `_merge_context`. Defaults to False.
+        max_snippet_bytes (Optional[int], optional): Budget of snippet bytes for the file, see `_cap_snippet_bytes`. Defaults to None (unbounded).
+
+    Returns:
+        Iterator[Dict]: Match dicts or blocks in 'content' mode, otherwise at most one entry for the file.
+    """
+    if output_mode == "content":
+        if (multiline or merge_context) and line_starts is None:
+            line_starts = char_line_starts(text)
+        if merge_context:
+            entries = _merge_context(
+                file_path,
+                text if isinstance(text, str) else JoinedLines(text, line_starts),
+                line_starts,
+                _match_spans(text, pattern, multiline),
+                character_window,
+                line_window,
+                multiline,
+            )
+        elif multiline:
+            entries = _match_buffer(
+                file_path, text, line_starts, pattern, character_window, line_window
+            )
+        else:
+            lines = text.split("\n") if isinstance(text, str) else text
+            entries = _match_lines(
+                file_path, lines, pattern, character_window, line_window
+            )
+        if max_snippet_bytes is not None:
+            entries = _cap_snippet_bytes(entries, max_snippet_bytes)
+        return entries
+    count = _count_matches(
+        text,
+        pattern,
+        stop_at_first=output_mode == "files_with_matches",
+        multiline=multiline,
+    )
+    if not count:
+        return iter(())
+    if output_mode == "count":
+        return iter(({"path": file_path, "count": count},))
+    return iter(({"path": file_path},))
+
+
+def _grep_text_list(*args) -> List[Dict]:
+    """Picklable entry point running `_grep_text` eagerly in a worker."""
+    return list(_grep_text(*args))
+
+
+# directories the agent can use, created on first use, see _make_builtin_dir
+_BUILTIN_DIRS = ("/memories", "/artifacts")
+
+# threads running the async API of every VirtualFilesystem in the process
+ASYNC_WORKERS = min(8, os.cpu_count() or 1)
+_async_executor: Optional[ThreadPoolExecutor] = None
+_async_executor_lock = threading.Lock()
+
+
+def _get_async_executor() -> ThreadPoolExecutor:
+    """The bounded pool the async API offloads work to, created on first use.
+
+    Returns:
+        ThreadPoolExecutor: The process-wide pool of ASYNC_WORKERS threads.
+    """
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(
+                max_workers=ASYNC_WORKERS, thread_name_prefix="vfs-async"
+            )
+        return _async_executor
+
+
+ChangeOp = Literal["create", "write", "append", "mkdir", "remove", "restore"]
+
+
+class Change(NamedTuple):
+    """One entry of the change feed of a VirtualFilesystem.
+
+    'create' is a new empty file, 'write' an overwrite (of a possibly new
+    file), 'append' an append, 'mkdir' a new directory and 'remove' a
+    removed file or directory. 'restore' swapped the whole tree, its path is
+    '/' and consumers have to rescan.
+    """
+
+    version: int
+    op: ChangeOp
+    path: str
+
 
 class VirtualFilesystem:
-    def __init__(self):
+    def __init__(
+        self,
+        trigram_index: bool = False,
+        snapshot: Optional[Snapshot] = None,
+        storage: Literal["memory", "mmap"] = "memory",
+        spill_dir: Optional[str] = None,
+        mmap_threshold: int = 64 * 1024,
+        memory_quota: Optional[int] = None,
+        compression: Optional[Literal["zlib", "lzma"]] = None,
+        compress_threshold: int = 64 * 1024,
+        compress_idle: Optional[float] = 300.0,
+        dedup: bool = False,
+        change_log_size: int = 1024,
+        search_index: bool = False,
+    ):
         """
         Instantiates a virtual filesystem backend with public methods that can be exposed as tools
+
+        Args:
+            trigram_index (bool, optional): Maintain a trigram index on writes so that grep only scans files that can match. Defaults to False.
+            snapshot (Optional[Snapshot], optional): Start from the files of a snapshot, see snapshot(). Defaults to None (empty filesystem).
+            storage (Literal["memory", "mmap"], optional): Where file contents live. 'mmap' keeps files of at least mmap_threshold bytes in memory-mapped files under spill_dir, so large artifacts do not grow the Python heap. Defaults to 'memory'.
+            spill_dir (Optional[str], optional): Directory for the mapped files in 'mmap' storage. Defaults to the system temp directory.
+            mmap_threshold (int, optional): Minimum file size in bytes to map in 'mmap' storage. Smaller files stay in memory. Defaults to 64 KiB.
+            memory_quota (Optional[int], optional): Maximum bytes of file content held in memory. Past it, the least recently used files spill to disk under spill_dir and are paged back in when read. Defaults to None (unbounded).
+            compression (Optional[Literal["zlib", "lzma"]], optional): Store large and idle files compressed in memory with this codec. Reads decompress them through a small cache of hot files. Defaults to None (no compression).
+            compress_threshold (int, optional): With compression, minimum size in bytes of written files stored compressed right away. Defaults to 64 KiB.
+            compress_idle (Optional[float], optional): With compression, compress files that were not read or written for this many seconds. None disables idle compression. Defaults to 300.
+            dedup (bool, optional): Store file contents as hashed chunks in a chunk store shared by every VirtualFilesystem in the process, so identical content is held once. Takes precedence over mmap storage and compression for new content. Defaults to False.
+            change_log_size (int, optional): Number of recent changes kept for changes(). Defaults to 1024.
+            search_index (bool, optional): Maintain a BM25 index of the files for search(), updated from the change feed. Defaults to False.
         """
-        self.fs = MemoryFS()
+        self.storage = storage
+        self.spill_dir = spill_dir
+        self.mmap_threshold = mmap_threshold
+        self.memory_quota = memory_quota
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.compress_idle = compress_idle
+        self.dedup = dedup
+        # file tree with O(1) snapshots, shared structurally between forks
+        self.fs = SnapshotFS(
+            snapshot,
+            mmap_threshold=mmap_threshold if storage == "mmap" else None,
+            spill_dir=spill_dir,
+            memory_quota=memory_quota,
+            compression=compression,
+            compress_threshold=compress_threshold,
+            compress_idle=compress_idle,
+            chunk_store=shared_chunk_store() if dedup else None,
+        )
+        # default working directory for relative paths, calls and sessions
+        # can pass their own, see session()
         self.cwd = "/"
+        # readers (info, ls, read, glob, grep) share the lock, writers hold
+        # it alone so the side indexes never see a half applied write
+        self._rwlock = RWLock()
+        # change feed: version of the last change, the most recent changes
+        # and the callbacks notified of each one
+        self.version = 0
+        self.change_log_size = change_log_size
+        self._changes: deque = deque(maxlen=change_log_size)
+        self._subscribers: Dict[int, Callable[[Change], None]] = {}
+        self._next_subscriber = 0
+        # BM25 index for search(). Changed files are only marked by the change
+        # feed and re-indexed by the next search, so writes stay cheap
+        self._search_index: Optional[BM25Index] = BM25Index() if search_index else None
+        self._search_dirty: Set[str] = set()
+        self._search_stale = snapshot is not None
+        # searches share the read lock, so refreshing needs its own
+        self._search_lock = threading.Lock()
+        if search_index:
+            self.subscribe(self._mark_search_dirty)
 
-        # create some pre-existing directories that the agent can use
-        # /memories -> for memories in the current thread
-        # /artifacts -> in case there are any references to any artifacts
-        self.fs.makedirs("/memories")
-        self.fs.makedirs("/artifacts")
+        # line start offsets per file, kept in sync by write() so that ranged
+        # reads only touch the requested byte span
+        self._line_index: Dict[str, LineIndex] = {}
+        # character offsets of line starts, for mapping whole-buffer grep
+        # matches back to lines. Built lazily and dropped on write
+        self._char_line_starts: Dict[str, Sequence[int]] = {}
+        self._trigram_index: Optional[TrigramIndex] = (
+            TrigramIndex() if trigram_index else None
+        )
+        # set when the file tree was swapped under the trigram index, which
+        # is then rebuilt on the next grep
+        self._trigram_stale = snapshot is not None
+        # info dicts of existing paths, filled by info, ls and glob and
+        # dropped by write so that repeated lookups skip the filesystem
+        self._info_cache: Dict[str, Dict] = {}
+        # tree of all paths, kept in sync on create and remove so that glob
+        # never has to walk the filesystem. Built lazily for snapshots, see
+        # _get_paths
+        self._paths: Optional[PathTrie] = None if snapshot else PathTrie()
 
+    @staticmethod
     def _format_bytes_to_human_readable(size: int) -> str:
         """Convert bytes to human-readable format."""
         for unit in ["B", "KB", "MB", "GB", "TB", "PB"]:
@@ -40,48 +547,226 @@ class VirtualFilesystem:
                 return f"{size:.2f} {unit}"
             size /= 1024
 
-    def _resolve(self, path: str) -> str:
+    def _get_paths(self) -> PathTrie:
+        """Get the path trie, building it from the file tree if it is missing.
+
+        Returns:
+            PathTrie: The trie of all paths.
+        """
+        if self._paths is None:
+            paths = PathTrie()
+            for path, info in self.fs.walk.info("/"):
+                paths.add(path, is_dir=info.is_dir)
+            self._paths = paths
+        return self._paths
+
+    def _get_trigram_index(self) -> Optional[TrigramIndex]:
+        """Get the trigram index, rebuilding it if the file tree was swapped.
+
+        Returns:
+            Optional[TrigramIndex]: The index, or None if it is disabled.
+        """
+        if self._trigram_index is not None and self._trigram_stale:
+            index = TrigramIndex()
+            for path in self.fs.walk.files("/"):
+                index.add(path, self.fs.readtext(path))
+            self._trigram_index = index
+            self._trigram_stale = False
+        return self._trigram_index
+
+    def _reset_indexes(self) -> None:
+        """Drop the side indexes after the file tree was swapped.
+
+        Per-file indexes are rebuilt lazily on access, the path trie and the
+        trigram index on their next use.
+        """
+        self._line_index = {}
+        self._char_line_starts = {}
+        self._info_cache = {}
+        self._paths = None
+        self._trigram_stale = True
+
+    def _resolve(self, path: str, cwd: Optional[str] = None) -> str:
         """Resolve a path to an absolute normalized path.
 
-        Converts relative paths to absolute by joining with current working
+        Converts relative paths to absolute by joining with the working
         directory. Absolute paths are normalized but otherwise unchanged.
 
         Args:
             path (str): The path to resolve. Can be relative or absolute.
+            cwd (Optional[str], optional): Working directory to resolve against, itself relative to self.cwd. Defaults to None (self.cwd).
 
         Returns:
             str: The normalized absolute path.
         """
         if path.startswith("/"):
             return fs_path.normpath(path)
-        return fs_path.normpath(fs_path.join(self.cwd, path))
+        base = self.cwd if cwd is None else fs_path.join(self.cwd, cwd)
+        return fs_path.normpath(fs_path.join(base, path))
 
-    def info(self, path: str = "/") -> Dict:
-        """Get metadata information about a file or directory.
+    def _get_line_index(self, resolved: str) -> LineIndex:
+        """Get the line index of a file, building it if it is missing.
 
         Args:
-            path (str): Path to the file or directory. Defaults to root "/".
+            resolved (str): Absolute normalized path of the file.
 
         Returns:
-            Dict: Dictionary containing 'name', 'path', and 'type' (file/directory).
+            LineIndex: The line index of the file.
+        """
+        index = self._line_index.get(resolved)
+        if index is None:
+            index = LineIndex()
+            for chunk in self.fs.getblob(resolved).iter_chunks():
+                index.extend(chunk)
+            self._line_index[resolved] = index
+        return index
 
-        Raises:
-            FSError: If the path does not exist.
+    def _get_char_line_starts(
+        self, resolved: str, text: Union[str, Sequence[str]]
+    ) -> Sequence[int]:
+        """Get the character line start offsets of a file, building them if missing.
+
+        Args:
+            resolved (str): Absolute normalized path of the file.
+            text (Union[str, Sequence[str]]): Current full text of the file, or its lines.
+
+        Returns:
+            Sequence[int]: Character offsets of the line starts.
         """
-        resolved = self._resolve(path)
-        info = self.fs.getinfo(resolved)
-        return {
+        starts = self._char_line_starts.get(resolved)
+        if starts is None:
+            starts = char_line_starts(text)
+            self._char_line_starts[resolved] = starts
+        return starts
+
+    def _cache_info(self, resolved: str, info: FSInfo) -> Dict:
+        """Build the info dict of a path from its details and cache it.
+
+        Args:
+            resolved (str): Absolute normalized path.
+            info (FSInfo): Info of the path, with the 'details' namespace.
+
+        Returns:
+            Dict: The cached info dict.
+        """
+        entry = {
             "name": info.name,
             "type": "directory" if info.is_dir else "file",
             "path": resolved,
-            "size": self._format_bytes_to_human_readable(self.fs.getsize(resolved)),
+            "size": self._format_bytes_to_human_readable(info.size),
         }
+        self._info_cache[resolved] = entry
+        return entry
+
+    def info(self, path: str = "/", cwd: Optional[str] = None) -> Dict:
+        """Get metadata information about a file or directory.
+
+        Results are cached per path until the path is written to. With a
+        memory quota set, the root also reports 'memory_quota' and
+        'memory_used'. With compression, files also report 'stored_size',
+        their size after compression, and the root reports 'logical_size'
+        and 'stored_size' totals over all files.
+
+        Args:
+            path (str): Path to the file or directory. Defaults to root "/".
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            Dict: Dictionary containing 'name', 'path', 'type' (file/directory) and 'size'.
+
+        Raises:
+            FSError: If the path does not exist.
+        """
+        with self._rwlock.read():
+            return self._info(self._resolve(path, cwd))
+
+    def _info(self, resolved: str) -> Dict:
+        """Get the info of a resolved path, see info.
+
+        Args:
+            resolved (str): Absolute normalized path.
+
+        Returns:
+            Dict: The info dictionary.
+        """
+        entry = self._info_cache.get(resolved)
+        if entry is None:
+            entry = self._cache_info(
+                resolved, self.fs.getinfo(resolved, namespaces=["details"])
+            )
+        entry = dict(entry)
+        if resolved == "/" and self.memory_quota is not None:
+            entry["memory_quota"] = self._format_bytes_to_human_readable(
+                self.memory_quota
+            )
+            entry["memory_used"] = self._format_bytes_to_human_readable(
+                self.fs.resident_bytes
+            )
+        if self.compression is not None:
+            if resolved == "/":
+                entry["logical_size"] = self._format_bytes_to_human_readable(
+                    self.fs.logical_bytes
+                )
+                stored = self.fs.stored_bytes
+            else:
+                stored = self.fs.getstoredsize(resolved)
+            entry["stored_size"] = self._format_bytes_to_human_readable(stored)
+        return entry
+
+    def dedup_stats(self) -> Optional[Dict]:
+        """Get statistics of the process-wide chunk store used for deduplication.
+
+        The numbers cover every VirtualFilesystem created with dedup=True.
+
+        Returns:
+            Optional[Dict]: Dictionary with 'chunks', 'stored_bytes', 'logical_bytes' and 'dedup_ratio', or None without dedup.
+        """
+        if self.fs.chunk_store is None:
+            return None
+        return self.fs.chunk_store.stats()
+
+    def memory_stats(self) -> Dict:
+        """Get memory quota usage and cache counters for monitoring.
+
+        Hits are reads served from memory, misses are reads that paged a
+        spilled file back in, and evictions count files spilled to disk.
+        Decompression hits and misses count reads of compressed files
+        served from or missing the decompression cache.
+
+        Returns:
+            Dict: Dictionary with 'quota', 'resident_bytes', 'resident_files', 'hits', 'misses', 'evictions', 'decompress_hits', 'decompress_misses', 'logical_bytes' and 'stored_bytes'.
+        """
+        return self.fs.memory_stats()
+
+    def ls(self, path: str = "/", cwd: Optional[str] = None) -> List[Dict]:
+        """List the contents of a directory.
+
+        Name, type and size of all entries are read in a single scan of the
+        directory and cached for later info calls.
+
+        Args:
+            path (str): Path to the directory. Defaults to root "/".
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            List[Dict]: Info dictionaries of the entries, see info.
+
+        Raises:
+            FSError: If the path does not exist or is not a directory.
+        """
+        resolved = self._resolve(path, cwd)
+        with self._rwlock.read():
+            return [
+                dict(self._cache_info(fs_path.join(resolved, info.name), info))
+                for info in self.fs.scandir(resolved, namespaces=["details"])
+            ]
 
     def write(
         self,
         path: str,
         content: Optional[str] = None,
         mode: Literal["append", "overwrite"] = "overwrite",
+        cwd: Optional[str] = None,
     ) -> bool:
         """Write content to a file, creating it if it doesn't exist.
 
@@ -93,6 +778,7 @@ class VirtualFilesystem:
             path (str): Path to the file to write.
             content (Optional[str], optional): Text content to write. If None, only ensures file exists. Defaults to None.
             mode (Literal["append", "overwrite"], optional): Write mode - 'append' to add to end, 'overwrite' to replace. Defaults to 'overwrite'.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
 
         Returns:
             bool: True on success.
@@ -100,64 +786,446 @@ class VirtualFilesystem:
         Raises:
             FSError: If parent directory doesn't exist or path is invalid.
         """
-        resolved = self._resolve(path)
+        with self._rwlock.write():
+            return self._write(self._resolve(path, cwd), content, mode)
+
+    def _write(
+        self,
+        resolved: str,
+        content: Optional[str],
+        mode: Literal["append", "overwrite"],
+    ) -> Dict:
+        """Write to a resolved path under the write lock, see write.
+
+        Args:
+            resolved (str): Absolute normalized path of the file.
+            content (Optional[str]): Text content to write, or None to only create the file.
+            mode (Literal["append", "overwrite"]): Write mode.
 
+        Returns:
+            Dict: Info of the written file.
+        """
         # Step 1: Ensure file exists
         if not self.fs.exists(resolved):
+            parts = fs_path.iteratepath(resolved)
+            if len(parts) > 1:
+                self._make_builtin_dir("/" + parts[0])
             self.fs.create(resolved)
+            if self._paths is not None:
+                self._paths.add(resolved)
+            self._line_index[resolved] = LineIndex()
+            if self._trigram_index is not None:
+                self._trigram_index.add(resolved, "")
+            if content is None:
+                self._emit("create", resolved)
 
         # Step 2: Update content if provided
         if content is not None:
+            self._info_cache.pop(resolved, None)
+            self._char_line_starts.pop(resolved, None)
+            data = content.encode("utf-8")
             if mode == "append":
-                self.fs.appendtext(resolved, content)
+                self.fs.appendbytes(resolved, data)
+                index = self._line_index.get(resolved)
+                if index is not None:
+                    index.extend(data)
+                if self._trigram_index is not None:
+                    self._trigram_index.extend(resolved, content)
             else:
-                self.fs.writetext(resolved, content)
+                self.fs.writebytes(resolved, data)
+                self._line_index[resolved] = LineIndex.from_bytes(data)
+                if self._trigram_index is not None:
+                    self._trigram_index.add(resolved, content)
+            self._emit("append" if mode == "append" else "write", resolved)
+
+        return self._info(resolved)
+
+    def _make_builtin_dir(self, resolved: str) -> None:
+        """Create a built-in directory if it is missing.
+
+        /memories (memories of the current thread) and /artifacts (for any
+        referenced artifacts) can always be written to or entered, but only
+        exist once that happened, so a fresh filesystem is empty. Must be
+        called with the write lock held.
+
+        Args:
+            resolved (str): Absolute normalized path, ignored unless it is a built-in directory.
+        """
+        if resolved in _BUILTIN_DIRS and not self.fs.exists(resolved):
+            self.fs.makedir(resolved)
+            if self._paths is not None:
+                self._paths.add(resolved, is_dir=True)
+            self._emit("mkdir", resolved)
+
+    def write_many(self, entries: List[Dict], cwd: Optional[str] = None) -> List[Dict]:
+        """Write several files in one pass under the write lock.
+
+        The batch is all or nothing: if any write fails, every file is
+        rolled back to its state before the batch and the error is raised.
+
+        Args:
+            entries (List[Dict]): Dictionaries with 'path', and optionally 'content' and 'mode', the arguments of write.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            List[Dict]: Info of each written file, in order.
+
+        Raises:
+            FSError: If a parent directory doesn't exist or a path is invalid.
+        """
+        with self._rwlock.write():
+            before = self.snapshot()
+            try:
+                return [
+                    self._write(
+                        self._resolve(entry["path"], cwd),
+                        entry.get("content"),
+                        entry.get("mode", "overwrite"),
+                    )
+                    for entry in entries
+                ]
+            except Exception:
+                self.restore(before)
+                raise
+
+    def mkdir(self, path: str, cwd: Optional[str] = None) -> Dict:
+        """Create a directory, along with any missing parent directories.
+
+        Args:
+            path (str): Path of the directory to create.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            Dict: Info of the created directory.
+
+        Raises:
+            FSError: If the directory already exists or a parent is a file.
+        """
+        resolved = self._resolve(path, cwd)
+        with self._rwlock.write():
+            self.fs.makedirs(resolved)
+            if self._paths is not None:
+                self._paths.add(resolved, is_dir=True)
+            self._emit("mkdir", resolved)
+            return self._info(resolved)
+
+    def remove(self, path: str, cwd: Optional[str] = None) -> bool:
+        """Remove a file, or a directory with everything below it.
+
+        Args:
+            path (str): Path of the file or directory to remove.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            bool: True on success.
+
+        Raises:
+            FSError: If the path does not exist.
+        """
+        with self._rwlock.write():
+            self._remove(self._resolve(path, cwd))
+        return True
+
+    def _remove(self, resolved: str) -> None:
+        """Remove a resolved path under the write lock, see remove.
+
+        Args:
+            resolved (str): Absolute normalized path.
+        """
+        paths = self._get_paths()
+        is_dir = self.fs.getinfo(resolved).is_dir
+        if is_dir:
+            self.fs.removetree(resolved)
+        else:
+            self.fs.remove(resolved)
+        for file_path in paths.remove(resolved):
+            self._line_index.pop(file_path, None)
+            self._char_line_starts.pop(file_path, None)
+            if self._trigram_index is not None:
+                self._trigram_index.remove(file_path)
+            if file_path != resolved:
+                self._emit("remove", file_path)
+        prefix = resolved.rstrip("/") + "/"
+        for cached in [p for p in self._info_cache if p.startswith(prefix)]:
+            del self._info_cache[cached]
+        self._info_cache.pop(resolved, None)
+        self._emit("remove", resolved)
+
+    def snapshot(self) -> Snapshot:
+        """Capture the current state of all files in O(1).
+
+        Directories and file contents are shared between the snapshot and
+        the live filesystem, and only the directories on the path of a later
+        write are copied, once.
+
+        Returns:
+            Snapshot: Frozen state to pass to restore(), fork() or VirtualFilesystem(snapshot=...).
+        """
+        with self._rwlock.read():
+            return self.fs.snapshot()
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Roll all files back to a snapshot in O(1).
+
+        Side indexes are rebuilt lazily, on the next read, glob or grep.
+
+        Args:
+            snapshot (Snapshot): A snapshot of this or another VirtualFilesystem.
+        """
+        with self._rwlock.write():
+            self.fs.restore(snapshot)
+            self._reset_indexes()
+            self._emit("restore", "/")
+
+    def _emit(self, op: ChangeOp, path: str) -> None:
+        """Record a change under the write lock and notify the subscribers.
+
+        Args:
+            op (ChangeOp): Kind of change, see Change.
+            path (str): Absolute normalized path that changed.
+        """
+        self.version += 1
+        change = Change(self.version, op, path)
+        self._changes.append(change)
+        for callback in list(self._subscribers.values()):
+            callback(change)
+
+    def _mark_search_dirty(self, change: Change) -> None:
+        """Change feed callback queueing changed files for the search index.
+
+        Args:
+            change (Change): The change that was applied.
+        """
+        if change.op == "restore":
+            self._search_stale = True
+            self._search_dirty.clear()
+        elif change.op != "mkdir":
+            self._search_dirty.add(change.path)
+
+    def _refresh_search_index(self) -> BM25Index:
+        """Bring the search index up to date, under the read and search locks.
+
+        Returns:
+            BM25Index: The up to date index.
+        """
+        if self._search_stale:
+            index = BM25Index()
+            for path in self.fs.walk.files("/"):
+                index.add(path, self.fs.readtext(path))
+            self._search_index = index
+            self._search_stale = False
+            self._search_dirty.clear()
+        for path in self._search_dirty:
+            if self.fs.isfile(path):
+                self._search_index.add(path, self.fs.readtext(path))
+            else:
+                # removed, or a directory that was removed with its files
+                self._search_index.remove(path)
+        self._search_dirty.clear()
+        return self._search_index
+
+    def changes(self, since: int = 0) -> Optional[List[Change]]:
+        """Get the changes made after a version, oldest first.
+
+        Args:
+            since (int, optional): Version the consumer is up to date with, usually the version of the last change it saw. Defaults to 0.
+
+        Returns:
+            Optional[List[Change]]: The changes with a version greater than since, or None if some of them already fell out of the change log and the consumer has to rescan.
+        """
+        with self._rwlock.read():
+            if since >= self.version:
+                return []
+            if not self._changes or self._changes[0].version > since + 1:
+                return None
+            # versions in the log are consecutive
+            start = since + 1 - self._changes[0].version
+            return [self._changes[i] for i in range(start, len(self._changes))]
+
+    def subscribe(self, callback: Callable[[Change], None]) -> Callable[[], None]:
+        """Call a function on every change, right after it is applied.
+
+        Callbacks run synchronously under the write lock, so they see each
+        change in order and may read the filesystem, but must not write to
+        it. An exception raised by a callback propagates to the writer.
+
+        Args:
+            callback (Callable[[Change], None]): Function called with each change.
+
+        Returns:
+            Callable[[], None]: Function that unsubscribes the callback.
+        """
+        with self._rwlock.write():
+            key = self._next_subscriber
+            self._next_subscriber += 1
+            self._subscribers[key] = callback
+
+        def unsubscribe() -> None:
+            with self._rwlock.write():
+                self._subscribers.pop(key, None)
 
-        return self.info(resolved)
+        return unsubscribe
+
+    def fork(self, snapshot: Optional[Snapshot] = None) -> "VirtualFilesystem":
+        """Create an independent filesystem that starts from the current state.
+
+        Takes O(1): the fork shares all files with this filesystem until
+        either side writes to them.
+
+        Args:
+            snapshot (Optional[Snapshot], optional): Fork from this snapshot instead of the current state. Defaults to None.
+
+        Returns:
+            VirtualFilesystem: The fork, with the same working directory, index and storage settings.
+        """
+        fork = VirtualFilesystem(
+            trigram_index=self._trigram_index is not None,
+            snapshot=snapshot if snapshot is not None else self.snapshot(),
+            storage=self.storage,
+            spill_dir=self.spill_dir,
+            mmap_threshold=self.mmap_threshold,
+            memory_quota=self.memory_quota,
+            compression=self.compression,
+            compress_threshold=self.compress_threshold,
+            compress_idle=self.compress_idle,
+            dedup=self.dedup,
+            change_log_size=self.change_log_size,
+            search_index=self._search_index is not None,
+        )
+        fork.cwd = self.cwd
+        return fork
+
+    def session(self, cwd: str = "/") -> "VirtualFilesystemSession":
+        """Create a view of this filesystem with its own working directory.
+
+        The session shares files, indexes and locks with this filesystem,
+        only relative paths resolve against its cwd instead of self.cwd, so
+        concurrent agents can each keep a working directory.
+
+        Args:
+            cwd (str, optional): Working directory of the session, relative to self.cwd. Defaults to root "/".
+
+        Returns:
+            VirtualFilesystemSession: The session.
+        """
+        return VirtualFilesystemSession(self, cwd)
 
     def read(
-        self, path: str, start: Optional[int] = None, end: Optional[int] = None
+        self,
+        path: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        cwd: Optional[str] = None,
     ) -> Dict:
         """Read text content from a file, optionally a specific line range.
 
-        Uses 0-indexed line numbers with Python slice semantics.
+        Uses 0-indexed line numbers with Python slice semantics. Only the byte
+        span of the requested lines is read, using the file's line index.
 
         Args:
             path (str): Path to the file to read.
             start (Optional[int], optional): Starting line index (0-indexed, inclusive). Defaults to 0.
             end (Optional[int], optional): Ending line index (0-indexed, exclusive). Defaults to total lines.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
 
         Returns:
-            Dict: Dictionary with 'info' (file metadata), 'start', 'end', and 'content'.
+            Dict: Dictionary with 'info' (file metadata), 'start', 'end', 'total_lines' and 'content'.
 
         Raises:
             FSError: If the file does not exist.
         """
-        full_content = self.fs.readtext(self._resolve(path))
-        lines = full_content.split("\n")
+        with self._rwlock.read():
+            lines = self._read_lines(self._resolve(path, cwd), start, end)
+        return FileContent(**lines).model_dump()
+
+    def _read_lines(
+        self, resolved: str, start: Optional[int], end: Optional[int]
+    ) -> Dict:
+        """Read a line range of a file, see read.
+
+        Args:
+            resolved (str): Absolute normalized path of the file.
+            start (Optional[int]): Starting line index, or None for 0.
+            end (Optional[int]): Ending line index (exclusive), or None for the total lines.
+
+        Returns:
+            Dict: The fields of FileContent.
+        """
+        index = self._get_line_index(resolved)
+        total_lines = len(index)
         if start is None:
             start = 0
         if end is None:
-            end = len(lines)
+            end = total_lines
         start = max(0, start)
-        end = max(min(len(lines), end), start + 1)
-        subset_content = "\n".join(lines[start:end])
-        out = FileContent(
-            info=self.info(self._resolve(path)),
-            start=start,
-            end=end,
-            content=subset_content,
-        )
-        return out.model_dump()
+        end = max(min(total_lines, end), start + 1)
+        if start >= total_lines:
+            subset_content = ""
+        else:
+            byte_start, byte_end = index.span(start, end)
+            subset_content = (
+                self.fs.getblob(resolved).tobytes(byte_start, byte_end).decode("utf-8")
+            )
+        return {
+            "info": self._info(resolved),
+            "start": start,
+            "end": end,
+            "total_lines": total_lines,
+            "content": subset_content,
+        }
+
+    def read_many(
+        self,
+        paths: List[str],
+        ranges: Optional[List[Optional[Tuple[Optional[int], Optional[int]]]]] = None,
+        cwd: Optional[str] = None,
+    ) -> List[Dict]:
+        """Read several files in one pass under the read lock.
+
+        Each file is read like read() would, but without per-call schema
+        validation. A file that cannot be read does not fail the batch,
+        its entry carries the error instead.
+
+        Args:
+            paths (List[str]): Paths of the files to read.
+            ranges (Optional[List[Optional[Tuple[Optional[int], Optional[int]]]]], optional): (start, end) line range per path, see read. None, or a None entry, reads the whole file. Defaults to None.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            List[Dict]: One dictionary per path, in order, as returned by read, or with 'path' and 'error' if the file could not be read.
+
+        Raises:
+            ValueError: If ranges is given with a different length than paths.
+        """
+        if ranges is None:
+            ranges = [None] * len(paths)
+        if len(ranges) != len(paths):
+            raise ValueError("ranges must have one entry per path")
+        results = []
+        with self._rwlock.read():
+            for path, span in zip(paths, ranges):
+                start, end = span if span is not None else (None, None)
+                try:
+                    results.append(
+                        self._read_lines(self._resolve(path, cwd), start, end)
+                    )
+                except FSError as e:
+                    results.append({"path": path, "error": str(e)})
+        return results
 
-    def glob(self, pattern: str) -> List[Dict]:
+    def glob(self, pattern: str, cwd: Optional[str] = None) -> List[Dict]:
         """Find files matching a glob pattern.
 
         The pattern is resolved relative to the current working directory.
         Standard glob wildcards are supported: *, **, ?
+        Patterns are matched against an in-memory path tree, segment by
+        segment, and `<dir>/**/*.<ext>` is answered from an extension index.
+        A pattern ending in a name matches files, one ending in '/' matches
+        directories and a trailing '**' matches both.
 
         Args:
             pattern: Glob pattern to match (e.g., '*.py', 'dir/**/*.txt').
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
 
         Returns:
             List of info dictionaries for each matching file/directory.
@@ -166,14 +1234,16 @@ class VirtualFilesystem:
         if "/" in pattern:
             parent = fs_path.dirname(pattern)
             glob_part = fs_path.basename(pattern)
-            resolved_parent = self._resolve(parent)
+            resolved_parent = self._resolve(parent, cwd)
             full_pattern = fs_path.join(resolved_parent, glob_part)
         else:
             # Pattern like "*.py" - resolve relative to cwd
-            full_pattern = fs_path.join(self.cwd, pattern)
+            full_pattern = fs_path.join(self._resolve(".", cwd), pattern)
 
-        matches = self.fs.glob(full_pattern)
-        return [self.info(match.path) for match in matches]
+        if pattern.endswith("/") and not full_pattern.endswith("/"):
+            full_pattern += "/"
+        with self._rwlock.read():
+            return [self._info(match) for match in self._get_paths().glob(full_pattern)]
 
     def _process_file(
         self,
@@ -181,47 +1251,330 @@ class VirtualFilesystem:
         pattern: re.Pattern,
         character_window: Optional[int] = None,
         line_window: Optional[int] = None,
-    ) -> List[Dict]:
+        output_mode: GrepOutputMode = "content",
+        multiline: bool = False,
+        merge_context: bool = False,
+        max_snippet_bytes: Optional[int] = None,
+    ) -> Iterator[Dict]:
         """Process a single file for grep pattern matches.
 
-        Internal method used by grep() to search within files.
+        Internal method used by iter_grep() to search within files.
 
         Args:
             file_path (str): Absolute path to the file to search.
             pattern (re.Pattern): Compiled regex pattern to search for.
             character_window (Optional[int], optional): Context characters around match. Mutually exclusive with line_window. Defaults to None.
             line_window (Optional[int], optional): Context lines around match. Takes precedence over character_window. Defaults to None.
+            output_mode (GrepOutputMode, optional): See iter_grep. Defaults to 'content'.
+            multiline (bool, optional): Match the whole buffer at once, see iter_grep. Defaults to False.
+            merge_context (bool, optional): Merge overlapping context windows, see iter_grep. Defaults to False.
+            max_snippet_bytes (Optional[int], optional): Budget of snippet bytes for the file, see iter_grep. Defaults to None.
 
         Returns:
-            List of match dictionaries with keys: 'path', 'snippet', 'line_number', 'match_range'.
+            Iterator of match dictionaries with keys: 'path', 'snippet', 'line_number', 'match_range', 'match', of merged blocks, or of per-file entries for the other output modes.
         """
-        content = self.read(file_path)["content"]
-        lines = content.split("\n")
-        results = []
-        for row, line in enumerate(lines):
-            for match in pattern.finditer(line):
-                match_start = match.start()
-                match_end = match.end()
-                if line_window is not None:
-                    start = max(0, row - line_window)
-                    end = min(len(lines), row + line_window + 1)
-                    snippet = "\n".join(lines[start:end])
-                elif character_window is not None:
-                    char_start = max(0, match_start - character_window)
-                    char_end = min(len(line), match_end + character_window)
-                    snippet = line[char_start:char_end]
-                else:
-                    snippet = line
-                results.append(
-                    {
-                        "path": file_path,
-                        "snippet": snippet,
-                        "line_number": row,
-                        "match_range": [match_start, match_end],
-                        "match": match.group(0),
-                    }
+        # the content is taken under the read lock, matching runs on it after
+        # the lock is released so a slow scan never holds up writers
+        with self._rwlock.read():
+            if not self.fs.isfile(file_path):
+                # removed by a concurrent writer since the file list was taken
+                return iter(())
+            text, line_starts = self._grep_input(
+                file_path, output_mode, multiline, merge_context
+            )
+        return _grep_text(
+            file_path,
+            text,
+            pattern,
+            character_window,
+            line_window,
+            output_mode,
+            multiline,
+            line_starts,
+            merge_context,
+            max_snippet_bytes,
+        )
+
+    def _grep_input(
+        self,
+        file_path: str,
+        output_mode: GrepOutputMode,
+        multiline: bool,
+        merge_context: bool,
+        whole_text: bool = False,
+    ) -> Tuple[Union[str, BlobLines], Optional[Sequence[int]]]:
+        """Content of a file to grep, and its character line starts if the output needs them.
+
+        The lines are decoded from the blob a chunk at a time, so mapped
+        files are never held as a whole string. Multiline matching runs the
+        regex over the whole decoded text, as matches may span any number of
+        lines. Must be called with the read lock held.
+
+        Args:
+            file_path (str): Absolute path of the file.
+            output_mode (GrepOutputMode): See iter_grep.
+            multiline (bool): Match the whole buffer at once, see iter_grep.
+            merge_context (bool): Merge overlapping context windows, see iter_grep.
+            whole_text (bool, optional): Decode the whole text anyway, e.g. to ship it to another process. Defaults to False.
+
+        Returns:
+            Tuple[Union[str, BlobLines], Optional[Sequence[int]]]: The text or lines of the file and its character line starts.
+        """
+        if multiline or whole_text:
+            text = self.fs.readtext(file_path)
+        else:
+            # appends extend the line index in place, so the scan gets its
+            # own copy matching the blob
+            text = BlobLines(
+                self.fs.getblob(file_path), self._get_line_index(file_path).copy()
+            )
+        line_starts = None
+        if output_mode == "content" and (multiline or merge_context):
+            line_starts = self._get_char_line_starts(file_path, text)
+        return text, line_starts
+
+    def _grep_candidates(self, pattern: re.Pattern) -> Optional[set]:
+        """Files that can contain a match of the pattern, from the trigram index.
+
+        Args:
+            pattern (re.Pattern): Compiled regex pattern to search for.
+
+        Returns:
+            Optional[set]: Candidate file paths, or None if the index is disabled or the pattern has no literal to look up.
+        """
+        index = self._get_trigram_index()
+        if index is None:
+            return None
+        return index.candidates(extract_literals(pattern.pattern, pattern.flags))
+
+    def _list_files(
+        self, resolved: str, file_name_pattern: Optional[str | List] = None
+    ) -> List[str]:
+        """List the files under a path, in path order.
+
+        Args:
+            resolved (str): Absolute path to a file or directory.
+            file_name_pattern (Optional[str  |  List], optional): Glob pattern(s) to filter files when listing directories. Defaults to None.
+
+        Returns:
+            List[str]: Absolute paths of the files. A file path lists itself.
+
+        Raises:
+            FSError: If the path does not exist.
+        """
+        if not self.fs.getinfo(resolved).is_dir:
+            return [resolved]
+        if file_name_pattern is None:
+            filters = None
+        elif isinstance(file_name_pattern, list):
+            filters = file_name_pattern
+        else:
+            filters = [file_name_pattern]
+        walker = self.fs.walk
+        return sorted(walker.files(path=resolved, filter=filters))
+
+    def _grep_files(
+        self,
+        resolved: str,
+        pattern: re.Pattern,
+        file_name_pattern: Optional[str | List] = None,
+    ) -> List[str]:
+        """List the files a grep has to scan, in path order.
+
+        Args:
+            resolved (str): Absolute path to the file or directory to search.
+            pattern (re.Pattern): Compiled regex pattern, used to prune files with the trigram index.
+            file_name_pattern (Optional[str  |  List], optional): Glob pattern(s) to filter files when searching directories. Defaults to None.
+
+        Returns:
+            List[str]: Absolute paths of the files to scan.
+
+        Raises:
+            FSError: If the path does not exist.
+        """
+        files = self._list_files(resolved, file_name_pattern)
+        candidates = self._grep_candidates(pattern)
+        if candidates is not None:
+            files = [f for f in files if f in candidates]
+        return files
+
+    def _parallel_grep(
+        self,
+        files: List[str],
+        pattern: re.Pattern,
+        character_window: Optional[int],
+        line_window: Optional[int],
+        output_mode: GrepOutputMode,
+        multiline: bool,
+        merge_context: bool,
+        max_snippet_bytes: Optional[int],
+        workers: int,
+        executor: Literal["thread", "process"],
+    ) -> Iterator[List[Dict]]:
+        """Grep files on a worker pool, yielding per-file entries in input order.
+
+        At most 2 * workers files are in flight, so stopping early does not
+        read or ship the rest of the corpus, and pending work is cancelled.
+        Thread workers scan the lines decoded from the blob like
+        `_process_file`, process workers are shipped the whole text.
+
+        Args:
+            files (List[str]): Absolute paths of the files to scan, in output order.
+            pattern (re.Pattern): Compiled regex pattern to search for.
+            character_window (Optional[int]): Context characters around match.
+            line_window (Optional[int]): Context lines around match.
+            output_mode (GrepOutputMode): See iter_grep.
+            multiline (bool): Match the whole buffer at once, see iter_grep.
+            merge_context (bool): Merge overlapping context windows, see iter_grep.
+            max_snippet_bytes (Optional[int]): Budget of snippet bytes per file, see iter_grep.
+            workers (int): Number of workers in the pool.
+            executor (Literal["thread", "process"]): Kind of pool to use.
+
+        Yields:
+            List[Dict]: The grep entries of each file.
+        """
+        pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_cls(max_workers=workers) as pool:
+            pending = deque()
+            try:
+                for f in files:
+                    with self._rwlock.read():
+                        if not self.fs.isfile(f):
+                            continue
+                        text, line_starts = self._grep_input(
+                            f,
+                            output_mode,
+                            multiline,
+                            merge_context,
+                            whole_text=executor == "process",
+                        )
+                    pending.append(
+                        pool.submit(
+                            _grep_text_list,
+                            f,
+                            text,
+                            pattern,
+                            character_window,
+                            line_window,
+                            output_mode,
+                            multiline,
+                            line_starts,
+                            merge_context,
+                            max_snippet_bytes,
+                        )
+                    )
+                    if len(pending) >= 2 * workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_grep(
+        self,
+        grep_pattern: str,
+        path: str,
+        file_name_pattern: Optional[str | List] = None,
+        character_window: Optional[int] = None,
+        line_window: Optional[int] = None,
+        ignore_case: bool = False,
+        output_mode: GrepOutputMode = "content",
+        max_results: Optional[int] = None,
+        max_files: Optional[int] = None,
+        workers: Optional[int] = None,
+        executor: Literal["thread", "process"] = "thread",
+        multiline: bool = False,
+        merge_context: bool = False,
+        max_snippet_bytes: Optional[int] = None,
+        cwd: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Iterator[Dict]:
+        """Lazily search for regex pattern matches within files.
+
+        Files are scanned one at a time in path order and scanning stops as
+        soon as max_results entries have been yielded or max_files files have
+        produced output. The 'files_with_matches' and 'count' modes skip
+        snippet construction, and 'files_with_matches' stops reading a file
+        at its first match.
+        Note: When path is a file, file_name_pattern is ignored.
+
+        Args:
+            grep_pattern (str): Regex pattern to search for.
+            path (str): Path to file or directory to search.
+            file_name_pattern (Optional[str  |  List], optional): Glob pattern(s) to filter files when searching directories. Defaults to None.
+            character_window (Optional[int], optional): Number of characters to include around match. Defaults to None.
+            line_window (Optional[int], optional): Number of lines to include around match (takes precedence). Defaults to None.
+            ignore_case (bool, optional): Whether to perform case-insensitive matching. Defaults to False.
+            output_mode (GrepOutputMode, optional): 'content' yields match dicts, 'files_with_matches' yields {'path'} per matching file, 'count' yields {'path', 'count'} per matching file. Defaults to 'content'.
+            max_results (Optional[int], optional): Maximum number of entries to yield. Defaults to None (unbounded).
+            max_files (Optional[int], optional): Maximum number of matching files to report on. Defaults to None (unbounded).
+            workers (Optional[int], optional): Scan files on a pool of this many workers when searching several files. Results keep path order. Defaults to None (single thread).
+            executor (Literal["thread", "process"], optional): Pool kind for workers. Threads share the GIL with the regex engine and mostly help with slow storage, processes scale CPU-heavy regexes across cores at the cost of shipping file text. Defaults to 'thread'.
+            multiline (bool, optional): Run one search over each whole file instead of one per line, so matches can span line breaks. '^' and '$' still anchor at line boundaries. Each file is decoded into a single string for the search, where other modes decode it a chunk of lines at a time. Matches also report 'end_line_number', and 'match_range' is relative to the start of 'line_number'. Defaults to False.
+            merge_context (bool, optional): Merge matches whose context windows overlap or touch into one block per group, like ripgrep, instead of one snippet per match. Blocks have 'path', 'snippet', 'line_number' and 'end_line_number' (the lines the snippet spans) and 'matches', a list of {'line_number', 'match_range', 'match'} with 'match_range' relative to the start of the snippet. Defaults to False.
+            max_snippet_bytes (Optional[int], optional): Cap on the UTF-8 bytes of snippets reported per file in 'content' mode. The entry crossing the cap is cut short and flagged with 'truncated', later entries of the file are dropped. Defaults to None (unbounded).
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+            cancel_event (Optional[threading.Event], optional): Stop scanning once the event is set, checked before each file and each entry. Defaults to None.
+
+        Yields:
+            Dict: One entry per match, or per matching file, depending on output_mode.
+        """
+        flags = re.IGNORECASE if ignore_case else 0
+        if multiline:
+            flags |= re.MULTILINE
+        compiled = re.compile(grep_pattern, flags=flags)
+        with self._rwlock.read():
+            files = self._grep_files(
+                self._resolve(path, cwd), compiled, file_name_pattern
+            )
+        if workers is not None and workers > 1 and len(files) > 1:
+            per_file = self._parallel_grep(
+                files,
+                compiled,
+                character_window,
+                line_window,
+                output_mode,
+                multiline,
+                merge_context,
+                max_snippet_bytes,
+                workers,
+                executor,
+            )
+        else:
+            per_file = (
+                self._process_file(
+                    f,
+                    compiled,
+                    character_window,
+                    line_window,
+                    output_mode,
+                    multiline,
+                    merge_context,
+                    max_snippet_bytes,
                 )
-        return results
+                for f in files
+                # a cancelled scan does not even set up the remaining files
+                if cancel_event is None or not cancel_event.is_set()
+            )
+        n_results = 0
+        n_files = 0
+        with closing(per_file):
+            for entries in per_file:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if max_files is not None and n_files >= max_files:
+                    return
+                matched = False
+                for entry in entries:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    if max_results is not None and n_results >= max_results:
+                        return
+                    matched = True
+                    n_results += 1
+                    yield entry
+                n_files += matched
 
     def grep(
         self,
@@ -231,10 +1584,22 @@ class VirtualFilesystem:
         character_window: Optional[int] = None,
         line_window: Optional[int] = None,
         ignore_case: bool = False,
+        output_mode: GrepOutputMode = "content",
+        max_results: Optional[int] = None,
+        max_files: Optional[int] = None,
+        workers: Optional[int] = None,
+        executor: Literal["thread", "process"] = "thread",
+        multiline: bool = False,
+        merge_context: bool = False,
+        max_snippet_bytes: Optional[int] = None,
+        cwd: Optional[str] = None,
     ) -> List[Dict]:
         """Search for regex pattern matches within files.
 
         Searches a file or recursively walks a directory to find matches.
+        With the trigram index enabled, files that cannot contain the literal
+        parts of the pattern are skipped without being read. See iter_grep for
+        the streaming variant.
         Note: When path is a file, file_name_pattern is ignored.
 
         Args:
@@ -244,29 +1609,347 @@ class VirtualFilesystem:
             character_window (Optional[int], optional): Number of characters to include around match. Defaults to None.
             line_window (Optional[int], optional): Number of lines to include around match (takes precedence). Defaults to None.
             ignore_case (bool, optional): Whether to perform case-insensitive matching. Defaults to False.
+            output_mode (GrepOutputMode, optional): Shape of the results, see iter_grep. Defaults to 'content'.
+            max_results (Optional[int], optional): Maximum number of results. Defaults to None (unbounded).
+            max_files (Optional[int], optional): Maximum number of matching files to report on. Defaults to None (unbounded).
+            workers (Optional[int], optional): Size of the worker pool, see iter_grep. Defaults to None (single thread).
+            executor (Literal["thread", "process"], optional): Pool kind for workers, see iter_grep. Defaults to 'thread'.
+            multiline (bool, optional): Let matches span line breaks, see iter_grep. Defaults to False.
+            merge_context (bool, optional): Merge overlapping context windows into blocks, see iter_grep. Defaults to False.
+            max_snippet_bytes (Optional[int], optional): Cap on snippet bytes per file, see iter_grep. Defaults to None (unbounded).
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
 
         Returns:
-            List[Dict]: List of match dicts with 'path', 'snippet', 'line_number', 'match_range'.
+            List[Dict]: List of match dicts with 'path', 'snippet', 'line_number', 'match_range' in 'content' mode.
         """
-        results = []
-        compiled = re.compile(grep_pattern, flags=re.IGNORECASE if ignore_case else 0)
-        resolved = self._resolve(path)
-        info = self.info(resolved)
-        if info["type"] == "file":
-            out = self._process_file(resolved, compiled, character_window, line_window)
-            if out:
-                results.extend(out)
-        else:
-            if file_name_pattern is None:
-                filters = None
-            elif isinstance(file_name_pattern, list):
-                filters = file_name_pattern
-            else:
-                filters = [file_name_pattern]
-            walker = self.fs.walk
-            files = walker.files(path=resolved, filter=filters)
-            for f in sorted(files):
-                out = self._process_file(f, compiled, character_window, line_window)
-                if out:
-                    results.extend(out)
+        return list(
+            self.iter_grep(
+                grep_pattern,
+                path,
+                file_name_pattern=file_name_pattern,
+                character_window=character_window,
+                line_window=line_window,
+                ignore_case=ignore_case,
+                output_mode=output_mode,
+                max_results=max_results,
+                max_files=max_files,
+                workers=workers,
+                executor=executor,
+                multiline=multiline,
+                merge_context=merge_context,
+                max_snippet_bytes=max_snippet_bytes,
+                cwd=cwd,
+            )
+        )
+
+    def search(
+        self,
+        query: str,
+        path: str = "/",
+        k: int = 10,
+        max_passages: int = 3,
+        cwd: Optional[str] = None,
+    ) -> List[Dict]:
+        """Rank files by relevance to a free-text query with BM25.
+
+        Files are split into passages at blank lines and each passage is
+        scored against the query words, ignoring case. A file scores as its
+        best passage. Files written since the last search are re-indexed
+        first, the rest of the corpus is not touched.
+
+        Args:
+            query (str): Free-text query, e.g. 'dark matter detection'.
+            path (str, optional): Only rank files at or below this path. Defaults to root "/".
+            k (int, optional): Maximum number of files to return. Defaults to 10.
+            max_passages (int, optional): Maximum passages reported per file. Defaults to 3.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            List[Dict]: Best files first, each with 'path', 'score' and 'passages', a list of {'line_number', 'end_line_number', 'score', 'snippet'} (0-indexed, inclusive lines), best first.
+
+        Raises:
+            ValueError: If the filesystem was created without search_index.
+        """
+        if self._search_index is None:
+            raise ValueError("search needs VirtualFilesystem(search_index=True)")
+        resolved = self._resolve(path, cwd)
+        with self._rwlock.read():
+            with self._search_lock:
+                hits = self._refresh_search_index().search(
+                    query, k=k, prefix=resolved, max_passages=max_passages
+                )
+            results = []
+            for hit in hits:
+                index = self._get_line_index(hit["path"])
+                blob = self.fs.getblob(hit["path"])
+                passages = []
+                for passage in hit["passages"]:
+                    byte_start, byte_end = index.span(passage["start"], passage["end"])
+                    passages.append(
+                        {
+                            "line_number": passage["start"],
+                            "end_line_number": passage["end"] - 1,
+                            "score": passage["score"],
+                            "snippet": blob.tobytes(byte_start, byte_end).decode(
+                                "utf-8"
+                            ),
+                        }
+                    )
+                results.append(
+                    {"path": hit["path"], "score": hit["score"], "passages": passages}
+                )
         return results
+
+    def grep_many(
+        self,
+        patterns: List[str],
+        path: str,
+        file_name_pattern: Optional[str | List] = None,
+        ignore_case: bool = False,
+        output_mode: GrepOutputMode = "content",
+        cwd: Optional[str] = None,
+    ) -> Dict[str, List[Dict]]:
+        """Search for many literal patterns at once.
+
+        Each file is read and scanned once for all patterns, see
+        LiteralSet, a run of lines decoded from its blob at a time. Only
+        patterns spanning a line break have the whole text decoded. Overlapping occurrences of different patterns are all
+        reported. With the trigram index enabled, only files that can
+        contain at least one pattern are read.
+        Note: When path is a file, file_name_pattern is ignored.
+
+        Args:
+            patterns (List[str]): Literal strings to search for (NOT regex).
+            path (str): Path to file or directory to search.
+            file_name_pattern (Optional[str  |  List], optional): Glob pattern(s) to filter files when searching directories. Defaults to None.
+            ignore_case (bool, optional): Whether to perform case-insensitive matching. Defaults to False.
+            output_mode (GrepOutputMode, optional): 'content' lists every occurrence, 'files_with_matches' lists {'path'} per matching file, 'count' lists {'path', 'count'} per matching file. Defaults to 'content'.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            Dict[str, List[Dict]]: Hits per pattern, in path order. Occurrences in 'content' mode have 'path', 'snippet', 'line_number', 'match_range', 'match'.
+        """
+        literals = LiteralSet(patterns, ignore_case=ignore_case)
+        hits: Dict[str, List[Dict]] = {pattern: [] for pattern in literals.patterns}
+        with self._rwlock.read():
+            files = self._list_files(self._resolve(path, cwd), file_name_pattern)
+            index = self._get_trigram_index()
+            if index is not None:
+                candidates = set()
+                for pattern in literals.patterns:
+                    found = index.candidates([pattern.casefold()])
+                    if found is None:
+                        candidates = None
+                        break
+                    candidates |= found
+                if candidates is not None:
+                    files = [f for f in files if f in candidates]
+
+        spans_lines = any("\n" in pattern for pattern in literals.patterns)
+        for f in files:
+            with self._rwlock.read():
+                if not self.fs.isfile(f):
+                    continue
+                if spans_lines:
+                    chunks = iter([(0, self.fs.readtext(f))])
+                else:
+                    # appends extend the line index in place, so the scan
+                    # gets its own copy matching the blob
+                    chunks = BlobLines(
+                        self.fs.getblob(f), self._get_line_index(f).copy()
+                    ).chunks()
+            if output_mode == "files_with_matches":
+                found = set()
+                for _, text in chunks:
+                    found.update(literals.occurring(text))
+                    if len(found) == len(literals.patterns):
+                        break
+                for index in sorted(found):
+                    hits[literals.patterns[index]].append({"path": f})
+                continue
+            if output_mode == "count":
+                counts: Dict[int, int] = {}
+                for _, text in chunks:
+                    for index, count in literals.counts(text).items():
+                        counts[index] = counts.get(index, 0) + count
+                for index in sorted(counts):
+                    hits[literals.patterns[index]].append(
+                        {"path": f, "count": counts[index]}
+                    )
+                continue
+            for first_row, text in chunks:
+                line_starts = char_line_starts(text)
+                for match_start, match_end, index in literals.iter_matches(text):
+                    row = bisect_right(line_starts, match_start) - 1
+                    line_start = line_starts[row]
+                    line_end = (
+                        line_starts[row + 1] - 1
+                        if row + 1 < len(line_starts)
+                        else len(text)
+                    )
+                    hits[literals.patterns[index]].append(
+                        {
+                            "path": f,
+                            "snippet": text[line_start:line_end],
+                            "line_number": first_row + row,
+                            "match_range": [
+                                match_start - line_start,
+                                match_end - line_start,
+                            ],
+                            "match": text[match_start:match_end],
+                        }
+                    )
+        return hits
+
+    async def _arun(self, func, *args, **kwargs):
+        """Run a blocking method on the async executor and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_async_executor(), functools.partial(func, *args, **kwargs)
+        )
+
+    async def aread(
+        self,
+        path: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        cwd: Optional[str] = None,
+    ) -> Dict:
+        """Async variant of read, run on the bounded async executor.
+
+        Args:
+            path (str): Path to the file to read.
+            start (Optional[int], optional): Starting line index (0-indexed, inclusive). Defaults to 0.
+            end (Optional[int], optional): Ending line index (0-indexed, exclusive). Defaults to total lines.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            Dict: See read.
+        """
+        return await self._arun(self.read, path, start, end, cwd=cwd)
+
+    async def awrite(
+        self,
+        path: str,
+        content: Optional[str] = None,
+        mode: Literal["append", "overwrite"] = "overwrite",
+        cwd: Optional[str] = None,
+    ) -> Dict:
+        """Async variant of write, run on the bounded async executor.
+
+        Args:
+            path (str): Path to the file to write.
+            content (Optional[str], optional): Text content to write. If None, only ensures file exists. Defaults to None.
+            mode (Literal["append", "overwrite"], optional): Write mode, see write. Defaults to 'overwrite'.
+            cwd (Optional[str], optional): Working directory for a relative path. Defaults to None (self.cwd).
+
+        Returns:
+            Dict: See write.
+        """
+        return await self._arun(self.write, path, content, mode, cwd=cwd)
+
+    async def aglob(self, pattern: str, cwd: Optional[str] = None) -> List[Dict]:
+        """Async variant of glob, run on the bounded async executor.
+
+        Args:
+            pattern (str): Glob pattern to match, see glob.
+            cwd (Optional[str], optional): Working directory for a relative pattern. Defaults to None (self.cwd).
+
+        Returns:
+            List[Dict]: See glob.
+        """
+        return await self._arun(self.glob, pattern, cwd=cwd)
+
+    async def agrep(self, grep_pattern: str, path: str, **kwargs) -> List[Dict]:
+        """Async variant of grep, run on the bounded async executor.
+
+        Cancelling the awaiting task stops the scan before the next file or
+        entry, so an abandoned search does not keep an executor thread busy.
+
+        Args:
+            grep_pattern (str): Regex pattern to search for.
+            path (str): Path to file or directory to search.
+            **kwargs: Other arguments of grep.
+
+        Returns:
+            List[Dict]: See grep.
+        """
+        cancel_event = threading.Event()
+        try:
+            return await self._arun(
+                lambda: list(
+                    self.iter_grep(
+                        grep_pattern, path, cancel_event=cancel_event, **kwargs
+                    )
+                )
+            )
+        finally:
+            # a no-op once the scan finished, stops it after a cancellation
+            cancel_event.set()
+
+
+class VirtualFilesystemSession:
+    """View of a VirtualFilesystem with its own working directory.
+
+    Methods that take paths are forwarded with the session's cwd, everything
+    else is forwarded as is.
+    """
+
+    # public methods of VirtualFilesystem that accept a cwd
+    _PATH_METHODS = frozenset(
+        {
+            "info",
+            "ls",
+            "write",
+            "write_many",
+            "mkdir",
+            "remove",
+            "read",
+            "read_many",
+            "glob",
+            "iter_grep",
+            "grep",
+            "grep_many",
+            "search",
+            "aread",
+            "awrite",
+            "aglob",
+            "agrep",
+        }
+    )
+
+    def __init__(self, vfs: VirtualFilesystem, cwd: str = "/"):
+        """
+        Args:
+            vfs (VirtualFilesystem): The shared filesystem.
+            cwd (str, optional): Working directory of the session, relative to vfs.cwd. Defaults to root "/".
+        """
+        self.vfs = vfs
+        self.cwd = vfs._resolve(cwd)
+
+    def cd(self, path: str) -> str:
+        """Change the working directory of the session.
+
+        Args:
+            path (str): New working directory, relative to the current one.
+
+        Returns:
+            str: The new absolute working directory.
+
+        Raises:
+            FSError: If the path does not exist or is not a directory.
+        """
+        resolved = self.vfs._resolve(path, self.cwd)
+        if resolved in _BUILTIN_DIRS:
+            with self.vfs._rwlock.write():
+                self.vfs._make_builtin_dir(resolved)
+        if self.vfs.info(resolved)["type"] != "directory":
+            raise DirectoryExpected(resolved)
+        self.cwd = resolved
+        return resolved
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.vfs, name)
+        if name in self._PATH_METHODS:
+            return functools.partial(attr, cwd=self.cwd)
+        return attr
@@ -0,0 +1,680 @@
+import heapq
+import math
+import re
+import re._constants as sre_constants
+import re._parser as sre_parser
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from fs import wildcard
+from fs.path import iteratepath
+
+
+class LineIndex:
+    """Byte offsets of the line starts of a single file.
+
+    Lines follow `str.split("\\n")` semantics, so a file with N newlines has
+    N + 1 lines and an empty file has a single empty line.
+    """
+
+    def __init__(self):
+        self.starts = array("q", [0])
+        self.size = 0
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LineIndex":
+        """Build an index from the full encoded content of a file.
+
+        Args:
+            data (bytes): UTF-8 encoded file content.
+
+        Returns:
+            LineIndex: The index for the content.
+        """
+        index = cls()
+        index.extend(data)
+        return index
+
+    def extend(self, data: bytes) -> None:
+        """Update the index for `data` appended at the end of the file.
+
+        Args:
+            data (bytes): UTF-8 encoded content that was appended.
+        """
+        starts = self.starts
+        offset = self.size
+        pos = data.find(b"\n")
+        while pos != -1:
+            starts.append(offset + pos + 1)
+            pos = data.find(b"\n", pos + 1)
+        self.size += len(data)
+
+    def copy(self) -> "LineIndex":
+        """Independent copy of the index, unaffected by later extends.
+
+        Returns:
+            LineIndex: The copy.
+        """
+        index = LineIndex()
+        index.starts = array("q", self.starts)
+        index.size = self.size
+        return index
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """Byte span covering lines `start` to `end` (exclusive).
+
+        The newline terminating the last requested line is not included, which
+        mirrors `"\\n".join(lines[start:end])`.
+
+        Args:
+            start (int): First line (0-indexed, inclusive). Must be a valid line.
+            end (int): Last line (0-indexed, exclusive). Must be greater than start.
+
+        Returns:
+            Tuple[int, int]: Start and end byte offsets.
+        """
+        byte_start = self.starts[start]
+        if end < len(self.starts):
+            return byte_start, self.starts[end] - 1
+        return byte_start, self.size
+
+
+class BlobLines(Sequence):
+    """Lines of a file, decoded on demand from its blob.
+
+    Random access goes through the line index, and iteration decodes
+    line-aligned chunks of about `chunk_size` bytes at a time, so the file
+    is never held in memory as a whole string.
+    """
+
+    def __init__(self, blob, index: LineIndex, chunk_size: int = 1 << 20):
+        """
+        Args:
+            blob (AnyBlob): Content of the file, see `snapshotfs.Blob`.
+            index (LineIndex): Line index of the same content.
+            chunk_size (int, optional): Approximate bytes decoded at once while iterating. Defaults to 1 MiB.
+        """
+        self.blob = blob
+        self.index = index
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _decode(self, start: int, end: int) -> List[str]:
+        """Decode lines start to end (exclusive), which must be a valid range."""
+        byte_start, byte_end = self.index.span(start, end)
+        return self.blob.tobytes(byte_start, byte_end).decode("utf-8").split("\n")
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._decode(start, stop) if start < stop else []
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("line index out of range")
+        return self._decode(key, key + 1)[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for _, text in self.chunks():
+            yield from text.split("\n")
+
+    def chunks(self) -> Iterator[Tuple[int, str]]:
+        """Yield the content as decoded runs of whole lines of about `chunk_size` bytes.
+
+        Yields:
+            Tuple[int, str]: First line of the run and its lines joined by newlines.
+        """
+        starts = self.index.starts
+        n_lines = len(self)
+        row = 0
+        while row < n_lines:
+            end = bisect_left(starts, starts[row] + self.chunk_size, row + 1, n_lines)
+            end = max(end, row + 1)
+            byte_start, byte_end = self.index.span(row, end)
+            yield row, self.blob.tobytes(byte_start, byte_end).decode("utf-8")
+            row = end
+
+
+class JoinedLines:
+    """Text of a file sliced by character offsets without building it.
+
+    Stands in for `"\n".join(lines)` where only slices and the length are
+    needed: each slice decodes just the lines it covers.
+    """
+
+    def __init__(self, lines: Sequence[str], line_starts: Sequence[int]):
+        """
+        Args:
+            lines (Sequence[str]): Lines of the file, e.g. `BlobLines`.
+            line_starts (Sequence[int]): Character offsets of the line starts, see `char_line_starts`.
+        """
+        self.lines = lines
+        self.line_starts = line_starts
+        self._len = line_starts[-1] + len(lines[-1])
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, key: slice) -> str:
+        start, stop, _ = key.indices(self._len)
+        if start >= stop:
+            return ""
+        starts = self.line_starts
+        row = bisect_right(starts, start) - 1
+        end_row = bisect_right(starts, stop - 1) - 1
+        text = "\n".join(self.lines[row : end_row + 1])
+        return text[start - starts[row] : stop - starts[row]]
+
+
+def char_line_starts(text: Union[str, Sequence[str]]) -> array:
+    """Character offsets of the line starts of a string.
+
+    Args:
+        text (Union[str, Sequence[str]]): Full text of a file, or its lines, e.g. `BlobLines`, to avoid building the text.
+
+    Returns:
+        array: Sorted offsets, starting with 0, suitable for `bisect`.
+    """
+    starts = array("q", [0])
+    if isinstance(text, str):
+        starts.extend(match.end() for match in re.finditer("\n", text))
+        return starts
+    offset = 0
+    for line in text:
+        offset += len(line) + 1
+        starts.append(offset)
+    # the last line starts no further line
+    starts.pop()
+    return starts
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Distinct trigrams of an already case-folded string."""
+    return set(map("".join, set(zip(text, text[1:], text[2:]))))
+
+
+def extract_literals(pattern: str, flags: int = 0) -> List[str]:
+    """Extract literal runs that every match of a regex must contain.
+
+    Only top-level runs of ASCII literals are considered, anything else
+    (classes, groups, repeats, alternations, non-ASCII characters) ends the
+    current run. The result is therefore a subset of what is required, which
+    keeps index lookups conservative.
+
+    Args:
+        pattern (str): Regex pattern.
+        flags (int, optional): Flags the pattern is compiled with. Defaults to 0.
+
+    Returns:
+        List[str]: Case-folded literal runs, in pattern order.
+    """
+    literals = []
+    run = []
+    for op, av in sre_parser.parse(pattern, flags):
+        if op is sre_constants.LITERAL and av < 128:
+            run.append(chr(av))
+            continue
+        if run:
+            literals.append("".join(run))
+            run = []
+    if run:
+        literals.append("".join(run))
+    return [literal.casefold() for literal in literals]
+
+
+class TrigramIndex:
+    """Posting lists from case-folded trigrams to the files containing them.
+
+    Text is case-folded before indexing so that the same index serves both
+    case sensitive and case insensitive queries.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = defaultdict(set)
+        self.file_trigrams: Dict[str, Set[str]] = {}
+        # last two folded characters of each file, so that appends can index
+        # the trigrams spanning the old and the new content
+        self.tails: Dict[str, str] = {}
+
+    def add(self, path: str, text: str) -> None:
+        """Index the full content of a file, replacing what was indexed before.
+
+        Args:
+            path (str): Absolute path of the file.
+            text (str): Full content of the file.
+        """
+        self.remove(path)
+        self.file_trigrams[path] = set()
+        self.tails[path] = ""
+        self.extend(path, text)
+
+    def extend(self, path: str, text: str) -> None:
+        """Index content appended to the end of a file.
+
+        Args:
+            path (str): Absolute path of the file.
+            text (str): Appended content.
+        """
+        folded = self.tails.get(path, "") + text.casefold()
+        new = _trigrams(folded)
+        known = self.file_trigrams.setdefault(path, set())
+        for trigram in new - known:
+            self.postings[trigram].add(path)
+        known |= new
+        self.tails[path] = folded[-2:]
+
+    def remove(self, path: str) -> None:
+        """Drop a file from the index.
+
+        Args:
+            path (str): Absolute path of the file.
+        """
+        for trigram in self.file_trigrams.pop(path, ()):
+            paths = self.postings[trigram]
+            paths.discard(path)
+            if not paths:
+                del self.postings[trigram]
+        self.tails.pop(path, None)
+
+    def candidates(self, literals: List[str]) -> Optional[Set[str]]:
+        """Files that contain every trigram of the given literals.
+
+        Args:
+            literals (List[str]): Case-folded literals, see `extract_literals`.
+
+        Returns:
+            Optional[Set[str]]: Candidate file paths, or None if no literal is
+            long enough to be looked up and every file has to be scanned.
+        """
+        trigrams = set()
+        for literal in literals:
+            trigrams |= _trigrams(literal)
+        if not trigrams:
+            return None
+        # intersect starting from the rarest trigram
+        postings = sorted(
+            (self.postings.get(trigram, set()) for trigram in trigrams), key=len
+        )
+        result = set(postings[0])
+        for paths in postings[1:]:
+            if not result:
+                break
+            result &= paths
+        return result
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into case-folded word tokens for BM25.
+
+    Args:
+        text (str): Text to split.
+
+    Returns:
+        List[str]: Tokens, in text order.
+    """
+    return _TOKEN.findall(text.casefold())
+
+
+def split_passages(text: str, max_lines: int = 20) -> List[Tuple[int, int]]:
+    """Split text into passages at blank lines, capped at a number of lines.
+
+    Args:
+        text (str): Full text of a file.
+        max_lines (int, optional): Maximum lines per passage. Defaults to 20.
+
+    Returns:
+        List[Tuple[int, int]]: Line ranges (0-indexed, end exclusive) of the passages. Blank lines between passages are left out.
+    """
+    passages = []
+    start = None
+    for row, line in enumerate(text.split("\n")):
+        if not line.strip():
+            if start is not None:
+                passages.append((start, row))
+                start = None
+            continue
+        if start is None:
+            start = row
+        elif row - start == max_lines:
+            passages.append((start, row))
+            start = row
+    if start is not None:
+        passages.append((start, text.count("\n") + 1))
+    return passages
+
+
+class BM25Index:
+    """Inverted index ranking the passages of files with Okapi BM25.
+
+    Every passage is a document, and a file scores as its best passage.
+    Files are indexed and dropped one at a time, so the index follows
+    writes in O(size of the changed file). Queries only visit the
+    postings of their terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, passage_lines: int = 20):
+        """
+        Args:
+            k1 (float, optional): Term frequency saturation. Defaults to 1.2.
+            b (float, optional): Strength of the passage length normalization. Defaults to 0.75.
+            passage_lines (int, optional): Maximum lines per passage, see split_passages. Defaults to 20.
+        """
+        self.k1 = k1
+        self.b = b
+        self.passage_lines = passage_lines
+        # term -> passage id -> term frequency
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        # passage id -> (path, start line, end line), and its length in tokens
+        self.passages: Dict[int, Tuple[str, int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        # passage ids and distinct terms of each file, for removal
+        self.file_passages: Dict[str, List[int]] = {}
+        self.file_terms: Dict[str, Set[str]] = {}
+        self.total_length = 0
+        self._next_id = 0
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.file_passages
+
+    def add(self, path: str, text: str) -> None:
+        """Index the full content of a file, replacing what was indexed before.
+
+        Args:
+            path (str): Absolute path of the file.
+            text (str): Full content of the file.
+        """
+        self.remove(path)
+        lines = text.split("\n")
+        ids = []
+        terms = set()
+        for start, end in split_passages(text, self.passage_lines):
+            tokens = tokenize("\n".join(lines[start:end]))
+            if not tokens:
+                continue
+            passage_id = self._next_id
+            self._next_id += 1
+            ids.append(passage_id)
+            self.passages[passage_id] = (path, start, end)
+            self.lengths[passage_id] = len(tokens)
+            self.total_length += len(tokens)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, count in counts.items():
+                self.postings[term][passage_id] = count
+            terms.update(counts)
+        self.file_passages[path] = ids
+        self.file_terms[path] = terms
+
+    def remove(self, path: str) -> None:
+        """Drop a file from the index.
+
+        Args:
+            path (str): Absolute path of the file.
+        """
+        ids = self.file_passages.pop(path, None)
+        if ids is None:
+            return
+        for term in self.file_terms.pop(path):
+            postings = self.postings[term]
+            for passage_id in ids:
+                postings.pop(passage_id, None)
+            if not postings:
+                del self.postings[term]
+        for passage_id in ids:
+            del self.passages[passage_id]
+            self.total_length -= self.lengths.pop(passage_id)
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        prefix: str = "/",
+        max_passages: int = 3,
+        paths: Optional[Set[str]] = None,
+    ) -> List[Dict]:
+        """Rank the files under a path for a free-text query.
+
+        Args:
+            query (str): Free-text query, tokenized like the files.
+            k (int, optional): Maximum number of files to return. Defaults to 10.
+            prefix (str, optional): Only rank files at or below this absolute path. Defaults to "/".
+            max_passages (int, optional): Maximum passages reported per file. Defaults to 3.
+            paths (Optional[Set[str]], optional): Only rank these files. Defaults to None (all files).
+
+        Returns:
+            List[Dict]: Best files first, each with 'path', 'score' and 'passages', a list of {'start', 'end', 'score'} line ranges (0-indexed, end exclusive), best first.
+        """
+        n_passages = len(self.lengths)
+        if not n_passages:
+            return []
+        avg_length = self.total_length / n_passages
+        root = prefix.rstrip("/")
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(
+                1 + (n_passages - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for passage_id, tf in postings.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * self.lengths[passage_id] / avg_length
+                )
+                scores[passage_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        per_file: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        for passage_id, score in scores.items():
+            path = self.passages[passage_id][0]
+            if (path == root or path.startswith(root + "/")) and (
+                paths is None or path in paths
+            ):
+                per_file[path].append((score, passage_id))
+        best = heapq.nlargest(
+            k, per_file.items(), key=lambda item: (max(item[1])[0], item[0])
+        )
+        results = []
+        for path, ranked in best:
+            ranked = heapq.nlargest(max_passages, ranked)
+            results.append(
+                {
+                    "path": path,
+                    "score": ranked[0][0],
+                    "passages": [
+                        {
+                            "start": self.passages[passage_id][1],
+                            "end": self.passages[passage_id][2],
+                            "score": score,
+                        }
+                        for score, passage_id in ranked
+                    ],
+                }
+            )
+        return results
+
+
+def _extension(name: str) -> Optional[str]:
+    """Text after the last dot of a file name, or None without a dot."""
+    if "." not in name:
+        return None
+    return name.rsplit(".", 1)[1]
+
+
+def _is_literal(segment: str) -> bool:
+    """Whether a glob segment has no wildcard characters."""
+    return not any(c in segment for c in "*?[")
+
+
+class _TrieNode:
+    __slots__ = ("children", "is_dir")
+
+    def __init__(self, is_dir: bool):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.is_dir = is_dir
+
+
+class PathTrie:
+    """Tree of the paths of a filesystem, one node per path segment.
+
+    Glob patterns are matched segment by segment, so literal segments are
+    dictionary lookups and subtrees that cannot match are never visited.
+    Files are also indexed by extension, which answers `<dir>/**/*.<ext>`
+    patterns without walking at all.
+
+    Matching follows `fs.glob`: a pattern ending in a name only matches
+    files, a pattern ending in '/' only matches directories, and '**'
+    matches zero or more segments of any kind.
+    """
+
+    def __init__(self):
+        self.root = _TrieNode(is_dir=True)
+        self.extensions: Dict[str, Set[str]] = defaultdict(set)
+
+    def _node(self, path: str) -> Optional[_TrieNode]:
+        node = self.root
+        for part in iteratepath(path):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def add(self, path: str, is_dir: bool = False) -> None:
+        """Add a path, along with any missing parent directories.
+
+        Args:
+            path (str): Absolute normalized path.
+            is_dir (bool, optional): Whether the path is a directory. Defaults to False.
+        """
+        parts = iteratepath(path)
+        if not parts:
+            return
+        node = self.root
+        for part in parts[:-1]:
+            node = node.children.setdefault(part, _TrieNode(is_dir=True))
+        name = parts[-1]
+        if name in node.children:
+            return
+        node.children[name] = _TrieNode(is_dir)
+        ext = None if is_dir else _extension(name)
+        if ext is not None:
+            self.extensions[ext].add(path)
+
+    def remove(self, path: str) -> List[str]:
+        """Remove a path and everything below it.
+
+        Args:
+            path (str): Absolute normalized path.
+
+        Returns:
+            List[str]: Paths of the files that were removed.
+        """
+        parts = iteratepath(path)
+        if not parts:
+            files = list(self.iter_files("/"))
+            self.root.children.clear()
+            self.extensions.clear()
+            return files
+        parent = self._node("/" + "/".join(parts[:-1]))
+        if parent is None or parts[-1] not in parent.children:
+            return []
+        files = list(self.iter_files(path))
+        del parent.children[parts[-1]]
+        for file_path in files:
+            ext = _extension(file_path.rsplit("/", 1)[1])
+            if ext is not None:
+                paths = self.extensions[ext]
+                paths.discard(file_path)
+                if not paths:
+                    del self.extensions[ext]
+        return files
+
+    def iter_files(self, path: str = "/") -> Iterator[str]:
+        """Yield the files at or below a path.
+
+        Args:
+            path (str, optional): Absolute normalized path. Defaults to "/".
+
+        Yields:
+            str: Absolute file paths, depth first.
+        """
+        node = self._node(path)
+        if node is None:
+            return
+        stack = [(path.rstrip("/"), node)]
+        while stack:
+            prefix, node = stack.pop()
+            if not node.is_dir:
+                yield prefix
+                continue
+            for name, child in node.children.items():
+                stack.append((f"{prefix}/{name}", child))
+
+    def glob(self, pattern: str) -> List[str]:
+        """Paths matching an absolute glob pattern.
+
+        Args:
+            pattern (str): Absolute glob pattern, e.g. '/artifacts/**/*.md'.
+
+        Returns:
+            List[str]: Matching paths, sorted.
+        """
+        segments = iteratepath(pattern)
+        dirs_only = pattern.endswith("/")
+        if (
+            not dirs_only
+            and len(segments) >= 2
+            and segments[-2] == "**"
+            and segments[-1].startswith("*.")
+            and _is_literal(segments[-1][2:])
+            and "." not in segments[-1][2:]
+            and all(_is_literal(s) for s in segments[:-2])
+        ):
+            prefix = "/" + "/".join(segments[:-2])
+            prefix = prefix.rstrip("/") + "/"
+            paths = self.extensions.get(segments[-1][2:], ())
+            return sorted(p for p in paths if p.startswith(prefix))
+
+        found: Set[str] = set()
+        seen: Set[Tuple[int, int]] = set()
+        # (path, node, index of the next segment to match)
+        stack = [("", self.root, 0)]
+        while stack:
+            path, node, i = stack.pop()
+            key = (id(node), i)
+            if key in seen:
+                continue
+            seen.add(key)
+            if i == len(segments):
+                # a trailing '**' matches files and directories alike
+                if path and (
+                    node.is_dir == dirs_only or (segments[-1] == "**" and not dirs_only)
+                ):
+                    found.add(path)
+                continue
+            segment = segments[i]
+            if segment == "**":
+                stack.append((path, node, i + 1))
+                for name, child in node.children.items():
+                    stack.append((f"{path}/{name}", child, i))
+            elif _is_literal(segment):
+                child = node.children.get(segment)
+                if child is not None:
+                    stack.append((f"{path}/{segment}", child, i + 1))
+            else:
+                for name, child in node.children.items():
+                    if wildcard.match(segment, name):
+                        stack.append((f"{path}/{name}", child, i + 1))
+        return sorted(found)
@@ -0,0 +1,126 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+def _fold(text: str) -> str:
+    """Lowercase text without changing character offsets."""
+    folded = text.lower()
+    # lower() never shrinks a character, so equal lengths mean a 1:1 mapping
+    if len(folded) == len(text):
+        return folded
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+class LiteralSet:
+    """Finder of the occurrences of many literal strings in a single pass.
+
+    The literals are compiled once into one alternation, longest first, and
+    the regex engine's C loop scans the text once for the next occurrence
+    of any of them. The shorter literals starting at the same position are
+    exactly prefixes of the one found, and the only literals that can start
+    inside it are those agreeing with one of its suffixes. Both are looked
+    up in tables built with the alternation and checked in place, so
+    occurrences of different literals may overlap without rescanning.
+    Occurrences of one literal do not overlap. Case insensitive search
+    lowercases the text once instead of matching with re.IGNORECASE, which
+    is several times slower.
+    """
+
+    def __init__(self, patterns: Iterable[str], ignore_case: bool = False):
+        """
+        Args:
+            patterns (Iterable[str]): Literal patterns. Duplicates and empty strings are ignored.
+            ignore_case (bool, optional): Match case-insensitively. Defaults to False.
+        """
+        self.patterns: List[str] = [p for p in dict.fromkeys(patterns) if p]
+        self.ignore_case = ignore_case
+        # searched form -> indices of the patterns it stands for, several
+        # when patterns only differ in case
+        keys: Dict[str, List[int]] = {}
+        for index, pattern in enumerate(self.patterns):
+            keys.setdefault(_fold(pattern) if ignore_case else pattern, []).append(
+                index
+            )
+        longest_first = sorted(keys, key=len, reverse=True)
+        # searched form -> (length, indices) of it and every shorter form it
+        # starts with, longest first
+        self._prefixes: Dict[str, List[Tuple[int, List[int]]]] = {
+            key: [(len(k), keys[k]) for k in longest_first if key.startswith(k)]
+            for key in keys
+        }
+        # searched form -> (offset, form, indices) of the forms that may
+        # start inside an occurrence of it, in offset order
+        self._inner: Dict[str, List[Tuple[int, str, List[int]]]] = {
+            key: [
+                (offset, k, keys[k])
+                for offset in range(1, len(key))
+                for k in longest_first
+                if k.startswith(key[offset:]) or key.startswith(k, offset)
+            ]
+            for key in keys
+        }
+        self._regex = (
+            re.compile("|".join(map(re.escape, longest_first))) if keys else None
+        )
+
+    def _prepare(self, text: str) -> str:
+        return _fold(text) if self.ignore_case else text
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield every pattern occurrence in text, in a single scan.
+
+        Args:
+            text (str): Text to scan.
+
+        Yields:
+            Tuple[int, int, int]: Start offset, end offset (exclusive) and index into `patterns`, in text order.
+        """
+        if self._regex is None:
+            return
+        text = self._prepare(text)
+        # end of the last occurrence of each pattern, to skip self-overlaps
+        ends = [0] * len(self.patterns)
+        for match in self._regex.finditer(text):
+            start, key = match.start(), match.group()
+            for length, indices in self._prefixes[key]:
+                for index in indices:
+                    if start >= ends[index]:
+                        ends[index] = start + length
+                        yield start, start + length, index
+            for offset, inner, indices in self._inner[key]:
+                at = start + offset
+                if text.startswith(inner, at):
+                    for index in indices:
+                        if at >= ends[index]:
+                            ends[index] = at + len(inner)
+                            yield at, at + len(inner), index
+
+    def occurring(self, text: str) -> List[int]:
+        """Indices of the patterns occurring in text, scanning only until all are found.
+
+        Args:
+            text (str): Text to scan.
+
+        Returns:
+            List[int]: Indices into `patterns`, in order.
+        """
+        found = set()
+        for _, _, index in self.iter_matches(text):
+            found.add(index)
+            if len(found) == len(self.patterns):
+                break
+        return sorted(found)
+
+    def counts(self, text: str) -> Dict[int, int]:
+        """Number of occurrences of each pattern occurring in text.
+
+        Args:
+            text (str): Text to scan.
+
+        Returns:
+            Dict[int, int]: Index into `patterns` -> occurrences, in index order.
+        """
+        counts: Dict[int, int] = {}
+        for _, _, index in self.iter_matches(text):
+            counts[index] = counts.get(index, 0) + 1
+        return dict(sorted(counts.items()))
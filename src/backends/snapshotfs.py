@@ -0,0 +1,1091 @@
+import io
+import lzma
+import mmap
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from fs import errors
+from fs.base import FS
+from fs.enums import ResourceType
+from fs.info import Info
+from fs.mode import Mode
+from fs.path import basename, dirname, iteratepath
+
+from .chunkstore import ChunkedBlob, ChunkStore
+
+# size of the pieces content is copied out in, to bound peak memory
+CHUNK_SIZE = 1 << 20
+
+# claims the tail of Blob buffers. Versions sharing a buffer may belong to
+# filesystems with their own locks, e.g. forks of one snapshot, so checking
+# that a blob ends its buffer and extending it must be atomic on its own
+_buffer_lock = threading.Lock()
+
+
+class Blob:
+    """Immutable file content: the first `size` bytes of a shared buffer.
+
+    Buffers are only ever appended to, so the bytes a blob covers never
+    change. Appending to the blob that ends the buffer extends the buffer in
+    place and returns a longer blob over it, which makes repeated appends
+    O(1) amortized while older blobs, e.g. in a snapshot, still see their
+    own content. Of several versions appended to the same blob, possibly
+    from different threads, only the first extends the buffer.
+    """
+
+    __slots__ = ("buffer", "size")
+
+    def __init__(self, buffer: bytearray, size: int):
+        self.buffer = buffer
+        self.size = size
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Blob":
+        """Create a blob over a copy of data.
+
+        Args:
+            data (bytes): File content.
+
+        Returns:
+            Blob: The new blob.
+        """
+        return cls(bytearray(data), len(data))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def tobytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Copy out a byte range of the content.
+
+        Args:
+            start (int, optional): Start offset. Defaults to 0.
+            end (Optional[int], optional): End offset (exclusive), clamped to the size. Defaults to the size.
+
+        Returns:
+            bytes: The requested bytes.
+        """
+        end = self.size if end is None else min(end, self.size)
+        return bytes(self.buffer[start:end])
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the content in chunks of at most chunk_size bytes.
+
+        Args:
+            chunk_size (int, optional): Maximum chunk length. Defaults to CHUNK_SIZE.
+
+        Yields:
+            bytes: Consecutive pieces of the content.
+        """
+        for start in range(0, self.size, chunk_size):
+            yield self.tobytes(start, start + chunk_size)
+
+    def append(self, data: bytes) -> "Blob":
+        """Content of this blob followed by data, as a new blob.
+
+        Args:
+            data (bytes): Bytes to append.
+
+        Returns:
+            Blob: The new blob. This blob is left unchanged.
+        """
+        with _buffer_lock:
+            if self.size == len(self.buffer):
+                self.buffer.extend(data)
+                return Blob(self.buffer, self.size + len(data))
+        # the buffer was already extended past this blob by another version
+        buffer = self.buffer[: self.size]
+        buffer.extend(data)
+        return Blob(buffer, len(buffer))
+
+
+# spill segments take no new extents past this size, so the space of dropped
+# blobs is given back once every blob of a full segment is gone
+SEGMENT_BYTES = 64 << 20
+
+
+class _Segment:
+    """Temporary file holding the content of many mapped blobs at offsets.
+
+    A segment costs two file descriptors, the file and its mapping, however
+    many blobs it holds. The file is grown by doubling and remapped whole
+    each time, so blobs always read through the current mapping. The file
+    is unnamed where the platform allows and is deleted once the last blob
+    referencing it is garbage collected.
+    """
+
+    __slots__ = ("file", "reserved", "spill_dir", "map", "lock", "__weakref__")
+
+    def __init__(self, spill_dir: Optional[str] = None):
+        self.file = tempfile.TemporaryFile(dir=spill_dir)
+        # end of the last extent handed out, see `_allocate`
+        self.reserved = 0
+        self.spill_dir = spill_dir
+        # empty files cannot be mapped
+        self.map: Optional[mmap.mmap] = None
+        # serializes writes and claims the tails of extents
+        self.lock = threading.Lock()
+
+    def write(self, offset: int, data: bytes) -> None:
+        """Write data at an offset, growing the file past its end. Call under `lock`."""
+        if not data:
+            return
+        end = offset + len(data)
+        length = len(self.map) if self.map is not None else 0
+        if end > length:
+            length = max(end, 2 * length)
+            self.file.truncate(length)
+            # readers holding the old mapping keep it open until they are done
+            self.map = mmap.mmap(self.file.fileno(), length)
+        self.map[offset:end] = data
+
+
+# segment new extents are allocated in, per spill directory
+_segments: "weakref.WeakValueDictionary[Optional[str], _Segment]" = (
+    weakref.WeakValueDictionary()
+)
+_segments_lock = threading.Lock()
+
+
+class _Extent:
+    """Region of a segment reserved for the versions of one file.
+
+    Versions appended to one another share their extent: its first `used`
+    bytes are written, and the blob ending there may claim the rest.
+    """
+
+    __slots__ = ("segment", "offset", "capacity", "used")
+
+    def __init__(self, segment: _Segment, offset: int, capacity: int):
+        self.segment = segment
+        self.offset = offset
+        self.capacity = capacity
+        self.used = 0
+
+
+def _allocate(spill_dir: Optional[str], capacity: int) -> _Extent:
+    """Reserve an extent in the open segment of a spill directory, opening one if it is full."""
+    with _segments_lock:
+        segment = _segments.get(spill_dir)
+        if segment is None or (
+            segment.reserved and segment.reserved + capacity > SEGMENT_BYTES
+        ):
+            segment = _segments[spill_dir] = _Segment(spill_dir)
+        offset = segment.reserved
+        segment.reserved += capacity
+    return _Extent(segment, offset, capacity)
+
+
+class MappedBlob:
+    """Immutable file content memory-mapped from a spill segment.
+
+    The content is the first `size` bytes of an extent, which is only
+    appended to, like the buffer of a `Blob`. Appending past the extent's
+    capacity moves the content to a new extent twice as large, so repeated
+    appends stay O(1) amortized even when other files are spilled in
+    between. Byte ranges are copied straight out of the mapping, so the
+    content never has to be held in memory as a whole.
+
+    Blobs flagged `evicted` were spilled by a memory quota rather than
+    because of their size, and are paged back into memory when read.
+    """
+
+    __slots__ = ("extent", "size", "evicted")
+
+    def __init__(self, extent: _Extent, size: int, evicted: bool = False):
+        self.extent = extent
+        self.size = size
+        self.evicted = evicted
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: Iterable[bytes],
+        size: int,
+        spill_dir: Optional[str] = None,
+        evicted: bool = False,
+        capacity: Optional[int] = None,
+    ) -> "MappedBlob":
+        """Create a mapped blob in a new extent.
+
+        Args:
+            chunks (Iterable[bytes]): File content, in order.
+            size (int): Total length of the chunks.
+            spill_dir (Optional[str], optional): Directory of the spill segment. Defaults to the system temp directory.
+            evicted (bool, optional): Whether the blob was spilled by a memory quota. Defaults to False.
+            capacity (Optional[int], optional): Bytes to reserve for the content and later appends. Defaults to size.
+
+        Returns:
+            MappedBlob: The new blob.
+        """
+        extent = _allocate(spill_dir, max(size, capacity or 0))
+        segment = extent.segment
+        with segment.lock:
+            for chunk in chunks:
+                segment.write(extent.offset + extent.used, chunk)
+                extent.used += len(chunk)
+        return cls(extent, extent.used, evicted)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def tobytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Copy out a byte range of the content, see `Blob.tobytes`."""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return b""
+        offset = self.extent.offset
+        return self.extent.segment.map[offset + start : offset + end]
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the content in chunks of at most chunk_size bytes."""
+        for start in range(0, self.size, chunk_size):
+            yield self.tobytes(start, start + chunk_size)
+
+    def append(self, data: bytes) -> "MappedBlob":
+        """Content of this blob followed by data, see `Blob.append`."""
+        extent = self.extent
+        size = self.size + len(data)
+        with extent.segment.lock:
+            if self.size == extent.used and size <= extent.capacity:
+                extent.segment.write(extent.offset + self.size, data)
+                extent.used = size
+                return MappedBlob(extent, size, self.evicted)
+        # the extent is full or was already extended past this blob
+        return MappedBlob.from_chunks(
+            chain(self.iter_chunks(), (data,)),
+            size,
+            extent.segment.spill_dir,
+            self.evicted,
+            capacity=2 * size,
+        )
+
+
+# idle files smaller than this are left uncompressed: codec headers and
+# lookup tables outweigh anything a few bytes of text could save
+IDLE_COMPRESS_MIN = 512
+
+# streaming compressor factory and one-shot decompressor per codec
+_CODECS = {
+    "zlib": (zlib.compressobj, zlib.decompress),
+    "lzma": (lzma.LZMACompressor, lzma.decompress),
+}
+
+
+class CompressedBlob:
+    """Immutable file content held compressed in memory.
+
+    The content is decompressed as a whole on access, so readers should go
+    through `SnapshotFS.getblob`, which caches the decompressed content of
+    hot files.
+    """
+
+    __slots__ = ("data", "size", "codec")
+
+    def __init__(self, data: bytes, size: int, codec: str):
+        self.data = data
+        self.size = size
+        self.codec = codec
+
+    @classmethod
+    def compress(cls, chunks: Iterable[bytes], codec: str = "zlib") -> "CompressedBlob":
+        """Compress file content.
+
+        Args:
+            chunks (Iterable[bytes]): File content, in order.
+            codec (str, optional): 'zlib' or 'lzma'. Defaults to 'zlib'.
+
+        Returns:
+            CompressedBlob: The new blob.
+        """
+        compressor = _CODECS[codec][0]()
+        parts = []
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            parts.append(compressor.compress(chunk))
+        parts.append(compressor.flush())
+        return cls(b"".join(parts), size, codec)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def decompress(self) -> bytes:
+        """Decompress the whole content.
+
+        Returns:
+            bytes: The file content.
+        """
+        return _CODECS[self.codec][1](self.data)
+
+    def tobytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Copy out a byte range of the content, see `Blob.tobytes`."""
+        data = self.decompress()
+        if start == 0 and end is None:
+            return data
+        return data[start:end]
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the content in chunks of at most chunk_size bytes."""
+        data = self.decompress()
+        for start in range(0, self.size, chunk_size):
+            yield data[start : start + chunk_size]
+
+    def append(self, data: bytes) -> Blob:
+        """Content of this blob followed by data, as a new uncompressed blob."""
+        buffer = bytearray(self.decompress())
+        buffer.extend(data)
+        return Blob(buffer, len(buffer))
+
+
+AnyBlob = Union[Blob, MappedBlob, CompressedBlob, ChunkedBlob]
+
+
+def stored_size(blob: AnyBlob) -> int:
+    """Bytes a blob takes in its storage, compressed or not.
+
+    Args:
+        blob (AnyBlob): File content.
+
+    Returns:
+        int: Stored size in bytes.
+    """
+    if isinstance(blob, CompressedBlob):
+        return len(blob.data)
+    return len(blob)
+
+
+class Snapshot:
+    """Frozen root of a SnapshotFS and its content totals, see `SnapshotFS.snapshot`."""
+
+    __slots__ = ("root", "logical_bytes", "stored_bytes")
+
+    def __init__(self, root: "_DirNode", logical_bytes: int, stored_bytes: int):
+        self.root = root
+        self.logical_bytes = logical_bytes
+        self.stored_bytes = stored_bytes
+
+
+class _DirNode:
+    """Directory entries, owned by the filesystem version that may mutate them."""
+
+    __slots__ = ("entries", "owner")
+
+    def __init__(self, owner: object, entries: Optional[Dict] = None):
+        self.entries: Dict[str, Union["_DirNode", AnyBlob]] = entries or {}
+        self.owner = owner
+
+    def copy(self, owner: object) -> "_DirNode":
+        return _DirNode(owner, dict(self.entries))
+
+
+class _BlobReader(io.RawIOBase):
+    """Read only file over a blob, copying out only the bytes that are read."""
+
+    def __init__(self, blob: AnyBlob, name: str):
+        super().__init__()
+        self._blob = blob
+        self._pos = 0
+        self.name = name
+        self.mode = "rb"
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._blob)
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"invalid whence ({whence})")
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = None if size is None or size < 0 else self._pos + size
+        data = self._blob.tobytes(self._pos, end)
+        self._pos += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def write(self, b) -> int:
+        raise io.UnsupportedOperation("write")
+
+
+class _BlobWriter(io.BytesIO):
+    """Writable file that stores its content as a new blob on flush and close."""
+
+    def __init__(self, fs: "SnapshotFS", path: str, data: bytes, mode: Mode):
+        super().__init__(data)
+        self._fs = fs
+        self._path = path
+        self._mode = mode
+        self.name = path
+        self.mode = mode.to_platform_bin()
+        if mode.appending:
+            self.seek(0, io.SEEK_END)
+
+    def readable(self) -> bool:
+        return self._mode.reading
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if not self._mode.reading:
+            raise io.UnsupportedOperation("read")
+        return super().read(size)
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        # BytesIO only shrinks, files are padded with zeros when extended
+        pos = self.tell()
+        size = pos if size is None else size
+        length = self.seek(0, io.SEEK_END)
+        if size > length:
+            self.write(b"\0" * (size - length))
+        else:
+            super().truncate(size)
+        self.seek(pos)
+        return size
+
+    def flush(self) -> None:
+        super().flush()
+        if not self.closed:
+            self._fs._set_blob(self._path, self._fs._new_blob(self.getvalue()))
+
+    def close(self) -> None:
+        if not self.closed:
+            self.flush()
+        super().close()
+
+
+class SnapshotFS(FS):
+    """In-memory filesystem with O(1) snapshots and optional mmap storage.
+
+    Directories form a persistent tree: every directory node is owned by the
+    filesystem version that created it, and a version only mutates the nodes
+    it owns. Taking a snapshot hands the current root out and starts a new
+    version, so later writes copy each directory on their path once and
+    share every untouched subtree and file blob with the snapshot.
+
+    With an mmap threshold set, large file contents live in memory-mapped
+    spill segments on disk, so they do not count against the Python heap.
+    Segments are shared by many files, which keeps the number of open file
+    descriptors independent of the number of files.
+
+    With a memory quota set, the in-memory contents of the current version
+    are tracked in least recently used order. Once they exceed the quota,
+    the coldest ones are moved to spill segments and paged back into memory
+    the next time they are read. Contents still referenced by a snapshot
+    are only freed once the snapshot is dropped.
+
+    With compression, large files are stored compressed when written and
+    other files once they have been idle for a while, unless they are
+    smaller than `IDLE_COMPRESS_MIN` or do not shrink. With a chunk store,
+    file contents are split into chunks that are stored once per process.
+    """
+
+    _meta = {
+        "case_insensitive": False,
+        "invalid_path_chars": "\0",
+        "max_path_length": None,
+        "max_sys_path_length": None,
+        "network": False,
+        "read_only": False,
+        "thread_safe": True,
+        "unicode_paths": True,
+        "virtual": False,
+    }
+
+    def __init__(
+        self,
+        snapshot: Optional[Snapshot] = None,
+        mmap_threshold: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        memory_quota: Optional[int] = None,
+        compression: Optional[str] = None,
+        compress_threshold: Optional[int] = None,
+        compress_idle: Optional[float] = None,
+        decompress_cache: int = 4 * 1024 * 1024,
+        chunk_store: Optional[ChunkStore] = None,
+    ):
+        """
+        Args:
+            snapshot (Optional[Snapshot], optional): Start from the state of a snapshot instead of an empty filesystem. Defaults to None.
+            mmap_threshold (Optional[int], optional): Store files of at least this many bytes in memory-mapped spill files instead of the heap. Defaults to None (everything in memory).
+            spill_dir (Optional[str], optional): Directory for the spill files. Defaults to the system temp directory.
+            memory_quota (Optional[int], optional): Maximum bytes of uncompressed file content kept in memory before the least recently used files are spilled to disk. Defaults to None (unbounded).
+            compression (Optional[str], optional): Codec for compressed files, 'zlib' or 'lzma'. Defaults to None (no compression).
+            compress_threshold (Optional[int], optional): With compression, store files written with at least this many bytes compressed. Defaults to None.
+            compress_idle (Optional[float], optional): With compression, compress files not read or written for this many seconds. Defaults to None.
+            decompress_cache (int, optional): Maximum bytes of decompressed content cached for reads of compressed files. Defaults to 4 MiB.
+            chunk_store (Optional[ChunkStore], optional): Store new file content as deduplicated chunks in this store, instead of mapping or compressing it. Defaults to None.
+        """
+        super().__init__()
+        self.mmap_threshold = mmap_threshold
+        self.spill_dir = spill_dir
+        self.memory_quota = memory_quota
+        self.compression = compression
+        self.compress_threshold = compress_threshold if compression else None
+        self.compress_idle = compress_idle if compression else None
+        self.decompress_cache = decompress_cache
+        self.chunk_store = chunk_store
+        # guards the tree rather than the public FS lock, so that files
+        # closed on other threads, e.g. by fs.copy workers, can commit while
+        # a caller holds FS.lock()
+        self._tree_lock = threading.RLock()
+        self._owner = object()
+        self._root = snapshot.root if snapshot is not None else _DirNode(self._owner)
+        # uncompressed and stored bytes of every file, kept up to date by
+        # each mutation so that memory_stats does not walk the tree
+        self.logical_bytes = snapshot.logical_bytes if snapshot is not None else 0
+        self.stored_bytes = snapshot.stored_bytes if snapshot is not None else 0
+        # uncompressed in-memory blobs of the current version, least recently
+        # used first, and the last access times of those idle compression
+        # may still shrink. Only kept while a quota or idle compression
+        # needs them
+        self._tracking = memory_quota is not None or self.compress_idle is not None
+        self._resident: "OrderedDict[str, Blob]" = OrderedDict()
+        self._accessed: "OrderedDict[str, float]" = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # decompressed content of recently read compressed blobs, keyed by
+        # blob identity, most recently used last
+        self._inflated: "OrderedDict[int, Tuple[CompressedBlob, Blob]]" = OrderedDict()
+        self._inflated_bytes = 0
+        self.decompress_hits = 0
+        self.decompress_misses = 0
+        if snapshot is not None:
+            self._recount()
+
+    def __repr__(self) -> str:
+        return "SnapshotFS()"
+
+    def memory_stats(self) -> Dict[str, Optional[int]]:
+        """Usage of the memory quota and of compression.
+
+        Hits are reads served from memory, misses are reads that paged an
+        evicted file back in, and evictions count files spilled to disk.
+        These are only tracked while a quota is set. The decompression
+        counters cover reads of compressed files. Logical and stored bytes
+        total every file of the current version.
+
+        Returns:
+            Dict[str, Optional[int]]: quota, resident_bytes, resident_files, hits, misses, evictions, decompress_hits, decompress_misses, logical_bytes and stored_bytes.
+        """
+        with self._tree_lock:
+            return {
+                "quota": self.memory_quota,
+                "resident_bytes": self.resident_bytes,
+                "resident_files": len(self._resident),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "decompress_hits": self.decompress_hits,
+                "decompress_misses": self.decompress_misses,
+                "logical_bytes": self.logical_bytes,
+                "stored_bytes": self.stored_bytes,
+            }
+
+    def _recount(self) -> None:
+        """Rebuild the resident set from the current tree, e.g. after a restore."""
+        self._resident.clear()
+        self._accessed.clear()
+        self.resident_bytes = 0
+        if not self._tracking:
+            return
+        now = time.monotonic()
+        stack = [("", self._root)]
+        while stack:
+            prefix, node = stack.pop()
+            for name, child in node.entries.items():
+                path = f"{prefix}/{name}"
+                if isinstance(child, _DirNode):
+                    stack.append((path, child))
+                elif isinstance(child, Blob):
+                    self._track(path, child, now)
+        self._enforce_quota()
+
+    def _track(self, path: str, blob: Blob, now: float) -> None:
+        """Track an in-memory blob as most recently used. Must be called with the tree lock held."""
+        self._resident[path] = blob
+        self.resident_bytes += len(blob)
+        if self.compress_idle is not None and len(blob) >= IDLE_COMPRESS_MIN:
+            self._accessed[path] = now
+
+    def _count(self, node: Union["_DirNode", AnyBlob, None], sign: int) -> None:
+        """Add the bytes of a file or directory tree to the totals, or subtract them with sign -1."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, _DirNode):
+                stack.extend(node.entries.values())
+            elif node is not None:
+                self.logical_bytes += sign * len(node)
+                self.stored_bytes += sign * stored_size(node)
+
+    def _forget(self, path: str) -> None:
+        """Stop tracking the blob at a path. Must be called with the tree lock held."""
+        blob = self._resident.pop(path, None)
+        if blob is not None:
+            self.resident_bytes -= len(blob)
+            self._accessed.pop(path, None)
+
+    def _forget_tree(self, dir_path: str) -> None:
+        """Stop tracking every blob below a directory. Must be called with the tree lock held."""
+        prefix = dir_path.rstrip("/") + "/"
+        for path in [p for p in self._resident if p.startswith(prefix)]:
+            self._forget(path)
+
+    def _make_cold(self, path: str, spill: bool) -> None:
+        """Stop tracking the blob at a path and replace it by a compressed or spilled copy.
+
+        A blob that does not shrink when compressed is kept as is, but no
+        longer considered for idle compression. Must be called with the tree
+        lock held.
+        """
+        blob = self._resident[path]
+        if self._node(path) is not blob:
+            self._forget(path)
+            return
+        if spill:
+            cold = MappedBlob.from_chunks(
+                blob.iter_chunks(), len(blob), self.spill_dir, True
+            )
+            self.evictions += 1
+        else:
+            cold = CompressedBlob.compress(blob.iter_chunks(), self.compression)
+            if stored_size(cold) >= len(blob):
+                del self._accessed[path]
+                return
+        self._forget(path)
+        self._count(blob, -1)
+        self._count(cold, 1)
+        self._edit(dirname(path)).entries[basename(path)] = cold
+
+    def _enforce_quota(self) -> None:
+        """Compress idle blobs, then spill least recently used ones until the quota is met.
+
+        Must be called with the tree lock held.
+        """
+        if self.compress_idle is not None:
+            cutoff = time.monotonic() - self.compress_idle
+            while self._accessed:
+                path, accessed = next(iter(self._accessed.items()))
+                if accessed > cutoff:
+                    break
+                self._make_cold(path, spill=False)
+        if self.memory_quota is None:
+            return
+        while self.resident_bytes > self.memory_quota and self._resident:
+            self._make_cold(next(iter(self._resident)), spill=True)
+
+    def compress_cold(self, idle: Optional[float] = None) -> int:
+        """Compress the in-memory files that have not been accessed recently.
+
+        Idle files are also compressed as a side effect of reads and writes,
+        this forces a pass, e.g. before measuring memory use.
+
+        Args:
+            idle (Optional[float], optional): Compress files idle for at least this many seconds. Defaults to compress_idle.
+
+        Returns:
+            int: Number of files compressed.
+        """
+        if self.compression is None:
+            return 0
+        with self._tree_lock:
+            cutoff = time.monotonic() - (self.compress_idle if idle is None else idle)
+            idle = [p for p, t in self._accessed.items() if t <= cutoff]
+            compressed = 0
+            for path in idle:
+                self._make_cold(path, spill=False)
+                compressed += path not in self._resident
+            return compressed
+
+    def _inflate(self, blob: CompressedBlob) -> Blob:
+        """Decompressed content of a compressed blob, through the decompression cache."""
+        with self._tree_lock:
+            cached = self._inflated.get(id(blob))
+            if cached is not None:
+                self._inflated.move_to_end(id(blob))
+                self.decompress_hits += 1
+                return cached[1]
+            self.decompress_misses += 1
+            data = bytearray(blob.decompress())
+            plain = Blob(data, len(data))
+            # the compressed blob is kept alive by the entry, so its id is stable
+            self._inflated[id(blob)] = (blob, plain)
+            self._inflated_bytes += len(plain)
+            while (
+                self._inflated_bytes > self.decompress_cache and len(self._inflated) > 1
+            ):
+                _, (_, old) = self._inflated.popitem(last=False)
+                self._inflated_bytes -= len(old)
+            return plain
+
+    def _touch(self, path: str, blob: AnyBlob) -> AnyBlob:
+        """Record a read of the blob at a normalized path.
+
+        Evicted blobs are paged back in and compressed ones are returned
+        decompressed.
+        """
+        if self._tracking:
+            blob = self._track_read(path, blob)
+        if isinstance(blob, CompressedBlob):
+            return self._inflate(blob)
+        return blob
+
+    def _track_read(self, path: str, blob: AnyBlob) -> AnyBlob:
+        with self._tree_lock:
+            if self._resident.get(path) is blob:
+                self._resident.move_to_end(path)
+                if path in self._accessed:
+                    self._accessed[path] = time.monotonic()
+                    self._accessed.move_to_end(path)
+                if self.memory_quota is not None:
+                    self.hits += 1
+                self._enforce_quota()
+                return blob
+            if not (isinstance(blob, MappedBlob) and blob.evicted):
+                return blob
+            if self._node(path) is not blob:
+                # replaced since it was looked up, the caller keeps its version
+                return blob
+            self.misses += 1
+            paged = self._new_blob(blob.tobytes())
+            self._set_blob(path, paged)
+            return paged
+
+    def snapshot(self) -> Snapshot:
+        """Freeze the current state in O(1).
+
+        Returns:
+            Snapshot: The frozen state, see `restore` and `SnapshotFS(snapshot)`.
+        """
+        with self._tree_lock:
+            # nothing reachable from the current root is owned by the new
+            # version, so it can no longer be mutated in place
+            self._owner = object()
+            return Snapshot(self._root, self.logical_bytes, self.stored_bytes)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Roll the filesystem back to a snapshot in O(1).
+
+        With a memory quota set, the restored tree is walked once to
+        recount the content held in memory.
+
+        Args:
+            snapshot (Snapshot): A snapshot of this or another SnapshotFS.
+        """
+        with self._tree_lock:
+            self._owner = object()
+            self._root = snapshot.root
+            self.logical_bytes = snapshot.logical_bytes
+            self.stored_bytes = snapshot.stored_bytes
+            self._recount()
+
+    def _new_blob(self, data: bytes) -> AnyBlob:
+        """Blob for new file content, deduplicated, or mapped or compressed if it is large enough."""
+        if self.chunk_store is not None:
+            return ChunkedBlob.from_bytes(self.chunk_store, data)
+        if self.mmap_threshold is not None and len(data) >= self.mmap_threshold:
+            return MappedBlob.from_chunks((data,), len(data), self.spill_dir)
+        if self.compress_threshold is not None and len(data) >= self.compress_threshold:
+            return CompressedBlob.compress((data,), self.compression)
+        return Blob.from_bytes(data)
+
+    def _append_blob(self, blob: AnyBlob, data: bytes) -> AnyBlob:
+        """Blob for content appended to a file, moving it to a spill segment once large."""
+        if (
+            isinstance(blob, Blob)
+            and self.mmap_threshold is not None
+            and len(blob) + len(data) >= self.mmap_threshold
+        ):
+            size = len(blob) + len(data)
+            return MappedBlob.from_chunks(
+                chain(blob.iter_chunks(), (data,)),
+                size,
+                self.spill_dir,
+                capacity=2 * size,
+            )
+        return blob.append(data)
+
+    def getblob(self, path: str) -> AnyBlob:
+        """Get the content of a file without copying it.
+
+        Blobs are immutable, so the result stays valid whatever happens to
+        the file afterwards. Compressed files are returned decompressed,
+        from a cache of recently read ones.
+
+        Args:
+            path (str): Path of the file.
+
+        Returns:
+            AnyBlob: The content of the file.
+
+        Raises:
+            ResourceNotFound: If the path does not exist.
+            FileExpected: If the path is a directory.
+        """
+        return self._touch(self.validatepath(path), self._blob(path))
+
+    def _node(self, path: str) -> Union[_DirNode, AnyBlob, None]:
+        """Node at a normalized path, or None if it does not exist."""
+        node = self._root
+        for part in iteratepath(path):
+            if not isinstance(node, _DirNode):
+                return None
+            node = node.entries.get(part)
+            if node is None:
+                return None
+        return node
+
+    def _blob(self, path: str) -> AnyBlob:
+        """Blob of the file at a path."""
+        node = self._node(self.validatepath(path))
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        if isinstance(node, _DirNode):
+            raise errors.FileExpected(path)
+        return node
+
+    def _edit(self, dir_path: str) -> _DirNode:
+        """Directory at a path, made mutable by copying it and its parents if needed.
+
+        Must be called with the tree lock held.
+        """
+        owner = self._owner
+        if self._root.owner is not owner:
+            self._root = self._root.copy(owner)
+        node = self._root
+        for part in iteratepath(dir_path):
+            child = node.entries.get(part)
+            if child is None:
+                raise errors.ResourceNotFound(dir_path)
+            if not isinstance(child, _DirNode):
+                raise errors.DirectoryExpected(dir_path)
+            if child.owner is not owner:
+                child = node.entries[part] = child.copy(owner)
+            node = child
+        return node
+
+    def _set_blob(self, path: str, blob: AnyBlob) -> None:
+        """Store a blob as the content of the file at a validated path."""
+        with self._tree_lock:
+            parent = self._edit(dirname(path))
+            old = parent.entries.get(basename(path))
+            if isinstance(old, _DirNode):
+                raise errors.FileExpected(path)
+            parent.entries[basename(path)] = blob
+            self._count(old, -1)
+            self._count(blob, 1)
+            if self._tracking:
+                self._forget(path)
+                if isinstance(blob, Blob):
+                    self._track(path, blob, time.monotonic())
+                self._enforce_quota()
+
+    def getinfo(self, path: str, namespaces: Optional[List[str]] = None) -> Info:
+        _path = self.validatepath(path)
+        node = self._node(_path)
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        return self._info(
+            basename(_path), node, bool(namespaces and "details" in namespaces)
+        )
+
+    def listdir(self, path: str) -> List[str]:
+        _path = self.validatepath(path)
+        node = self._node(_path)
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        if not isinstance(node, _DirNode):
+            raise errors.DirectoryExpected(path)
+        return list(node.entries)
+
+    def _info(self, name: str, node: Union[_DirNode, AnyBlob], details: bool) -> Info:
+        is_dir = isinstance(node, _DirNode)
+        raw_info = {"basic": {"name": name, "is_dir": is_dir}}
+        if details:
+            raw_info["details"] = {
+                "size": 0 if is_dir else len(node),
+                "type": int(ResourceType.directory if is_dir else ResourceType.file),
+            }
+        return Info(raw_info)
+
+    def scandir(
+        self,
+        path: str,
+        namespaces: Optional[List[str]] = None,
+        page: Optional[Tuple[int, int]] = None,
+    ) -> Iterator[Info]:
+        _path = self.validatepath(path)
+        node = self._node(_path)
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        if not isinstance(node, _DirNode):
+            raise errors.DirectoryExpected(path)
+        details = bool(namespaces and "details" in namespaces)
+        entries = list(node.entries.items())
+        if page is not None:
+            entries = entries[page[0] : page[1]]
+        return iter([self._info(name, child, details) for name, child in entries])
+
+    def makedir(self, path: str, permissions=None, recreate: bool = False):
+        _path = self.validatepath(path)
+        with self._tree_lock:
+            if _path == "/":
+                if recreate:
+                    return self.opendir(path)
+                raise errors.DirectoryExists(path)
+            parent = self._node(dirname(_path))
+            if not isinstance(parent, _DirNode):
+                raise errors.ResourceNotFound(path)
+            existing = parent.entries.get(basename(_path))
+            if existing is not None:
+                if recreate and isinstance(existing, _DirNode):
+                    return self.opendir(path)
+                raise errors.DirectoryExists(path)
+            self._edit(dirname(_path)).entries[basename(_path)] = _DirNode(self._owner)
+            return self.opendir(path)
+
+    def openbin(self, path: str, mode: str = "r", buffering: int = -1, **options):
+        _mode = Mode(mode)
+        _mode.validate_bin()
+        _path = self.validatepath(path)
+        with self._tree_lock:
+            node = self._node(_path)
+            if isinstance(node, _DirNode):
+                raise errors.FileExpected(path)
+            if node is None:
+                if not _mode.create:
+                    raise errors.ResourceNotFound(path)
+                if not isinstance(self._node(dirname(_path)), _DirNode):
+                    raise errors.ResourceNotFound(path)
+            elif _mode.exclusive:
+                raise errors.FileExists(path)
+            if not _mode.writing:
+                return _BlobReader(self._touch(_path, node), _path)
+            data = b"" if node is None or _mode.truncate else node.tobytes()
+            writer = _BlobWriter(self, _path, data, _mode)
+            if node is None or _mode.truncate:
+                self._set_blob(_path, self._new_blob(data))
+            return writer
+
+    def remove(self, path: str) -> None:
+        _path = self.validatepath(path)
+        with self._tree_lock:
+            self._count(self._blob(path), -1)
+            del self._edit(dirname(_path)).entries[basename(_path)]
+            self._forget(_path)
+
+    def removedir(self, path: str) -> None:
+        _path = self.validatepath(path)
+        if _path == "/":
+            raise errors.RemoveRootError()
+        with self._tree_lock:
+            node = self._node(_path)
+            if node is None:
+                raise errors.ResourceNotFound(path)
+            if not isinstance(node, _DirNode):
+                raise errors.DirectoryExpected(path)
+            if node.entries:
+                raise errors.DirectoryNotEmpty(path)
+            del self._edit(dirname(_path)).entries[basename(_path)]
+
+    def removetree(self, dir_path: str) -> None:
+        _path = self.validatepath(dir_path)
+        with self._tree_lock:
+            node = self._node(_path)
+            if node is None:
+                raise errors.ResourceNotFound(dir_path)
+            if not isinstance(node, _DirNode):
+                raise errors.DirectoryExpected(dir_path)
+            self._count(node, -1)
+            if _path == "/":
+                self._root = _DirNode(self._owner)
+            else:
+                del self._edit(dirname(_path)).entries[basename(_path)]
+            self._forget_tree(_path)
+
+    def setinfo(self, path: str, info) -> None:
+        # no timestamps or permissions are stored
+        if self._node(self.validatepath(path)) is None:
+            raise errors.ResourceNotFound(path)
+
+    def getsize(self, path: str) -> int:
+        node = self._node(self.validatepath(path))
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        return 0 if isinstance(node, _DirNode) else len(node)
+
+    def getstoredsize(self, path: str) -> int:
+        """Get the bytes a file takes in storage, after compression.
+
+        Args:
+            path (str): Path of the file or directory. Directories take 0 bytes.
+
+        Returns:
+            int: Stored size in bytes.
+        """
+        node = self._node(self.validatepath(path))
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        return 0 if isinstance(node, _DirNode) else stored_size(node)
+
+    def readbytes(self, path: str) -> bytes:
+        return self.getblob(path).tobytes()
+
+    def readtext(
+        self,
+        path: str,
+        encoding: Optional[str] = None,
+        errors: Optional[str] = None,
+        newline: str = "",
+    ) -> str:
+        return self.readbytes(path).decode(encoding or "utf-8", errors or "strict")
+
+    def writebytes(self, path: str, contents: bytes) -> None:
+        if not isinstance(contents, bytes):
+            raise TypeError("contents must be bytes")
+        _path = self.validatepath(path)
+        if not isinstance(self._node(dirname(_path)), _DirNode):
+            raise errors.ResourceNotFound(path)
+        self._set_blob(_path, self._new_blob(contents))
+
+    def appendbytes(self, path: str, data: bytes) -> None:
+        if not isinstance(data, bytes):
+            raise TypeError("data must be bytes")
+        _path = self.validatepath(path)
+        with self._tree_lock:
+            node = self._node(_path)
+            if node is None:
+                if not isinstance(self._node(dirname(_path)), _DirNode):
+                    raise errors.ResourceNotFound(path)
+                blob = self._new_blob(data)
+            elif isinstance(node, _DirNode):
+                raise errors.FileExpected(path)
+            else:
+                blob = self._append_blob(node, data)
+            self._set_blob(_path, blob)
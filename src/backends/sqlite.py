@@ -0,0 +1,381 @@
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from deepagents.backends.protocol import (
+    BackendProtocol,
+    EditResult,
+    FileDownloadResponse,
+    FileInfo,
+    FileUploadResponse,
+    GrepMatch,
+    WriteResult,
+)
+from deepagents.backends.utils import (
+    create_file_data,
+    format_read_response,
+    perform_string_replacement,
+)
+from wcmatch import glob as wcglob
+
+from .indexes import extract_literals
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content TEXT NOT NULL,
+    -- bytes of the UTF-8 encoded content, so listings need not read it
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    modified_at TEXT NOT NULL,
+    UNIQUE (namespace, path)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+    content, content='files', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, content)
+    VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF content ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, content)
+    VALUES ('delete', old.id, old.content);
+    INSERT INTO files_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# the trigram tokenizer cannot look up shorter strings
+_MIN_INDEXED_LITERAL = 3
+_GLOB_MAGIC = re.compile(r"[*?\[{]")
+
+
+def _size(content: str) -> int:
+    return len(content.encode("utf-8"))
+
+
+def _now() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+def _subtree(path: str) -> Tuple[str, str]:
+    """Key range [lo, hi) of the paths under a directory.
+
+    '0' follows '/' in code point order, so every path starting with the
+    directory prefix sorts before the prefix with its slash replaced by '0'.
+    """
+    lo = path if path.endswith("/") else path + "/"
+    return lo, lo[:-1] + "0"
+
+
+def _indexed_literals(regex: re.Pattern) -> List[str]:
+    """Literals of a regex that can be looked up in the trigram index.
+
+    The trigram tokenizer folds case itself, so the case-folded literals of
+    extract_literals match case sensitive patterns too. Case insensitive
+    patterns scan every file, since Unicode case folding of the regex
+    engine and of the tokenizer may differ.
+    """
+    if regex.flags & re.IGNORECASE:
+        return []
+    return [
+        lit
+        for lit in extract_literals(regex.pattern, regex.flags)
+        if len(lit) >= _MIN_INDEXED_LITERAL
+    ]
+
+
+def _fts_query(literals: List[str]) -> str:
+    return " AND ".join('"' + lit.replace('"', '""') + '"' for lit in literals)
+
+
+class SQLiteStore:
+    """SQLite database in WAL mode holding the files of many backends.
+
+    Every thread gets its own connection, so readers run concurrently with
+    each other and with the single writer WAL allows. File contents are
+    indexed by an FTS5 trigram index kept in sync by triggers.
+
+    The database is only opened, and created if missing, on first use, so
+    constructing a store has no side effects.
+    """
+
+    def __init__(self, path: Union[str, Path], busy_timeout: float = 30.0):
+        """
+        Args:
+            path (Union[str, Path]): Database file, created with its parent directories on first use if missing.
+            busy_timeout (float, optional): Seconds a writer waits for another one to finish. Defaults to 30.0.
+        """
+        self.path = Path(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._created = False
+
+    def _create(self, conn: sqlite3.Connection):
+        """Create the schema once per store. Must be called with the lock held."""
+        if not self._created:
+            # executescript commits any open transaction, so it opens its own
+            conn.executescript(f"BEGIN IMMEDIATE; {_SCHEMA} COMMIT;")
+            self._created = True
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                self._create(conn)
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the block in a write transaction, rolled back if it raises."""
+        conn = self.connection
+        # take the write lock upfront, so read-then-write blocks cannot deadlock
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class SQLiteBackend(BackendProtocol):
+    """Backend storing files in a namespace of a SQLiteStore.
+
+    Files persist across restarts and namespaces sharing a store never see
+    each other's files. ls and glob are range scans over the path index,
+    narrowed by the literal directory prefix of the glob. grep looks up the
+    literals a regex requires in the trigram index and only runs the regex
+    over the candidate files.
+    """
+
+    def __init__(self, store: SQLiteStore, namespace: str = "default"):
+        """
+        Args:
+            store (SQLiteStore): Database holding the files.
+            namespace (str, optional): Namespace the files of this backend live in. Defaults to "default".
+        """
+        self.store = store
+        self.namespace = namespace
+
+    def _get(self, path: str) -> Optional[tuple]:
+        return self.store.connection.execute(
+            "SELECT content, created_at, modified_at FROM files"
+            " WHERE namespace = ? AND path = ?",
+            (self.namespace, path),
+        ).fetchone()
+
+    def _scan(self, path: str, columns: str) -> List[tuple]:
+        lo, hi = _subtree(path)
+        return self.store.connection.execute(
+            f"SELECT path, {columns} FROM files"
+            " WHERE namespace = ? AND path >= ? AND path < ? ORDER BY path",
+            (self.namespace, lo, hi),
+        ).fetchall()
+
+    def ls_info(self, path: str) -> List[FileInfo]:
+        prefix = path if path.endswith("/") else path + "/"
+        infos: List[FileInfo] = []
+        subdirs = set()
+        for file_path, size, modified_at in self._scan(prefix, "size, modified_at"):
+            relative = file_path[len(prefix) :]
+            if "/" in relative:
+                subdirs.add(prefix + relative.split("/")[0] + "/")
+                continue
+            infos.append(
+                {
+                    "path": file_path,
+                    "is_dir": False,
+                    "size": size,
+                    "modified_at": modified_at,
+                }
+            )
+        for subdir in subdirs:
+            infos.append({"path": subdir, "is_dir": True, "size": 0, "modified_at": ""})
+        infos.sort(key=lambda fi: fi["path"])
+        return infos
+
+    def read(self, file_path: str, offset: int = 0, limit: int = 2000) -> str:
+        row = self._get(file_path)
+        if row is None:
+            return f"Error: File '{file_path}' not found"
+        return format_read_response(create_file_data(row[0]), offset, limit)
+
+    def grep_raw(
+        self, pattern: str, path: Optional[str] = None, glob: Optional[str] = None
+    ) -> Union[List[GrepMatch], str]:
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            return f"Invalid regex pattern: {e}"
+        path = path or "/"
+        if not path.startswith("/"):
+            path = "/" + path
+        lo, hi = _subtree(path)
+
+        literals = _indexed_literals(regex)
+        conn = self.store.connection
+        if literals:
+            # CROSS JOIN keeps the planner from probing the index once per file
+            rows = conn.execute(
+                "SELECT f.path, f.content FROM files_fts"
+                " CROSS JOIN files f ON f.id = files_fts.rowid"
+                " WHERE files_fts MATCH ? AND f.namespace = ?"
+                " AND (f.path = ? OR (f.path >= ? AND f.path < ?))"
+                " ORDER BY f.path",
+                (_fts_query(literals), self.namespace, path.rstrip("/"), lo, hi),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT path, content FROM files WHERE namespace = ?"
+                " AND (path = ? OR (path >= ? AND path < ?)) ORDER BY path",
+                (self.namespace, path.rstrip("/"), lo, hi),
+            ).fetchall()
+
+        matches: List[GrepMatch] = []
+        for file_path, content in rows:
+            if glob and not wcglob.globmatch(
+                file_path.rsplit("/", 1)[-1], glob, flags=wcglob.BRACE
+            ):
+                continue
+            for line_number, line in enumerate(content.split("\n"), 1):
+                if regex.search(line):
+                    matches.append(
+                        {"path": file_path, "line": line_number, "text": line}
+                    )
+        return matches
+
+    def glob_info(self, pattern: str, path: str = "/") -> List[FileInfo]:
+        base = path if path.endswith("/") else path + "/"
+        if not base.startswith("/"):
+            base = "/" + base
+        # only scan below the directories the pattern spells out literally
+        parts = pattern.split("/")
+        literal = 0
+        while literal < len(parts) - 1 and not _GLOB_MAGIC.search(parts[literal]):
+            literal += 1
+        scan = base + "".join(p + "/" for p in parts[:literal] if p)
+
+        matches = []
+        for file_path, size, modified_at in self._scan(scan, "size, modified_at"):
+            relative = file_path[len(base) :]
+            if wcglob.globmatch(
+                relative, pattern, flags=wcglob.BRACE | wcglob.GLOBSTAR
+            ):
+                matches.append(
+                    {
+                        "path": file_path,
+                        "is_dir": False,
+                        "size": size,
+                        "modified_at": modified_at,
+                    }
+                )
+        matches.sort(key=lambda fi: fi["modified_at"], reverse=True)
+        return matches
+
+    def write(self, file_path: str, content: str) -> WriteResult:
+        now = _now()
+        with self.store.transaction() as conn:
+            inserted = conn.execute(
+                "INSERT INTO files"
+                " (namespace, path, content, size, created_at, modified_at)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+                (self.namespace, file_path, content, _size(content), now, now),
+            ).rowcount
+        if not inserted:
+            return WriteResult(
+                error=f"Cannot write to {file_path} because it already exists. "
+                "Read and then make an edit, or write to a new path."
+            )
+        return WriteResult(path=file_path, files_update=None)
+
+    def edit(
+        self,
+        file_path: str,
+        old_string: str,
+        new_string: str,
+        replace_all: bool = False,
+    ) -> EditResult:
+        with self.store.transaction() as conn:
+            row = self._get(file_path)
+            if row is None:
+                return EditResult(error=f"Error: File '{file_path}' not found")
+            result = perform_string_replacement(
+                row[0], old_string, new_string, replace_all
+            )
+            if isinstance(result, str):
+                return EditResult(error=result)
+            content, occurrences = result
+            conn.execute(
+                "UPDATE files SET content = ?, size = ?, modified_at = ?"
+                " WHERE namespace = ? AND path = ?",
+                (content, _size(content), _now(), self.namespace, file_path),
+            )
+        return EditResult(
+            path=file_path, files_update=None, occurrences=int(occurrences)
+        )
+
+    def upload_files(self, files: List[Tuple[str, bytes]]) -> List[FileUploadResponse]:
+        now = _now()
+        rows = []
+        for path, data in files:
+            content = data.decode("utf-8", "replace")
+            rows.append((self.namespace, path, content, _size(content), now, now))
+        with self.store.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO files"
+                " (namespace, path, content, size, created_at, modified_at)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (namespace, path)"
+                " DO UPDATE SET content = excluded.content, size = excluded.size,"
+                " modified_at = excluded.modified_at",
+                rows,
+            )
+        return [FileUploadResponse(path=path, error=None) for path, _ in files]
+
+    def download_files(self, paths: List[str]) -> List[FileDownloadResponse]:
+        responses = []
+        for path in paths:
+            row = self._get(path)
+            if row is None:
+                responses.append(
+                    FileDownloadResponse(
+                        path=path, content=None, error="file_not_found"
+                    )
+                )
+            else:
+                responses.append(
+                    FileDownloadResponse(
+                        path=path, content=row[0].encode("utf-8"), error=None
+                    )
+                )
+        return responses
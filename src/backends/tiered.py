@@ -0,0 +1,281 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from deepagents.backends.protocol import (
+    BackendProtocol,
+    EditResult,
+    FileDownloadResponse,
+    FileInfo,
+    FileUploadResponse,
+    GrepMatch,
+    WriteResult,
+)
+from deepagents.backends.utils import (
+    check_empty_content,
+    format_content_with_line_numbers,
+)
+
+# files larger than this share of the hot tier always stay cold
+_MAX_HOT_SHARE = 4
+# heat below which a cold file's access history is forgotten
+_FORGET_HEAT = 0.05
+
+
+class _HotFile(NamedTuple):
+    """Content of a hot file, split into lines so reads only slice it."""
+
+    lines: List[str]
+    # warning returned for empty files, see check_empty_content
+    empty: Optional[str]
+    size: int
+
+
+class TieredBackend(BackendProtocol):
+    """Backend keeping frequently accessed files of a disk backend in RAM.
+
+    The cold tier, e.g. a FilesystemBackend, holds every file and stays
+    authoritative: writes and edits go through to it, and listings and
+    searches are served by it. The hot tier holds the contents of the
+    files read most often, and serves their reads.
+
+    Every access adds one to the heat of a file, which halves every
+    half_life seconds. A cold file whose heat reaches promote_after is
+    promoted, displacing colder hot files if the tier is full. Hot files
+    whose heat decays below demote_below are demoted. Since the cold tier
+    already has their content, demoting only drops it from memory.
+    """
+
+    def __init__(
+        self,
+        cold: BackendProtocol,
+        hot_bytes: int = 64 * 1024 * 1024,
+        promote_after: float = 3.0,
+        demote_below: float = 0.5,
+        half_life: float = 300.0,
+    ):
+        """
+        Args:
+            cold (BackendProtocol): Backend holding every file.
+            hot_bytes (int, optional): Bytes of file content the hot tier may hold. Defaults to 64 MiB.
+            promote_after (float, optional): Heat at which a file is promoted to the hot tier. Defaults to 3.0.
+            demote_below (float, optional): Heat below which a hot file is demoted. Defaults to 0.5.
+            half_life (float, optional): Seconds for the heat of an idle file to halve. Defaults to 300.
+        """
+        self.cold = cold
+        self.hot_bytes = hot_bytes
+        self.promote_after = promote_after
+        self.demote_below = demote_below
+        self.half_life = half_life
+        # path -> content of the hot files
+        self._hot: Dict[str, _HotFile] = {}
+        self.resident_bytes = 0
+        # path -> (heat, time it was measured)
+        self._heat: Dict[str, Tuple[float, float]] = {}
+        # bumped by every change, so content fetched across one is not promoted
+        self._generation = 0
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        self.hot_hits = 0
+        self.cold_reads = 0
+        self.promotions = 0
+        self.demotions = 0
+
+    def _current(self, path: str, now: float) -> float:
+        """Heat of a path at a time. Must be called with the lock held."""
+        heat, at = self._heat.get(path, (0.0, now))
+        return heat * 0.5 ** ((now - at) / self.half_life)
+
+    def _touch(self, path: str) -> float:
+        """Record an access to a path and return its heat. Must be called with the lock held."""
+        now = time.monotonic()
+        heat = self._current(path, now) + 1.0
+        self._heat[path] = (heat, now)
+        if now - self._last_sweep >= self.half_life / 4:
+            self._sweep(now)
+        return heat
+
+    def _drop(self, path: str) -> None:
+        """Remove a file from the hot tier. Must be called with the lock held."""
+        hot = self._hot.pop(path, None)
+        if hot is not None:
+            self.resident_bytes -= hot.size
+
+    def _sweep(self, now: float) -> int:
+        """Demote hot files that went idle and forget cold ones. Must be called with the lock held."""
+        self._last_sweep = now
+        idle = [p for p in self._hot if self._current(p, now) < self.demote_below]
+        for path in idle:
+            self._drop(path)
+        self.demotions += len(idle)
+        for path in [
+            p
+            for p in self._heat
+            if p not in self._hot and self._current(p, now) < _FORGET_HEAT
+        ]:
+            del self._heat[path]
+        return len(idle)
+
+    def _promote(self, path: str, hot: _HotFile, generation: int) -> None:
+        """Move a file to the hot tier if it is hotter than the files it displaces."""
+        size = hot.size
+        if size > self.hot_bytes // _MAX_HOT_SHARE:
+            return
+        with self._lock:
+            if generation != self._generation or path in self._hot:
+                return
+            now = time.monotonic()
+            heat = self._current(path, now)
+            victims, freed = [], 0
+            for other in sorted(self._hot, key=lambda p: self._current(p, now)):
+                if self.resident_bytes - freed + size <= self.hot_bytes:
+                    break
+                if self._current(other, now) >= heat:
+                    # only colder files make room, so hot files do not thrash
+                    return
+                victims.append(other)
+                freed += self._hot[other].size
+            for other in victims:
+                self._drop(other)
+            self.demotions += len(victims)
+            self._hot[path] = hot
+            self.resident_bytes += size
+            self.promotions += 1
+
+    def _changed(self, path: str) -> None:
+        """Record a change to a file made without its new content. Must be called with the lock held."""
+        self._generation += 1
+        self._drop(path)
+
+    def demote_idle(self) -> int:
+        """Demote the hot files whose heat decayed below demote_below.
+
+        Idle files are also demoted as a side effect of accesses, this
+        forces a pass, e.g. before measuring memory use.
+
+        Returns:
+            int: Number of files demoted.
+        """
+        with self._lock:
+            return self._sweep(time.monotonic())
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes and traffic of the tiers.
+
+        Returns:
+            Dict[str, int]: hot_files, resident_bytes, hot_hits, cold_reads, promotions and demotions.
+        """
+        with self._lock:
+            return {
+                "hot_files": len(self._hot),
+                "resident_bytes": self.resident_bytes,
+                "hot_hits": self.hot_hits,
+                "cold_reads": self.cold_reads,
+                "promotions": self.promotions,
+                "demotions": self.demotions,
+            }
+
+    def _load(self, path: str) -> Optional[_HotFile]:
+        """Read a file from the cold tier into a hot tier entry, or None if it cannot be."""
+        response = self.cold.download_files([path])[0]
+        if response.error is not None or response.content is None:
+            return None
+        try:
+            content = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+        return _HotFile(
+            content.splitlines(), check_empty_content(content), len(response.content)
+        )
+
+    def _fetch(self, path: str) -> Optional[_HotFile]:
+        """Hot tier entry of a file, promoting it first if it is hot enough.
+
+        Returns:
+            Optional[_HotFile]: The entry, or None if the caller should go to the cold tier.
+        """
+        with self._lock:
+            heat = self._touch(path)
+            hot = self._hot.get(path)
+            if hot is not None:
+                self.hot_hits += 1
+                return hot
+            self.cold_reads += 1
+            generation = self._generation
+        if heat < self.promote_after:
+            return None
+        hot = self._load(path)
+        if hot is not None:
+            self._promote(path, hot, generation)
+        return hot
+
+    def read(self, file_path: str, offset: int = 0, limit: int = 2000) -> str:
+        hot = self._fetch(file_path)
+        if hot is None:
+            return self.cold.read(file_path, offset, limit)
+        # same output as FilesystemBackend.read, without splitting the file again
+        if hot.empty:
+            return hot.empty
+        if offset >= len(hot.lines):
+            return f"Error: Line offset {offset} exceeds file length ({len(hot.lines)} lines)"
+        return format_content_with_line_numbers(
+            hot.lines[offset : offset + limit], start_line=offset + 1
+        )
+
+    def download_files(self, paths: List[str]) -> List[FileDownloadResponse]:
+        # the hot tier holds lines, the exact bytes are on disk
+        return self.cold.download_files(paths)
+
+    def write(self, file_path: str, content: str) -> WriteResult:
+        result = self.cold.write(file_path, content)
+        with self._lock:
+            self._changed(file_path)
+            if result.error is None:
+                self._touch(file_path)
+        return result
+
+    def edit(
+        self,
+        file_path: str,
+        old_string: str,
+        new_string: str,
+        replace_all: bool = False,
+    ) -> EditResult:
+        result = self.cold.edit(file_path, old_string, new_string, replace_all)
+        if result.error is not None:
+            return result
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._touch(file_path)
+            if file_path not in self._hot:
+                return result
+        # a hot working file stays hot, with its new content
+        hot = self._load(file_path)
+        with self._lock:
+            if file_path not in self._hot:
+                return result
+            self._drop(file_path)
+            if hot is not None and generation == self._generation:
+                self._hot[file_path] = hot
+                self.resident_bytes += hot.size
+        return result
+
+    def upload_files(self, files: List[Tuple[str, bytes]]) -> List[FileUploadResponse]:
+        try:
+            return self.cold.upload_files(files)
+        finally:
+            with self._lock:
+                for path, _ in files:
+                    self._changed(path)
+
+    def ls_info(self, path: str) -> List[FileInfo]:
+        return self.cold.ls_info(path)
+
+    def glob_info(self, pattern: str, path: str = "/") -> List[FileInfo]:
+        return self.cold.glob_info(pattern, path)
+
+    def grep_raw(
+        self, pattern: str, path: Optional[str] = None, glob: Optional[str] = None
+    ) -> Union[List[GrepMatch], str]:
+        return self.cold.grep_raw(pattern, path, glob)
@@ -13,6 +13,7 @@ class FileContent(BaseModel):
     info: Dict
     start: int
     end: int
+    total_lines: int
     content: str
 
 
@@ -1,6 +1,20 @@
+import asyncio
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Literal, Optional, Set, Tuple, Union
+
 from deepagents.backends import BackendProtocol
+from deepagents.backends.protocol import FileDownloadResponse, FileInfo, WriteResult
+from deepagents.backends.utils import truncate_if_too_long
 from deepagents.middleware import FilesystemMiddleware
 from langchain.agents.middleware.types import AgentMiddleware
+from langchain.tools import ToolRuntime
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+
+from src.backends.indexes import BM25Index, char_line_starts
+from src.backends.literals import LiteralSet
 
 from .utils import wrap_tool_with_doc_and_error_handling
 
@@ -40,9 +54,310 @@ Supports standard glob wildcards:
 - content: matching lines with content
 - count: match counts per file""",
     },
+    "grep_many": {
+        "patterns": "List of literal strings to search for (NOT regex). Each file is read once and searched for all of them.",
+        "path": 'Optional directory path to search in. If None, searches from the root. Example: "/notes".',
+        "glob": "Optional glob pattern to filter which FILES to search (e.g., `'*.md'`, `'**/*.txt'`). Defaults to all files.",
+        "ignore_case": "If True, match case-insensitively. Default: False.",
+        "output_mode": """Specifies format of the output, grouped by pattern. Options:
+- files_with_matches: file paths only, default
+- content: matching lines with line numbers
+- count: match counts per file""",
+    },
+    "read_many_files": {
+        "file_paths": "List of absolute paths of the files to read. Each must start with '/'.",
+        "offset": "Line number to start reading each file from (0-indexed). Default: 0.",
+        "limit": "Maximum number of lines to read per file. Default: 2000.",
+    },
+    "search": {
+        "query": "Free-text query describing what you are looking for, e.g. 'dark matter detection experiments'. Words are matched ignoring case, not as a regex.",
+        "path": 'Optional directory to search in. Defaults to root (`/`). Example: "/memories".',
+        "glob": "Optional glob pattern to filter which FILES to search (e.g., `'*.md'`). Defaults to all files.",
+        "k": "Maximum number of files to return, best first. Default: 5.",
+    },
+    "write_many_files": {
+        "files": "List of files to create, each a mapping with 'file_path' (absolute path, must start with '/') and 'content' (string content of the file).",
+    },
 }
 
 
+# files grep_many downloads at a time, so memory is bounded by a batch
+# instead of by every file under the searched path
+GREP_MANY_BATCH = 64
+
+
+class _GrepManyScan:
+    """Occurrences of many literals in files scanned batch by batch, see the grep_many tool."""
+
+    def __init__(
+        self,
+        patterns: List[str],
+        ignore_case: bool,
+        output_mode: Literal["files_with_matches", "content", "count"],
+    ):
+        """
+        Args:
+            patterns (List[str]): Literal strings to search for.
+            ignore_case (bool): Match case-insensitively.
+            output_mode (Literal["files_with_matches", "content", "count"]): Output format.
+        """
+        self.literals = LiteralSet(patterns, ignore_case=ignore_case)
+        self.output_mode = output_mode
+        # pattern -> path -> line numbers of the occurrences
+        self.hits: Dict[str, Dict[str, List[int]]] = {
+            p: {} for p in self.literals.patterns
+        }
+        # path -> line number -> text, only of the lines holding occurrences
+        self.lines: Dict[str, Dict[int, str]] = {}
+
+    def scan(self, responses: List[FileDownloadResponse]):
+        """Add the occurrences in a batch of downloaded files.
+
+        Args:
+            responses (List[FileDownloadResponse]): Downloaded files, in output order.
+        """
+        literals = self.literals
+        for response in responses:
+            if response.content is None:
+                continue
+            text = response.content.decode("utf-8", errors="replace")
+            if self.output_mode == "files_with_matches":
+                for index in literals.occurring(text):
+                    self.hits[literals.patterns[index]][response.path] = []
+                continue
+            line_starts = char_line_starts(text)
+            for match_start, _, index in literals.iter_matches(text):
+                row = bisect_right(line_starts, match_start) - 1
+                self.hits[literals.patterns[index]].setdefault(
+                    response.path, []
+                ).append(row)
+                if self.output_mode == "content":
+                    end = (
+                        line_starts[row + 1] - 1
+                        if row + 1 < len(line_starts)
+                        else len(text)
+                    )
+                    self.lines.setdefault(response.path, {})[row] = text[
+                        line_starts[row] : end
+                    ]
+
+    def output(self) -> str:
+        """Matches grouped by pattern, in the order the files were scanned."""
+        out = []
+        for pattern, per_file in self.hits.items():
+            out.append(f"{pattern}:" if per_file else f"{pattern}: No matches found")
+            for file_path, rows in per_file.items():
+                if self.output_mode == "count":
+                    out.append(f"  {file_path}: {len(rows)}")
+                elif self.output_mode == "content":
+                    lines = self.lines[file_path]
+                    for row in dict.fromkeys(rows):
+                        out.append(f"  {file_path}:{row + 1}: {lines[row]}")
+                else:
+                    out.append(f"  {file_path}")
+        return truncate_if_too_long("\n".join(out))
+
+
+def _read_many_output(file_paths: List[str], contents: List[str], limit: int) -> str:
+    """Join file contents into `==> path <==` sections, see the read_many_files tool.
+
+    Args:
+        file_paths (List[str]): Paths of the files, in output order.
+        contents (List[str]): Formatted content of each file, as returned by read.
+        limit (int): Maximum number of lines per file.
+
+    Returns:
+        str: The contents of all files, one section per file.
+    """
+    sections = []
+    for file_path, content in zip(file_paths, contents):
+        lines = content.splitlines(keepends=True)
+        if len(lines) > limit:
+            content = "".join(lines[:limit])
+        sections.append(f"==> {file_path} <==\n{content}")
+    return truncate_if_too_long("\n\n".join(sections))
+
+
+def _write_many_output(
+    results: List[WriteResult], runtime: ToolRuntime
+) -> Union[Command, str]:
+    """Report the results of several writes, see the write_many_files tool.
+
+    Args:
+        results (List[WriteResult]): Result of each write, in order.
+        runtime (ToolRuntime): Runtime of the tool call.
+
+    Returns:
+        Union[Command, str]: One status line per file, wrapped in a Command when state has to be updated.
+    """
+    lines = []
+    files_update = {}
+    for res in results:
+        if res.error:
+            lines.append(res.error)
+            continue
+        lines.append(f"Updated file {res.path}")
+        if res.files_update is not None:
+            files_update.update(res.files_update)
+    message = "\n".join(lines)
+    if files_update:
+        # state backends return updates that have to go through the graph
+        return Command(
+            update={
+                "files": files_update,
+                "messages": [
+                    ToolMessage(content=message, tool_call_id=runtime.tool_call_id)
+                ],
+            }
+        )
+    return message
+
+
+class _SearchIndex:
+    """BM25 index over the files of a backend, for the search tool.
+
+    Files are re-indexed only when their size or modification time changed
+    since they were last indexed, so repeated searches cost O(changes)
+    reads instead of reading the whole corpus every time.
+    """
+
+    def __init__(self):
+        self.index = BM25Index()
+        # path -> (size, modified_at) when the file was indexed
+        self.signatures: Dict[str, Tuple] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _files(infos: List[FileInfo]) -> Dict[str, Tuple]:
+        return {
+            fi["path"]: (fi.get("size"), fi.get("modified_at"))
+            for fi in infos
+            if not fi.get("is_dir")
+        }
+
+    def stale(self, infos: List[FileInfo]) -> List[str]:
+        """Paths of the listed files that have to be (re-)indexed.
+
+        Args:
+            infos (List[FileInfo]): Files in the scope of the search.
+
+        Returns:
+            List[str]: Paths to download and pass to update.
+        """
+        with self.lock:
+            return [
+                path
+                for path, signature in self._files(infos).items()
+                if self.signatures.get(path) != signature
+            ]
+
+    def update(
+        self,
+        infos: List[FileInfo],
+        responses: List[FileDownloadResponse],
+        scope: Optional[str],
+    ) -> None:
+        """Index downloaded files and drop files that disappeared.
+
+        Args:
+            infos (List[FileInfo]): Files in the scope of the search.
+            responses (List[FileDownloadResponse]): Downloads of the stale files.
+            scope (Optional[str]): Directory whose every file is listed in infos, so that indexed files missing from it were removed. None if infos is filtered.
+        """
+        files = self._files(infos)
+        with self.lock:
+            for response in responses:
+                if response.content is None:
+                    continue
+                self.index.add(
+                    response.path, response.content.decode("utf-8", errors="replace")
+                )
+                self.signatures[response.path] = files[response.path]
+            if scope is not None:
+                root = scope.rstrip("/")
+                for path in list(self.signatures):
+                    if path.startswith(root + "/") and path not in files:
+                        self.index.remove(path)
+                        del self.signatures[path]
+
+    def search(self, query: str, infos: List[FileInfo], k: int) -> List[Dict]:
+        """Rank the listed files for a query, see BM25Index.search."""
+        with self.lock:
+            return self.index.search(query, k=k, paths=set(self._files(infos)))
+
+
+# graph threads whose search index is kept, least recently searched first out
+SEARCH_INDEXES = 16
+
+
+class _SearchIndexes:
+    """Search indexes of the graph threads that searched most recently.
+
+    The files a backend resolves to differ between graph threads, e.g. the
+    notes in their state, so every thread gets an index of its own. A shared
+    one would rank against other threads' files and re-index on every switch
+    between threads.
+    """
+
+    def __init__(self, max_indexes: int = SEARCH_INDEXES):
+        """
+        Args:
+            max_indexes (int, optional): Number of indexes kept. Defaults to SEARCH_INDEXES.
+        """
+        self.max_indexes = max_indexes
+        self._indexes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, runtime: Optional[ToolRuntime]) -> _SearchIndex:
+        """Index of the graph thread of a tool call, created on its first search.
+
+        Args:
+            runtime (Optional[ToolRuntime]): Runtime of the tool call. Calls without a thread_id share one index.
+
+        Returns:
+            _SearchIndex: The index.
+        """
+        config = getattr(runtime, "config", None) or {}
+        key = config.get("configurable", {}).get("thread_id")
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = _SearchIndex()
+                if len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(key)
+            return index
+
+
+def _search_output(hits: List[Dict], responses: List[FileDownloadResponse]) -> str:
+    """Format ranked files with their best passages, see the search tool.
+
+    Args:
+        hits (List[Dict]): Ranked files, see BM25Index.search.
+        responses (List[FileDownloadResponse]): Downloads of the ranked files.
+
+    Returns:
+        str: One block per file, best first, with 1-indexed line ranges.
+    """
+    if not hits:
+        return "No matches found"
+    texts = {
+        r.path: r.content.decode("utf-8", errors="replace").split("\n")
+        for r in responses
+        if r.content is not None
+    }
+    out = []
+    for hit in hits:
+        out.append(f"{hit['path']} (score {hit['score']:.2f})")
+        lines = texts.get(hit["path"], [])
+        for passage in hit["passages"]:
+            start, end = passage["start"], passage["end"]
+            out.append(f"  lines {start + 1}-{end} (score {passage['score']:.2f}):")
+            out.extend(f"    {line}" for line in lines[start:end])
+    return truncate_if_too_long("\n".join(out))
+
+
 class FileSystemToolsMiddleware(FilesystemMiddleware):
     def __init__(
         self,
@@ -60,6 +375,10 @@ class FileSystemToolsMiddleware(FilesystemMiddleware):
             custom_tool_descriptions=custom_tool_descriptions,
             tool_token_limit_before_evict=tool_token_limit_before_evict,
         )
+        self.tools.append(self._create_grep_many_tool())
+        self.tools.append(self._create_read_many_files_tool())
+        self.tools.append(self._create_write_many_files_tool())
+        self.tools.append(self._create_search_tool())
 
         # filter from the default filesystem tools
         # like, by default "execute" tool is excluded
@@ -88,6 +407,222 @@ class FileSystemToolsMiddleware(FilesystemMiddleware):
                 ),
             ).args_schema
 
+    def _create_grep_many_tool(self):
+        middleware = self
+
+        def grep_many(
+            patterns: List[str],
+            runtime: ToolRuntime,
+            path: Optional[str] = None,
+            glob: Optional[str] = None,
+            ignore_case: bool = False,
+            output_mode: Literal[
+                "files_with_matches", "content", "count"
+            ] = "files_with_matches",
+        ) -> str:
+            """Search for many literal strings across files at once, e.g. all the keywords of a research plan. Every file is read once and scanned for all strings, which is much cheaper than calling `grep` once per string.
+
+            Args:
+                patterns (List[str]): Literal strings to search for.
+                path (Optional[str]): Directory to search in.
+                glob (Optional[str]): Glob pattern to filter files.
+                ignore_case (bool): Match case-insensitively.
+                output_mode (Literal["files_with_matches", "content", "count"]): Output format.
+
+            Returns:
+                str: Matches grouped by pattern.
+            """
+            backend = middleware._get_backend(runtime)
+            infos = backend.glob_info(glob or "**/*", path=path or "/")
+            paths = sorted(fi["path"] for fi in infos if not fi.get("is_dir"))
+            scan = _GrepManyScan(patterns, ignore_case, output_mode)
+            for i in range(0, len(paths), GREP_MANY_BATCH):
+                scan.scan(backend.download_files(paths[i : i + GREP_MANY_BATCH]))
+            return scan.output()
+
+        async def agrep_many(
+            patterns: List[str],
+            runtime: ToolRuntime,
+            path: Optional[str] = None,
+            glob: Optional[str] = None,
+            ignore_case: bool = False,
+            output_mode: Literal[
+                "files_with_matches", "content", "count"
+            ] = "files_with_matches",
+        ) -> str:
+            backend = middleware._get_backend(runtime)
+            infos = await backend.aglob_info(glob or "**/*", path=path or "/")
+            paths = sorted(fi["path"] for fi in infos if not fi.get("is_dir"))
+            scan = _GrepManyScan(patterns, ignore_case, output_mode)
+            for i in range(0, len(paths), GREP_MANY_BATCH):
+                responses = await backend.adownload_files(
+                    paths[i : i + GREP_MANY_BATCH]
+                )
+                # the scan is CPU bound, keep it off the event loop
+                await asyncio.to_thread(scan.scan, responses)
+            return scan.output()
+
+        return wrap_tool_with_doc_and_error_handling(
+            grep_many,
+            custom_name="grep_many",
+            custom_param_descriptions=tool_param_descriptions["grep_many"],
+            coroutine=agrep_many,
+        )
+
+    def _create_read_many_files_tool(self):
+        middleware = self
+
+        def read_many_files(
+            file_paths: List[str],
+            runtime: ToolRuntime,
+            offset: int = 0,
+            limit: int = 2000,
+        ) -> str:
+            """Read several files in a single call, e.g. all the notes relevant to a question. Use this instead of calling `read_file` once per file. Each file is shown under a `==> path <==` header, in the same format as `read_file`.
+
+            Args:
+                file_paths (List[str]): Absolute paths of the files to read.
+                offset (int): Line to start reading each file from.
+                limit (int): Maximum number of lines per file.
+
+            Returns:
+                str: The contents of all files, one section per file.
+            """
+            backend = middleware._get_backend(runtime)
+            file_paths = list(dict.fromkeys(file_paths))
+            contents = [
+                backend.read(file_path, offset=offset, limit=limit)
+                for file_path in file_paths
+            ]
+            return _read_many_output(file_paths, contents, limit)
+
+        async def aread_many_files(
+            file_paths: List[str],
+            runtime: ToolRuntime,
+            offset: int = 0,
+            limit: int = 2000,
+        ) -> str:
+            backend = middleware._get_backend(runtime)
+            file_paths = list(dict.fromkeys(file_paths))
+            contents = await asyncio.gather(
+                *(
+                    backend.aread(file_path, offset=offset, limit=limit)
+                    for file_path in file_paths
+                )
+            )
+            return _read_many_output(file_paths, contents, limit)
+
+        return wrap_tool_with_doc_and_error_handling(
+            read_many_files,
+            custom_name="read_many_files",
+            custom_param_descriptions=tool_param_descriptions["read_many_files"],
+            coroutine=aread_many_files,
+        )
+
+    def _create_write_many_files_tool(self):
+        middleware = self
+
+        def write_many_files(
+            files: List[Dict[str, str]],
+            runtime: ToolRuntime,
+        ) -> Union[Command, str]:
+            """Create several new files in a single call. Use this instead of calling `write_file` once per file. Files that fail, e.g. because they already exist, are reported without stopping the others.
+
+            Args:
+                files (List[Dict[str, str]]): Files to create, each with 'file_path' and 'content'.
+
+            Returns:
+                Union[Command, str]: One status line per file.
+            """
+            backend = middleware._get_backend(runtime)
+            results = [
+                backend.write(entry["file_path"], entry["content"]) for entry in files
+            ]
+            return _write_many_output(results, runtime)
+
+        async def awrite_many_files(
+            files: List[Dict[str, str]],
+            runtime: ToolRuntime,
+        ) -> Union[Command, str]:
+            backend = middleware._get_backend(runtime)
+            # one at a time, so that later files see the earlier ones
+            results = []
+            for entry in files:
+                results.append(
+                    await backend.awrite(entry["file_path"], entry["content"])
+                )
+            return _write_many_output(results, runtime)
+
+        return wrap_tool_with_doc_and_error_handling(
+            write_many_files,
+            custom_name="write_many_files",
+            custom_param_descriptions=tool_param_descriptions["write_many_files"],
+            coroutine=awrite_many_files,
+        )
+
+    def _create_search_tool(self):
+        middleware = self
+        indexes = _SearchIndexes()
+
+        def search(
+            query: str,
+            runtime: ToolRuntime,
+            path: Optional[str] = None,
+            glob: Optional[str] = None,
+            k: int = 5,
+        ) -> str:
+            """Find the files most relevant to a free-text query, e.g. "which note talks about dark matter detection", ranked with BM25. Returns the best files with their most relevant passages and scores, in one call instead of several `grep` and `read_file` round trips. Use `grep` instead to find exact strings.
+
+            Args:
+                query (str): Free-text query.
+                path (Optional[str]): Directory to search in.
+                glob (Optional[str]): Glob pattern to filter files.
+                k (int): Maximum number of files to return.
+
+            Returns:
+                str: The best files, each with its most relevant passages.
+            """
+            backend = middleware._get_backend(runtime)
+            index = indexes.get(runtime)
+            infos = backend.glob_info(glob or "**/*", path=path or "/")
+            stale = index.stale(infos)
+            index.update(
+                infos,
+                backend.download_files(stale),
+                scope=None if glob else path or "/",
+            )
+            hits = index.search(query, infos, k)
+            return _search_output(
+                hits, backend.download_files([hit["path"] for hit in hits])
+            )
+
+        async def asearch(
+            query: str,
+            runtime: ToolRuntime,
+            path: Optional[str] = None,
+            glob: Optional[str] = None,
+            k: int = 5,
+        ) -> str:
+            backend = middleware._get_backend(runtime)
+            index = indexes.get(runtime)
+            infos = await backend.aglob_info(glob or "**/*", path=path or "/")
+            responses = await backend.adownload_files(index.stale(infos))
+            # tokenizing is CPU bound, keep it off the event loop
+            await asyncio.to_thread(
+                index.update, infos, responses, None if glob else path or "/"
+            )
+            hits = index.search(query, infos, k)
+            return _search_output(
+                hits, await backend.adownload_files([hit["path"] for hit in hits])
+            )
+
+        return wrap_tool_with_doc_and_error_handling(
+            search,
+            custom_name="search",
+            custom_param_descriptions=tool_param_descriptions["search"],
+            coroutine=asearch,
+        )
+
     # need to implement the write todos and research plans tool
     # they need to be sync and async
     def _create_write_todos_tool(self):
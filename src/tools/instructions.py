@@ -46,4 +46,20 @@ USAGE_INSTRUCTIONS = {
         "desc": "Search for a text pattern across files",
         "usage": "Use this tool to search for specific patterns of text across files in the filesystem. ",
     },
+    "grep_many": {
+        "desc": "Search for many literal strings across files in one call",
+        "usage": "Use this tool instead of repeated `grep` calls when checking which files mention each of several keywords.",
+    },
+    "read_many_files": {
+        "desc": "Reads several files from the filesystem in one call",
+        "usage": "Use this tool instead of repeated `read_file` calls when you already know which files you need. There is a limit on contents returned per file (see tool schema).",
+    },
+    "write_many_files": {
+        "desc": "Writes several new files in one call",
+        "usage": "Use this tool instead of repeated `write_file` calls when creating several files at once. Always write files in valid markdown format. Never use emojis.",
+    },
+    "search": {
+        "desc": "Find the files most relevant to a free-text query",
+        "usage": "Use this tool to find which notes or memories talk about a topic when you do not know the exact wording. It returns ranked files with their most relevant passages, so read the full file only if the passages are not enough.",
+    },
 }
@@ -172,6 +172,7 @@ def wrap_tool_with_doc_and_error_handling(
     custom_name: str = None,
     custom_description: str = None,
     custom_param_descriptions: dict = {},
+    coroutine=None,
 ):
     raw_doc = inspect.getdoc(func) or ""
     doc = parse(raw_doc)
@@ -231,11 +232,15 @@ def wrap_tool_with_doc_and_error_handling(
     args_schema.model_config = ConfigDict(
         json_schema_extra={"title": final_name, "description": final_description}
     )
-    return tool(
+    wrapped_tool = tool(
         _wrap_tool_with_error_handling(func),
         args_schema=args_schema,
         description=final_description,
     )
+    if coroutine is not None:
+        # native async variant, used by ainvoke instead of running func in a thread
+        wrapped_tool.coroutine = _wrap_tool_with_error_handling(coroutine)
+    return wrapped_tool
 
 
 def filter_tool_from_middleware_by_name(
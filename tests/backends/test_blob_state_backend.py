@@ -0,0 +1,153 @@
+"""
+pytest test suite for BlobStore and BlobStateBackend
+
+Tests the content-addressed blob store and the state backend keeping only
+digests of file bodies in graph state.
+
+Run with: uv run pytest tests/backends/test_blob_state_backend.py -v
+"""
+
+import os
+
+import pytest
+from langchain.tools import ToolRuntime
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.backends.blobs import BlobStateBackend, BlobStore, referenced_digests
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    """Create a fresh BlobStore for each test."""
+    return BlobStore(tmp_path / "blobs")
+
+
+@pytest.fixture
+def state():
+    """Graph state the backend reads, updated like the files reducer does."""
+    return {"files": {}}
+
+
+@pytest.fixture
+def backend(blobs, state):
+    """BlobStateBackend over the state and blob store."""
+    rt = ToolRuntime(
+        state=state,
+        context=None,
+        config={},
+        stream_writer=None,
+        tool_call_id="call",
+        store=None,
+    )
+    return BlobStateBackend(rt, blobs)
+
+
+def apply(state, result):
+    """Merge the files update of a write or edit into the state."""
+    assert result.error is None
+    state["files"].update(result.files_update)
+    return result
+
+
+class TestBlobStore:
+    """Tests for the content-addressed blob store."""
+
+    def test_put_get(self, blobs):
+        """Blobs read back by digest, and identical content is stored once."""
+        digest = blobs.put(b"hello")
+        assert blobs.put(b"hello") == digest
+        assert blobs.get(digest) == b"hello"
+        assert digest in blobs
+        assert len(list(blobs.root.rglob("*"))) == 2  # fan-out dir and blob
+
+    def test_sweep(self, blobs):
+        """Only unreferenced blobs older than min_age are deleted."""
+        live, dead, young = (blobs.put(data) for data in (b"live", b"dead", b"young"))
+        for digest in (live, dead):
+            os.utime(blobs._path(digest), (0, 0))
+        assert blobs.sweep([live], min_age=60) == 1
+        assert live in blobs and young in blobs and dead not in blobs
+        # storing a blob again makes it young
+        os.utime(blobs._path(young), (0, 0))
+        blobs.put(b"young")
+        assert blobs.sweep([], min_age=60) == 1
+        assert young in blobs
+
+    def test_missing(self, blobs):
+        """Unknown digests raise FileNotFoundError."""
+        with pytest.raises(FileNotFoundError):
+            blobs.get("0" * 64)
+
+
+class TestBlobStateBackend:
+    """Tests for the state backend keeping file bodies in the blob store."""
+
+    def test_state_holds_digest(self, backend, state):
+        """Writes put the digest and size in state, never the content."""
+        apply(state, backend.write("/a.md", "héllo\nworld"))
+        entry = state["files"]["/a.md"]
+        assert set(entry) == {"hash", "size", "created_at", "modified_at"}
+        assert entry["size"] == len("héllo\nworld".encode())
+        assert "world" in backend.read("/a.md")
+        assert "already exists" in backend.write("/a.md", "x").error
+
+    def test_edit(self, backend, state, blobs):
+        """Edits store a new blob and keep the creation time."""
+        apply(state, backend.write("/a.md", "x y x"))
+        before = state["files"]["/a.md"]
+        result = apply(state, backend.edit("/a.md", "x", "z", replace_all=True))
+        after = state["files"]["/a.md"]
+        assert result.occurrences == 2
+        assert after["hash"] != before["hash"]
+        assert after["created_at"] == before["created_at"]
+        assert blobs.get(before["hash"]) == b"x y x"
+        assert backend.download_files(["/a.md"])[0].content == b"z y z"
+
+    def test_listing_and_search(self, backend, state):
+        """ls, glob and grep see the files through their digests."""
+        apply(state, backend.write("/a.md", "alpha"))
+        apply(state, backend.write("/d/b.md", "beta\nalphabet"))
+        ls = backend.ls_info("/")
+        assert [fi["path"] for fi in ls] == ["/a.md", "/d/"]
+        assert ls[0]["size"] == 5
+        assert [fi["path"] for fi in backend.glob_info("**/*.md")] == [
+            "/d/b.md",
+            "/a.md",
+        ]
+        matches = backend.grep_raw("alpha", "/d")
+        assert [(m["path"], m["line"]) for m in matches] == [("/d/b.md", 2)]
+
+    def test_inline_entries(self, backend, state):
+        """Entries written by StateBackend, with inline content, still read."""
+        state["files"]["/old.md"] = {
+            "content": ["old", "note"],
+            "created_at": "",
+            "modified_at": "",
+        }
+        assert "note" in backend.read("/old.md")
+        assert backend.ls_info("/")[0]["size"] == len("old\nnote")
+        apply(state, backend.edit("/old.md", "old", "new"))
+        assert "hash" in state["files"]["/old.md"]
+        assert "new" in backend.read("/old.md")
+
+    def test_edits_collected(self, backend, blobs, state):
+        """Bodies replaced by edits are swept once no checkpoint references them."""
+        apply(state, backend.write("/a.md", "v0"))
+        for i in range(1, 5):
+            apply(state, backend.edit("/a.md", f"v{i - 1}", f"v{i}"))
+        pending = apply(state, backend.write("/b.md", "pending"))
+        checkpointer = InMemorySaver()
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"files": {"/a.md": state["files"]["/a.md"]}}
+        checkpoint["channel_versions"] = {"files": 1}
+        config = checkpointer.put(
+            {"configurable": {"thread_id": "t", "checkpoint_ns": ""}},
+            checkpoint,
+            {},
+            {"files": 1},
+        )
+        checkpointer.put_writes(config, [("files", pending.files_update)], "task")
+        assert blobs.sweep(referenced_digests(checkpointer), min_age=0) == 4
+        assert "v4" in backend.read("/a.md")
+        assert "pending" in backend.read("/b.md")
@@ -0,0 +1,113 @@
+"""
+pytest test suite for ByteLRU and CachingBackend
+
+Tests the byte-bounded LRU, the read-through caching of backend results and
+their invalidation by writes through the wrapper.
+
+Run with: uv run pytest tests/backends/test_caching_backend.py -v
+"""
+
+import pytest
+from deepagents.backends import FilesystemBackend
+
+from src.backends.cache import ByteLRU, CachingBackend
+
+
+@pytest.fixture
+def disk(tmp_path):
+    """FilesystemBackend over a temporary directory with a few files."""
+    backend = FilesystemBackend(root_dir=tmp_path, virtual_mode=True)
+    backend.upload_files([("/a.md", b"alpha"), ("/d/b.md", b"beta"), ("/e/c.md", b"")])
+    return backend
+
+
+@pytest.fixture
+def cached(disk):
+    """CachingBackend over the filesystem backend."""
+    return CachingBackend(disk)
+
+
+class TestByteLRU:
+    """Tests for the byte-bounded LRU."""
+
+    def test_byte_bound(self):
+        """Least recently used entries are evicted past max_bytes."""
+        cache = ByteLRU(max_bytes=300)
+        for key in "abc":
+            cache.get_or_load(key, None, "/" + key, lambda: "x" * 36)
+        cache.get_or_load("a", None, "/a", lambda: "")
+        cache.get_or_load("d", None, "/d", lambda: "x" * 36)
+        stats = cache.stats()
+        assert stats["entries"] == 3 and stats["evictions"] == 1
+        assert stats["bytes"] <= 300
+        assert cache.get_or_load("a", None, "/a", lambda: "miss") != "miss"
+        assert cache.get_or_load("b", None, "/b", lambda: "miss") == "miss"
+
+    def test_invalidated_while_loading(self):
+        """A value loaded while its path changes is returned but not stored."""
+        cache = ByteLRU()
+
+        def load():
+            cache.invalidate(None, "/a")
+            return "stale"
+
+        assert cache.get_or_load("k", None, "/a", load) == "stale"
+        assert cache.get_or_load("k", None, "/a", lambda: "fresh") == "fresh"
+
+
+class TestCachingBackend:
+    """Tests for the read-through caching wrapper."""
+
+    def test_read_hits(self, cached):
+        """Repeated reads are served from the cache."""
+        first = cached.read("/a.md")
+        assert cached.read("/a.md") == first
+        assert cached.stats()["hits"] == 1
+        assert cached.stats()["hit_rate"] == 0.5
+
+    def test_edit_invalidates(self, cached):
+        """Edits drop the cached reads of the file and listings covering it."""
+        cached.read("/d/b.md")
+        cached.ls_info("/d")
+        cached.grep_raw("beta")
+        cached.edit("/d/b.md", "beta", "gamma")
+        assert "gamma" in cached.read("/d/b.md")
+        assert cached.grep_raw("beta") == []
+        assert cached.stats()["hits"] == 0
+
+    def test_write_invalidates_scope_only(self, cached):
+        """Writes keep the entries of unrelated paths."""
+        cached.ls_info("/d")
+        cached.ls_info("/e")
+        cached.grep_raw("alpha", "/a.md")
+        cached.write("/d/new.md", "alpha")
+        assert "/d/new.md" in [fi["path"] for fi in cached.ls_info("/d")]
+        cached.ls_info("/e")
+        assert cached.stats()["hits"] == 1
+        # a grep of a single file is dropped by edits of that file
+        cached.edit("/a.md", "alpha", "omega")
+        assert "/a.md" not in [m["path"] for m in cached.grep_raw("alpha", "/a.md")]
+
+    def test_shared_partition(self, disk):
+        """Wrappers sharing a cache partition see each other's writes."""
+        cache = ByteLRU()
+        first = CachingBackend(disk, cache, partition="p")
+        second = CachingBackend(disk, cache, partition="p")
+        assert "not found" in first.read("/new.md")
+        second.write("/new.md", "hello")
+        assert "hello" in first.read("/new.md")
+
+    def test_results_are_copies(self, cached):
+        """Mutating a returned listing does not change the cached one."""
+        cached.ls_info("/")[0]["path"] = "/mutated"
+        assert cached.ls_info("/")[0]["path"] == "/a.md"
+
+    def test_reads_not_cached(self, disk):
+        """With cache_reads off, only listings and searches are cached."""
+        cached = CachingBackend(disk, cache_reads=False)
+        cached.read("/a.md")
+        cached.read("/a.md")
+        cached.ls_info("/")
+        cached.ls_info("/")
+        stats = cached.stats()
+        assert stats["entries"] == 1 and stats["hits"] == 1
@@ -0,0 +1,172 @@
+"""
+pytest test suite for CustomBackend
+
+Tests the pooling of the composite backends resolved for tool calls and the
+namespacing of memories.
+
+Run with: uv run pytest tests/backends/test_custom_backend.py -v
+"""
+
+import threading
+
+import pytest
+from langchain.tools import ToolRuntime
+
+from src.backends import CustomBackend
+
+
+def make_runtime(thread_id="thread", files=None, user_id=None):
+    """ToolRuntime of a call in a graph thread, with the given state files."""
+    return ToolRuntime(
+        state={"files": files or {}},
+        context=None,
+        config={"configurable": {"thread_id": thread_id, "user_id": user_id}},
+        stream_writer=None,
+        tool_call_id="call",
+        store=None,
+    )
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """Create a fresh CustomBackend for each test."""
+    backend = CustomBackend(
+        pool_size=2,
+        memories_db=tmp_path / "memories.sqlite3",
+        blobs_dir=tmp_path / "blobs",
+    )
+    yield backend
+    backend.close()
+
+
+class TestBackendPool:
+    """Tests for the pooled composite backends."""
+
+    def test_reused_per_graph_thread(self, backend):
+        """Calls of one graph thread share a composite, others get their own."""
+        first = backend(make_runtime("a"))
+        assert backend(make_runtime("a")) is first
+        assert backend(make_runtime("b")) is not first
+
+    def test_rebound_to_current_state(self, backend):
+        """A pooled composite reads the state of the call it was resolved for."""
+        backend(make_runtime()).write("/notes/a.md", "old")
+        # the /notes/ route stores paths without its prefix
+        files = {
+            "/b.md": {
+                "content": ["new"],
+                "created_at": "",
+                "modified_at": "",
+            }
+        }
+        composite = backend(make_runtime(files=files))
+        assert [fi["path"] for fi in composite.ls_info("/notes/")] == ["/notes/b.md"]
+        assert "new" in composite.read("/notes/b.md")
+
+    def test_state_holds_digests(self, backend):
+        """Notes written through the composite only put their digest in state."""
+        result = backend(make_runtime()).write("/notes/a.md", "body")
+        entry = result.files_update["/a.md"]
+        assert "content" not in entry and entry["size"] == 4
+        files = {"/a.md": entry}
+        assert "body" in backend(make_runtime(files=files)).read("/notes/a.md")
+
+    def test_lru_bound(self, backend):
+        """The least recently used composite is dropped past pool_size."""
+        a = backend(make_runtime("a"))
+        backend(make_runtime("b"))
+        backend(make_runtime("a"))
+        backend(make_runtime("c"))
+        assert backend(make_runtime("a")) is a
+        assert len(backend._pool) == 2
+
+    def test_per_os_thread(self, backend):
+        """OS threads never share a composite."""
+        main = backend(make_runtime())
+        other = []
+        t = threading.Thread(target=lambda: other.append(backend(make_runtime())))
+        t.start()
+        t.join()
+        assert other[0] is not main
+
+
+class TestMemories:
+    """Tests for the SQLite backed /memories/ route."""
+
+    def test_namespaced_by_user(self, backend):
+        """Users only see their own memories, whatever thread they write from."""
+        backend(make_runtime("a", user_id="u1")).write("/memories/m.md", "one")
+        assert "one" in backend(make_runtime("b", user_id="u1")).read("/memories/m.md")
+        assert "not found" in backend(make_runtime("a", user_id="u2")).read(
+            "/memories/m.md"
+        )
+
+    def test_users_without_graph_thread(self, backend):
+        """Calls of different users on one OS thread never share memories."""
+        # e.g. async runs without a thread_id interleaving on one event loop
+        first = backend(make_runtime(None, user_id="u1"))
+        second = backend(make_runtime(None, user_id="u2"))
+        first.write("/memories/m.md", "one")
+        assert "not found" in second.read("/memories/m.md")
+        assert "one" in first.read("/memories/m.md")
+
+    def test_pooled_per_namespace(self, backend):
+        """A pooled composite keeps the namespace it was built for."""
+        first = backend(make_runtime("a", user_id="u1"))
+        assert backend(make_runtime("a", user_id="u2")) is not first
+        first.write("/memories/m.md", "one")
+        assert "one" in backend(make_runtime("a", user_id="u1")).read("/memories/m.md")
+
+    def test_cached_across_threads(self, backend):
+        """Writes from one graph thread invalidate the cache of the others."""
+        reader = backend(make_runtime("a", user_id="u"))
+        assert "not found" in reader.read("/memories/m.md")
+        backend(make_runtime("b", user_id="u")).write("/memories/m.md", "new")
+        assert "new" in reader.read("/memories/m.md")
+        assert "new" in reader.read("/memories/m.md")
+        assert backend.cache.stats()["hits"] == 1
+
+    def test_created_on_first_use(self, backend, tmp_path):
+        """Constructing the backend creates no files until memories are used."""
+        assert list(tmp_path.iterdir()) == []
+        backend(make_runtime()).write("/memories/m.md", "one")
+        assert (tmp_path / "memories.sqlite3").exists()
+        assert not (tmp_path / "blobs").exists()
+
+    def test_survive_restart(self, tmp_path):
+        """Memories written by one backend are read by the next one."""
+        db = tmp_path / "memories.sqlite3"
+        first = CustomBackend(memories_db=db, blobs_dir=tmp_path / "blobs")
+        first(make_runtime(user_id="u")).write("/memories/m.md", "kept")
+        first.close()
+        second = CustomBackend(memories_db=db, blobs_dir=tmp_path / "blobs")
+        assert "kept" in second(make_runtime(user_id="u")).read("/memories/m.md")
+        second.close()
+
+
+class TestArtifacts:
+    """Tests for the tiered /artifacts/ route."""
+
+    def test_working_files_served_hot(self, backend):
+        """Repeatedly read artifacts are promoted to the hot tier."""
+        composite = backend(make_runtime())
+        composite.write("/artifacts/work.md", "draft")
+        for _ in range(50):
+            assert "draft" in composite.read("/artifacts/work.md")
+        stats = backend.artifacts_backend.stats()
+        assert stats["promotions"] == 1
+        assert (
+            stats["cold_reads"] <= 3 and stats["hot_hits"] + stats["cold_reads"] == 50
+        )
+        # the content is only held by the hot tier
+        assert backend.cache.stats()["entries"] == 0
+
+    def test_listings_cached(self, backend):
+        """Listings of artifacts are cached and invalidated by writes."""
+        composite = backend(make_runtime())
+        composite.write("/artifacts/a.md", "a")
+        assert len(composite.ls_info("/artifacts/")) == 1
+        composite.ls_info("/artifacts/")
+        composite.write("/artifacts/b.md", "b")
+        assert len(composite.ls_info("/artifacts/")) == 2
+        assert backend.cache.stats()["hits"] == 1
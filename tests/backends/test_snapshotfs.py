@@ -0,0 +1,433 @@
+"""
+pytest test suite for SnapshotFS
+
+Runs the pyfilesystem2 conformance suite against SnapshotFS and tests the
+sharing behaviour of blobs and snapshots.
+
+Run with: uv run pytest tests/backends/test_snapshotfs.py -v
+"""
+
+import gc
+import os
+import threading
+import time
+import unittest
+
+import pytest
+from fs.test import FSTestCases
+
+from src.backends.chunkstore import ChunkedBlob, ChunkStore
+from src.backends.snapshotfs import (
+    IDLE_COMPRESS_MIN,
+    Blob,
+    CompressedBlob,
+    MappedBlob,
+    SnapshotFS,
+    _Segment,
+)
+
+
+class SlowBuffer(bytearray):
+    """Buffer whose length lookups yield, widening the window of append races."""
+
+    def __len__(self):
+        length = super().__len__()
+        time.sleep(0.01)
+        return length
+
+
+def append_concurrently(blob, parts):
+    """Append each part to the same blob from its own thread, returning the results."""
+    barrier = threading.Barrier(len(parts))
+    results = [None] * len(parts)
+
+    def append(i):
+        barrier.wait()
+        results[i] = blob.append(parts[i])
+
+    threads = [threading.Thread(target=append, args=(i,)) for i in range(len(parts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class TestSnapshotFSConformance(FSTestCases, unittest.TestCase):
+    """pyfilesystem2 FSTestCases run against SnapshotFS."""
+
+    def make_fs(self):
+        return SnapshotFS()
+
+
+class TestMappedSnapshotFSConformance(FSTestCases, unittest.TestCase):
+    """pyfilesystem2 FSTestCases run against SnapshotFS mapping every file."""
+
+    def make_fs(self):
+        return SnapshotFS(mmap_threshold=0)
+
+
+class TestQuotaSnapshotFSConformance(FSTestCases, unittest.TestCase):
+    """pyfilesystem2 FSTestCases run against SnapshotFS with a tiny memory quota."""
+
+    def make_fs(self):
+        return SnapshotFS(memory_quota=16)
+
+
+class TestCompressedSnapshotFSConformance(FSTestCases, unittest.TestCase):
+    """pyfilesystem2 FSTestCases run against SnapshotFS compressing every file."""
+
+    def make_fs(self):
+        return SnapshotFS(compression="zlib", compress_threshold=0)
+
+
+class TestDedupSnapshotFSConformance(FSTestCases, unittest.TestCase):
+    """pyfilesystem2 FSTestCases run against SnapshotFS storing 256 byte chunks."""
+
+    def make_fs(self):
+        return SnapshotFS(chunk_store=ChunkStore(chunk_size=256))
+
+
+class TestBlob:
+    """Tests for append-only shared blobs."""
+
+    def test_append_extends_shared_buffer(self):
+        """Appending to the newest blob reuses its buffer."""
+        blob = Blob.from_bytes(b"abc")
+        longer = blob.append(b"def")
+        assert longer.buffer is blob.buffer
+        assert blob.tobytes() == b"abc"
+        assert longer.tobytes() == b"abcdef"
+
+    def test_append_to_older_blob_copies(self):
+        """Appending to an older blob leaves newer ones intact."""
+        blob = Blob.from_bytes(b"abc")
+        first = blob.append(b"1")
+        second = blob.append(b"2")
+        assert second.buffer is not blob.buffer
+        assert (first.tobytes(), second.tobytes()) == (b"abc1", b"abc2")
+
+    def test_concurrent_appends(self):
+        """Versions appended to one blob from two threads, e.g. by two forks, do not mix."""
+        blob = Blob(SlowBuffer(b"base"), 4)
+        left, right = append_concurrently(blob, [b"-left", b"-right"])
+        assert (left.tobytes(), right.tobytes()) == (b"base-left", b"base-right")
+
+    def test_tobytes_range(self):
+        """Ranges are clamped to the blob size."""
+        blob = Blob.from_bytes(b"abcdef").append(b"gh")
+        assert blob.tobytes(2, 4) == b"cd"
+        assert Blob(blob.buffer, 3).tobytes(1, 100) == b"bc"
+
+
+class TestMappedBlob:
+    """Tests for memory-mapped blobs."""
+
+    def test_append_extends_extent(self, tmp_path):
+        """Appending to the newest blob fills its extent in place once it has room."""
+        blob = MappedBlob.from_chunks([b"ab", b"c"], 3, str(tmp_path))
+        longer = blob.append(b"de")
+        longest = longer.append(b"f")
+        assert longer.extent is not blob.extent
+        assert longest.extent is longer.extent
+        assert (blob.tobytes(), longest.tobytes()) == (b"abc", b"abcdef")
+
+    def test_append_to_older_blob_copies(self, tmp_path):
+        """Appending to an older blob leaves newer ones intact."""
+        blob = MappedBlob.from_chunks([b"abc"], 3, str(tmp_path), capacity=16)
+        first = blob.append(b"1")
+        second = blob.append(b"2")
+        assert first.extent is blob.extent
+        assert second.extent is not blob.extent
+        assert (first.tobytes(), second.tobytes()) == (b"abc1", b"abc2")
+
+    def test_concurrent_appends(self, tmp_path, monkeypatch):
+        """Versions appended to one blob from two threads do not mix."""
+        blob = MappedBlob.from_chunks([b"base"], 4, str(tmp_path), capacity=64)
+        write = _Segment.write
+
+        def slow_write(segment, offset, data):
+            time.sleep(0.01)
+            write(segment, offset, data)
+
+        monkeypatch.setattr(_Segment, "write", slow_write)
+        left, right = append_concurrently(blob, [b"-left", b"-right"])
+        assert (left.tobytes(), right.tobytes()) == (b"base-left", b"base-right")
+
+    def test_empty_blob(self, tmp_path):
+        """Empty content needs no mapping."""
+        blob = MappedBlob.from_chunks([], 0, str(tmp_path))
+        assert len(blob) == 0
+        assert blob.append(b"x").tobytes() == b"x"
+
+    def test_segments_shared(self, tmp_path):
+        """Blobs of one spill directory share a segment until it is full."""
+        blobs = [
+            MappedBlob.from_chunks([b"x" * 10], 10, str(tmp_path)) for _ in range(3)
+        ]
+        assert len({id(blob.extent.segment) for blob in blobs}) == 1
+        assert [blob.extent.offset for blob in blobs] == [0, 10, 20]
+
+    def test_more_files_than_descriptors(self, tmp_path):
+        """Spilling more files than the descriptor limit allows open succeeds."""
+        resource = pytest.importorskip("resource")
+        if not os.path.isdir("/proc/self/fd"):
+            pytest.skip("open descriptors cannot be counted")
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        limit = len(os.listdir("/proc/self/fd")) + 32
+        files = 4 * limit
+        fs = SnapshotFS(mmap_threshold=0, spill_dir=str(tmp_path))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        try:
+            for i in range(files):
+                fs.writebytes(f"/f{i}", b"%d" % i * 1000)
+                fs.appendbytes(f"/f{i}", b"!")
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        assert fs.readbytes("/f7") == b"7" * 1000 + b"!"
+        assert fs.readbytes(f"/f{files - 1}") == b"%d" % (files - 1) * 1000 + b"!"
+
+
+class TestSnapshotFS:
+    """Tests for snapshots and restores."""
+
+    def test_snapshot_is_frozen(self):
+        """Writes after a snapshot are not visible in it."""
+        fs = SnapshotFS()
+        fs.makedirs("/a/b")
+        fs.writebytes("/a/b/f", b"v1")
+        snap = fs.snapshot()
+        fs.writebytes("/a/b/f", b"v2")
+        fs.removetree("/a")
+        assert SnapshotFS(snap).readbytes("/a/b/f") == b"v1"
+
+    def test_restore(self):
+        """Restoring swaps the whole tree back."""
+        fs = SnapshotFS()
+        fs.writebytes("/f", b"v1")
+        snap = fs.snapshot()
+        fs.appendbytes("/f", b"+")
+        fs.writebytes("/g", b"g")
+        fs.restore(snap)
+        assert fs.listdir("/") == ["f"]
+        assert fs.readbytes("/f") == b"v1"
+
+    def test_forks_do_not_interfere(self):
+        """Two filesystems from one snapshot evolve independently."""
+        fs = SnapshotFS()
+        fs.makedir("/d")
+        fs.writebytes("/d/f", b"base")
+        snap = fs.snapshot()
+        left, right = SnapshotFS(snap), SnapshotFS(snap)
+        left.appendbytes("/d/f", b"-left")
+        right.appendbytes("/d/f", b"-right")
+        assert left.readbytes("/d/f") == b"base-left"
+        assert right.readbytes("/d/f") == b"base-right"
+        assert fs.readbytes("/d/f") == b"base"
+
+
+class TestMemoryQuota:
+    """Tests for spilling least recently used files past a memory quota."""
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """The coldest file is spilled once the quota is exceeded."""
+        fs = SnapshotFS(spill_dir=str(tmp_path), memory_quota=20)
+        fs.writebytes("/a", b"a" * 10)
+        fs.writebytes("/b", b"b" * 10)
+        fs.readbytes("/a")
+        fs.writebytes("/c", b"c" * 10)
+        assert fs._node("/b").evicted
+        assert isinstance(fs._node("/a"), Blob)
+        assert fs.memory_stats()["evictions"] == 1
+        assert fs.resident_bytes == 20
+
+    def test_read_pages_file_back_in(self, tmp_path):
+        """Reading a spilled file restores it to memory and counts a miss."""
+        fs = SnapshotFS(spill_dir=str(tmp_path), memory_quota=10)
+        fs.writebytes("/a", b"a" * 10)
+        fs.writebytes("/b", b"b" * 10)
+        assert fs.readbytes("/a") == b"a" * 10
+        assert isinstance(fs._node("/a"), Blob)
+        assert fs._node("/b").evicted
+        stats = fs.memory_stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"]) == (0, 1, 2)
+
+    def test_snapshot_keeps_evicted_content(self, tmp_path):
+        """Evicting a file does not change the snapshot that shares it."""
+        fs = SnapshotFS(spill_dir=str(tmp_path), memory_quota=10)
+        fs.writebytes("/a", b"a" * 10)
+        snap = fs.snapshot()
+        fs.writebytes("/b", b"b" * 10)
+        assert isinstance(snap.root.entries["a"], Blob)
+        fs.restore(snap)
+        assert fs.readbytes("/a") == b"a" * 10
+        assert not fs.exists("/b")
+        assert fs.resident_bytes == 10
+
+    def test_remove_releases_quota(self, tmp_path):
+        """Removed files no longer count against the quota."""
+        fs = SnapshotFS(spill_dir=str(tmp_path), memory_quota=100)
+        fs.makedir("/dir")
+        fs.writebytes("/dir/a", b"a" * 10)
+        fs.writebytes("/b", b"b" * 10)
+        fs.removetree("/dir")
+        fs.remove("/b")
+        assert fs.memory_stats()["resident_files"] == 0
+        assert fs.resident_bytes == 0
+
+
+class TestCompression:
+    """Tests for compressed file storage."""
+
+    def test_large_files_compressed(self):
+        """Files over the threshold are stored compressed and read back intact."""
+        fs = SnapshotFS(compression="lzma", compress_threshold=64)
+        fs.writebytes("/small", b"tiny")
+        fs.writebytes("/large", b"# notes\n" * 100)
+        assert isinstance(fs._node("/small"), Blob)
+        assert isinstance(fs._node("/large"), CompressedBlob)
+        assert fs.readbytes("/large") == b"# notes\n" * 100
+        assert fs.getsize("/large") == 800
+        assert fs.getstoredsize("/large") < 100
+
+    def test_decompression_is_cached(self):
+        """Repeated reads of a compressed file decompress it once."""
+        fs = SnapshotFS(compression="zlib", compress_threshold=0)
+        fs.writebytes("/file", b"abc" * 100)
+        assert fs.getblob("/file") is fs.getblob("/file")
+        stats = fs.memory_stats()
+        assert (stats["decompress_misses"], stats["decompress_hits"]) == (1, 1)
+
+    def test_idle_files_compressed(self, monkeypatch):
+        """Files not accessed for compress_idle seconds are compressed."""
+        clock = [0.0]
+        monkeypatch.setattr("src.backends.snapshotfs.time.monotonic", lambda: clock[0])
+        fs = SnapshotFS(compression="zlib", compress_idle=10)
+        fs.writebytes("/old", b"o" * 1000)
+        clock[0] = 5
+        fs.writebytes("/new", b"n" * 1000)
+        clock[0] = 12
+        fs.readbytes("/new")
+        assert isinstance(fs._node("/old"), CompressedBlob)
+        assert isinstance(fs._node("/new"), Blob)
+        assert fs.compress_cold(0) == 1
+        stats = fs.memory_stats()
+        assert stats["logical_bytes"] == 2000
+        assert stats["stored_bytes"] < 100
+
+    def test_small_files_left_raw(self):
+        """Files below IDLE_COMPRESS_MIN are never compressed when idle."""
+        fs = SnapshotFS(compression="zlib", compress_idle=0)
+        for i in range(50):
+            fs.writebytes(f"/note{i}", b"ab")
+        assert fs.compress_cold(0) == 0
+        stats = fs.memory_stats()
+        assert stats["logical_bytes"] == stats["stored_bytes"] == 100
+
+    def test_incompressible_files_kept_raw(self):
+        """Files that do not shrink stay uncompressed and are not retried."""
+        fs = SnapshotFS(compression="zlib", compress_idle=0)
+        fs.writebytes("/noise", os.urandom(IDLE_COMPRESS_MIN))
+        assert fs.compress_cold(0) == 0
+        assert isinstance(fs._node("/noise"), Blob)
+        assert "/noise" not in fs._accessed
+        assert fs.memory_stats()["stored_bytes"] == IDLE_COMPRESS_MIN
+
+    def test_totals_follow_changes(self):
+        """Logical and stored totals follow writes, removals and restores."""
+        fs = SnapshotFS(compression="zlib", compress_threshold=1000)
+        fs.makedir("/dir")
+        fs.writebytes("/dir/big", b"b" * 1000)
+        fs.writebytes("/small", b"s" * 10)
+        snapshot = fs.snapshot()
+        fs.writebytes("/small", b"s" * 20)
+        fs.removetree("/dir")
+        assert (fs.logical_bytes, fs.stored_bytes) == (20, 20)
+        fs.remove("/small")
+        assert (fs.logical_bytes, fs.stored_bytes) == (0, 0)
+        fs.restore(snapshot)
+        assert fs.logical_bytes == 1010
+        assert fs.stored_bytes == 10 + fs.getstoredsize("/dir/big")
+
+    def test_append_to_compressed_file(self):
+        """Appending to a compressed file keeps its content."""
+        fs = SnapshotFS(compression="zlib", compress_threshold=8)
+        fs.writebytes("/file", b"0123456789")
+        fs.appendbytes("/file", b"ab")
+        assert fs.readbytes("/file") == b"0123456789ab"
+
+
+class TestChunkStore:
+    """Tests for the content-addressed chunk store."""
+
+    def test_identical_content_stored_once(self):
+        """Equal chunks share storage and are counted in the dedup ratio."""
+        store = ChunkStore(chunk_size=4)
+        first = ChunkedBlob.from_bytes(store, b"abcdabcdxy")
+        second = ChunkedBlob.from_bytes(store, b"abcdabcdxy")
+        stats = store.stats()
+        assert stats["chunks"] == 2
+        assert stats["stored_bytes"] == 6
+        assert stats["logical_bytes"] == 20
+        assert stats["dedup_ratio"] == pytest.approx(20 / 6)
+        assert first.tobytes() == second.tobytes() == b"abcdabcdxy"
+
+    def test_chunks_released_with_last_blob(self):
+        """Chunks are dropped once no blob references them."""
+        store = ChunkStore(chunk_size=4)
+        blob = ChunkedBlob.from_bytes(store, b"abcdefgh")
+        other = ChunkedBlob.from_bytes(store, b"abcd")
+        del blob
+        gc.collect()
+        assert store.stats()["chunks"] == 1
+        del other
+        gc.collect()
+        assert store.stats() == {
+            "chunks": 0,
+            "stored_bytes": 0,
+            "logical_bytes": 0,
+            "dedup_ratio": 1.0,
+        }
+
+
+class TestChunkedBlob:
+    """Tests for blobs made of stored chunks."""
+
+    def test_ranges_across_chunks(self):
+        """Byte ranges spanning chunk boundaries are copied out correctly."""
+        data = bytes(range(50))
+        blob = ChunkedBlob.from_bytes(ChunkStore(chunk_size=8), data)
+        for start, end in [(0, 50), (3, 21), (8, 16), (15, 17), (49, 60), (20, 20)]:
+            assert blob.tobytes(start, end) == data[start:end]
+        assert b"".join(blob.iter_chunks()) == data
+
+    def test_append_logs_until_chunk_size(self):
+        """Appended bytes are only hashed and stored once a chunk fills up."""
+        store = ChunkStore(chunk_size=4)
+        blob = ChunkedBlob.from_bytes(store, b"abcdef")
+        longer = blob.append(b"gh")
+        assert store.stats()["chunks"] == 2
+        assert longer.digests == blob.digests
+        longest = longer.append(b"ij")
+        assert store.stats()["chunks"] == 3
+        assert longest.tobytes() == b"abcdefghij"
+        assert longest.tobytes(5, 9) == b"fghi"
+        assert longer.tobytes() == b"abcdefgh"
+        assert blob.tobytes() == b"abcdef"
+
+    def test_diverging_appends(self):
+        """Appends to an older version do not leak into newer ones."""
+        blob = ChunkedBlob.from_bytes(ChunkStore(chunk_size=4), b"ab")
+        first = blob.append(b"cdef")
+        second = blob.append(b"xyzw")
+        assert first.tobytes() == b"abcdef"
+        assert second.tobytes() == b"abxyzw"
+        assert b"".join(second.iter_chunks()) == b"abxyzw"
+
+    def test_concurrent_appends(self):
+        """Versions appended to one blob from two threads do not mix."""
+        store = ChunkStore(chunk_size=8)
+        blob = ChunkedBlob.from_bytes(store, b"base")
+        blob = ChunkedBlob(blob.chunks, blob.n, SlowBuffer(), 0)
+        left, right = append_concurrently(blob, [b"-left", b"-right!!"])
+        assert (left.tobytes(), right.tobytes()) == (b"base-left", b"base-right!!")
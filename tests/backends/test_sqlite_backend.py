@@ -0,0 +1,181 @@
+"""
+pytest test suite for SQLiteBackend
+
+Tests the BackendProtocol operations, namespacing, the indexed grep and
+concurrent access of the SQLite store.
+
+Run with: uv run pytest tests/backends/test_sqlite_backend.py -v
+"""
+
+import re
+import threading
+
+import pytest
+
+from src.backends.sqlite import SQLiteBackend, SQLiteStore, _indexed_literals
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create a fresh SQLiteStore for each test."""
+    store = SQLiteStore(tmp_path / "memories.sqlite3")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def backend(store):
+    """SQLiteBackend over the default namespace of the store."""
+    return SQLiteBackend(store)
+
+
+class TestFiles:
+    """Tests for reading, writing and editing files."""
+
+    def test_write_and_read(self, backend):
+        """Written files read back with line numbers, and are never overwritten."""
+        assert backend.write("/a.md", "hello\nworld").error is None
+        assert "world" in backend.read("/a.md")
+        assert "already exists" in backend.write("/a.md", "again").error
+        assert "not found" in backend.read("/missing.md")
+
+    def test_edit(self, backend):
+        """Edits replace strings in place and report the occurrences."""
+        backend.write("/a.md", "x y x")
+        result = backend.edit("/a.md", "x", "z", replace_all=True)
+        assert result.occurrences == 2
+        assert backend.download_files(["/a.md"])[0].content == b"z y z"
+        assert backend.edit("/a.md", "q", "z").error
+
+    def test_namespaces(self, store):
+        """Backends over different namespaces of a store share no files."""
+        SQLiteBackend(store, "u1").write("/a.md", "one")
+        assert SQLiteBackend(store, "u2").ls_info("/") == []
+        assert SQLiteBackend(store, "u2").write("/a.md", "two").error is None
+
+    def test_persistent(self, tmp_path, backend):
+        """A new store over the same database sees the files."""
+        backend.write("/a.md", "kept")
+        reopened = SQLiteStore(tmp_path / "memories.sqlite3")
+        assert "kept" in SQLiteBackend(reopened).read("/a.md")
+        reopened.close()
+
+
+class TestListing:
+    """Tests for ls_info and glob_info."""
+
+    def test_ls(self, backend):
+        """ls lists the files and subdirectories directly in a directory."""
+        backend.upload_files([("/a.md", b"a"), ("/d/b.md", b"b"), ("/d/e/c.md", b"c")])
+        assert [fi["path"] for fi in backend.ls_info("/")] == ["/a.md", "/d/"]
+        assert [fi["path"] for fi in backend.ls_info("/d")] == ["/d/b.md", "/d/e/"]
+
+    def test_ls_prefix_sibling(self, backend):
+        """Directories sharing a name prefix do not leak into each other."""
+        backend.upload_files([("/d/a.md", b"a"), ("/d0/b.md", b"b"), ("/d-x/c", b"c")])
+        assert [fi["path"] for fi in backend.ls_info("/d/")] == ["/d/a.md"]
+
+    def test_sizes_follow_changes(self, backend):
+        """Listed sizes are the encoded sizes after writes, edits and uploads."""
+        backend.write("/a.md", "héllo")
+        backend.upload_files([("/d/b.md", b"four")])
+        assert [fi["size"] for fi in backend.ls_info("/")] == [6, 0]
+        backend.edit("/a.md", "héllo", "hi")
+        backend.upload_files([("/d/b.md", b"sixsix")])
+        sizes = {fi["path"]: fi["size"] for fi in backend.glob_info("**/*.md")}
+        assert sizes == {"/a.md": 2, "/d/b.md": 6}
+        assert backend.ls_info("/")[0]["size"] == 2
+
+    def test_glob(self, backend):
+        """glob matches relative to the base path, recursing only with **."""
+        backend.upload_files(
+            [("/a.md", b""), ("/d/b.md", b""), ("/d/c.txt", b""), ("/d/e/f.md", b"")]
+        )
+        assert [fi["path"] for fi in backend.glob_info("*.md")] == ["/a.md"]
+        assert sorted(fi["path"] for fi in backend.glob_info("d/*.md")) == ["/d/b.md"]
+        assert sorted(fi["path"] for fi in backend.glob_info("**/*.md", "/d")) == [
+            "/d/b.md",
+            "/d/e/f.md",
+        ]
+
+
+class TestGrep:
+    """Tests for grep_raw."""
+
+    @pytest.fixture
+    def files(self, backend):
+        backend.upload_files(
+            [
+                ("/a.md", b"alpha beta\ngamma"),
+                ("/d/b.txt", b"Beta gamma\nbetamax"),
+                ("/e/c.md", b"delta"),
+            ]
+        )
+        return backend
+
+    @pytest.mark.parametrize(
+        "pattern, expected",
+        [
+            ("beta", [("/a.md", 1), ("/d/b.txt", 2)]),
+            ("beta$", [("/a.md", 1)]),
+            ("(?i)beta", [("/a.md", 1), ("/d/b.txt", 1), ("/d/b.txt", 2)]),
+            ("al|del", [("/a.md", 1), ("/e/c.md", 1)]),
+            ("ga?mma", [("/a.md", 2), ("/d/b.txt", 1)]),
+        ],
+    )
+    def test_matches(self, files, pattern, expected):
+        """Indexed and unindexed patterns match like a scan of every line."""
+        assert [(m["path"], m["line"]) for m in files.grep_raw(pattern)] == expected
+
+    def test_path_and_glob(self, files):
+        """grep is restricted to the path and to file names matching the glob."""
+        assert [m["path"] for m in files.grep_raw("gamma", "/d")] == ["/d/b.txt"]
+        assert [m["path"] for m in files.grep_raw("gamma", "/a.md")] == ["/a.md"]
+        assert [m["path"] for m in files.grep_raw("gamma", glob="*.md")] == ["/a.md"]
+
+    def test_index_follows_edits(self, files):
+        """Edited content is found and the replaced content is not."""
+        files.edit("/e/c.md", "delta", "epsilon")
+        assert files.grep_raw("delta") == []
+        assert [m["path"] for m in files.grep_raw("epsilon")] == ["/e/c.md"]
+
+    def test_indexed_literals(self):
+        """Only literals every match contains are looked up in the index."""
+        assert _indexed_literals(re.compile(r"foo\d+barBaz")) == ["foo", "barbaz"]
+        assert _indexed_literals(re.compile("abcd?")) == ["abc"]
+        assert _indexed_literals(re.compile("abc|xyz")) == []
+        assert _indexed_literals(re.compile("abcdef", re.IGNORECASE)) == []
+
+    def test_invalid_regex(self, backend):
+        """Invalid patterns return an error string."""
+        assert "Invalid regex" in backend.grep_raw("(")
+
+
+class TestConcurrency:
+    """Tests for concurrent access to the store."""
+
+    def test_readers_during_writes(self, backend):
+        """Threads read and grep while another one writes."""
+        errors = []
+
+        def writer():
+            for i in range(200):
+                backend.write(f"/w/{i}.md", f"note {i} needle")
+
+        def reader():
+            try:
+                for _ in range(50):
+                    for m in backend.grep_raw("needle"):
+                        assert m["text"].endswith("needle")
+                    backend.ls_info("/w")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert len(backend.grep_raw("needle")) == 200
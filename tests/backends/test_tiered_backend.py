@@ -0,0 +1,132 @@
+"""
+pytest test suite for TieredBackend
+
+Tests the promotion of frequently read files to the hot tier, their demotion
+when idle or displaced, and consistency of the tiers under writes.
+
+Run with: uv run pytest tests/backends/test_tiered_backend.py -v
+"""
+
+import pytest
+from deepagents.backends import FilesystemBackend
+
+from src.backends.tiered import TieredBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock of the tiered backend."""
+    now = [0.0]
+    monkeypatch.setattr("src.backends.tiered.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def disk(tmp_path):
+    """FilesystemBackend over a temporary directory with a few files."""
+    backend = FilesystemBackend(root_dir=tmp_path, virtual_mode=True)
+    backend.upload_files(
+        [
+            ("/work.md", b"line 1\nline 2\nline 3"),
+            ("/empty.md", b""),
+            ("/papers/p0.txt", b"x" * 90),
+        ]
+    )
+    return backend
+
+
+@pytest.fixture
+def tiered(disk, clock):
+    """TieredBackend over the filesystem backend, promoting on the third access."""
+    return TieredBackend(disk, hot_bytes=400, promote_after=3, half_life=60)
+
+
+def read_n(backend, path, n):
+    """Read a file n times, returning the last result."""
+    for _ in range(n):
+        result = backend.read(path)
+    return result
+
+
+class TestPromotion:
+    """Tests for promoting files to the hot tier."""
+
+    def test_promoted_after_repeated_reads(self, tiered):
+        """A file is promoted on its promote_after-th read and then served hot."""
+        read_n(tiered, "/work.md", 2)
+        assert tiered.stats()["hot_files"] == 0
+        read_n(tiered, "/work.md", 2)
+        stats = tiered.stats()
+        assert stats["promotions"] == 1 and stats["hot_hits"] == 1
+        assert stats["resident_bytes"] == len("line 1\nline 2\nline 3")
+
+    @pytest.mark.parametrize(
+        "path, offset, limit",
+        [
+            ("/work.md", 0, 2000),
+            ("/work.md", 1, 1),
+            ("/work.md", 5, 10),
+            ("/empty.md", 0, 10),
+        ],
+    )
+    def test_hot_reads_match_cold(self, tiered, disk, path, offset, limit):
+        """Reads from the hot tier format like the cold tier."""
+        read_n(tiered, path, 3)
+        assert tiered.stats()["hot_files"] == 1
+        assert tiered.read(path, offset, limit) == disk.read(path, offset, limit)
+
+    def test_large_files_stay_cold(self, disk, clock):
+        """Files larger than a quarter of the hot tier are never promoted."""
+        tiered = TieredBackend(disk, hot_bytes=300, promote_after=1)
+        read_n(tiered, "/papers/p0.txt", 3)
+        assert tiered.stats()["hot_files"] == 0
+
+    def test_colder_files_make_room(self, disk, tiered):
+        """A full tier only admits files hotter than the ones they displace."""
+        disk.upload_files([(f"/papers/p{i}.txt", b"y" * 100) for i in range(1, 6)])
+        for i in range(1, 5):
+            read_n(tiered, f"/papers/p{i}.txt", 3)
+        read_n(tiered, "/papers/p5.txt", 3)
+        assert tiered.stats()["hot_files"] == 4
+        assert tiered.stats()["promotions"] == 4
+        read_n(tiered, "/papers/p5.txt", 1)
+        stats = tiered.stats()
+        assert stats["promotions"] == 5 and stats["demotions"] == 1
+        assert stats["resident_bytes"] == 400
+
+
+class TestDemotion:
+    """Tests for demoting idle files and keeping the tiers consistent."""
+
+    def test_idle_demoted(self, tiered, clock):
+        """Hot files are demoted once their heat decays below demote_below."""
+        read_n(tiered, "/work.md", 3)
+        clock[0] = 60
+        assert tiered.demote_idle() == 0
+        clock[0] = 180
+        assert tiered.demote_idle() == 1
+        read_n(tiered, "/work.md", 1)
+        assert tiered.stats()["hot_hits"] == 0
+
+    def test_idle_demoted_on_access(self, tiered, clock):
+        """Accesses to other files sweep idle hot files."""
+        read_n(tiered, "/work.md", 3)
+        clock[0] = 600
+        tiered.read("/empty.md")
+        assert tiered.stats()["hot_files"] == 0
+
+    def test_edit_updates_hot_copy(self, tiered, disk):
+        """Edits go through to disk and the hot copy follows."""
+        read_n(tiered, "/work.md", 3)
+        assert tiered.edit("/work.md", "line 2", "changed").occurrences == 1
+        assert "changed" in disk.read("/work.md")
+        assert tiered.read("/work.md") == disk.read("/work.md")
+        assert tiered.stats()["hot_files"] == 1
+
+    def test_upload_drops_hot_copy(self, tiered, disk):
+        """Uploads replace the file on disk and drop the stale hot copy."""
+        read_n(tiered, "/work.md", 3)
+        tiered.upload_files([("/work.md", b"new")])
+        assert tiered.stats()["hot_files"] == 0
+        assert "new" in tiered.read("/work.md")
+        assert tiered.download_files(["/work.md"])[0].content == b"new"
@@ -7,9 +7,17 @@ directory operations, pattern matching, and text search.
 Run with: uv run pytest tests/test_virtual_filesystem.py -v
 """
 
+import asyncio
+import os
+import re
+import threading
+
 import pytest
+from fs.errors import FSError
 
 from src.backends.filesystem import VirtualFilesystem
+from src.backends.locks import RWLock
+from src.backends.snapshotfs import Blob, MappedBlob
 
 
 @pytest.fixture
@@ -89,6 +97,17 @@ class TestLs:
         assert "b.txt" in names
         assert len(result) == 2
 
+    def test_builtin_dirs_created_on_first_use(self, vfs):
+        """Built-in directories appear everywhere at once when first written to."""
+        assert vfs.glob("/*/") == []
+        with pytest.raises(FSError):
+            vfs.info("/memories")
+        vfs.mkdir("/artifacts")
+        vfs.write("/memories/m.txt", "m")
+        assert [item["name"] for item in vfs.ls("/")] == ["artifacts", "memories"]
+        assert [r["path"] for r in vfs.glob("/*/")] == ["/artifacts", "/memories"]
+        assert vfs.info("/memories")["type"] == "directory"
+
     def test_ls_with_subdirectory(self, vfs):
         """Subdirectories are included in listing."""
         vfs.mkdir("/subdir")
@@ -104,6 +123,66 @@ class TestLs:
             vfs.ls("/nonexistent")
 
 
+class TestMetadataCache:
+    """Tests for cached info lookups and batched listings."""
+
+    @pytest.fixture
+    def getinfo_calls(self, vfs, monkeypatch):
+        """Count the getinfo calls made on the underlying filesystem."""
+        calls = []
+        getinfo = vfs.fs.getinfo
+
+        def counting_getinfo(path, namespaces=None):
+            calls.append(path)
+            return getinfo(path, namespaces=namespaces)
+
+        monkeypatch.setattr(vfs.fs, "getinfo", counting_getinfo)
+        return calls
+
+    def test_info_cached(self, vfs, getinfo_calls):
+        """Repeated info calls hit the filesystem once."""
+        vfs.write("/file.txt", "abc")
+        getinfo_calls.clear()
+        vfs.info("/file.txt")
+        vfs.info("/file.txt")
+        assert getinfo_calls == []
+
+    def test_write_invalidates_size(self, vfs):
+        """Writes are reflected in cached info."""
+        vfs.write("/file.txt", "abc")
+        assert vfs.info("/file.txt")["size"] == "3.00 B"
+        vfs.write("/file.txt", "de", mode="append")
+        assert vfs.info("/file.txt")["size"] == "5.00 B"
+
+    def test_glob_needs_no_lookups(self, vfs, getinfo_calls):
+        """Glob gets metadata from its walk and fills the cache."""
+        for i in range(5):
+            vfs.write(f"/artifacts/{i}.md", "x" * i)
+        getinfo_calls.clear()
+        results = vfs.glob("/artifacts/*.md")
+        assert [r["size"] for r in results] == [f"{i}.00 B" for i in range(5)]
+        vfs.info("/artifacts/3.md")
+        assert getinfo_calls == []
+
+    def test_ls_reports_sizes(self, vfs):
+        """Listings include name, type and size."""
+        vfs.write("/artifacts/a.txt", "hello")
+        assert vfs.ls("/artifacts") == [
+            {
+                "name": "a.txt",
+                "type": "file",
+                "path": "/artifacts/a.txt",
+                "size": "5.00 B",
+            }
+        ]
+
+    def test_returned_info_is_a_copy(self, vfs):
+        """Mutating a returned dict does not corrupt the cache."""
+        vfs.write("/file.txt", "abc")
+        vfs.info("/file.txt")["size"] = "bogus"
+        assert vfs.info("/file.txt")["size"] == "3.00 B"
+
+
 class TestWrite:
     """Tests for file writing."""
 
@@ -169,6 +248,40 @@ class TestMkdir:
             vfs.mkdir("/mydir")
 
 
+class TestRemove:
+    """Tests for file and directory removal."""
+
+    def test_remove_file(self, vfs):
+        """Removed files disappear from info and glob."""
+        vfs.write("/artifacts/a.md", "x")
+        vfs.info("/artifacts/a.md")
+        vfs.remove("/artifacts/a.md")
+        with pytest.raises(Exception):
+            vfs.info("/artifacts/a.md")
+        assert vfs.glob("/artifacts/**/*.md") == []
+
+    def test_remove_directory_tree(self, vfs):
+        """Removing a directory removes everything below it."""
+        vfs.mkdir("/artifacts/sub")
+        vfs.write("/artifacts/sub/a.md", "needle")
+        vfs.remove("/artifacts/sub")
+        assert vfs.glob("/artifacts/**") == [vfs.info("/artifacts")]
+        assert vfs.grep("needle", "/artifacts") == []
+
+    def test_recreate_after_remove(self, vfs):
+        """A removed path can be written again from scratch."""
+        vfs.write("/artifacts/a.txt", "old\ncontent")
+        vfs.read("/artifacts/a.txt")
+        vfs.remove("/artifacts/a.txt")
+        vfs.write("/artifacts/a.txt", "new")
+        assert vfs.read("/artifacts/a.txt")["total_lines"] == 1
+
+    def test_remove_nonexistent_raises(self, vfs):
+        """FSError raised for nonexistent path."""
+        with pytest.raises(Exception):
+            vfs.remove("/nonexistent")
+
+
 class TestRead:
     """Tests for file reading."""
 
@@ -218,6 +331,32 @@ class TestRead:
         with pytest.raises(Exception):
             vfs.read("/nonexistent.txt")
 
+    def test_read_reports_total_lines(self, vfs):
+        """Total line count is reported for ranged reads."""
+        vfs.write("/file.txt", "line0\nline1\nline2\nline3")
+        result = vfs.read("/file.txt", start=1, end=2)
+        assert result["total_lines"] == 4
+
+    def test_read_range_after_append(self, vfs):
+        """Line index follows appended content."""
+        vfs.write("/file.txt", "line0\nli")
+        vfs.write("/file.txt", "ne1\nline2", mode="append")
+        result = vfs.read("/file.txt", start=1, end=3)
+        assert result["content"] == "line1\nline2"
+        assert result["total_lines"] == 3
+
+    def test_read_range_multibyte_content(self, vfs):
+        """Ranged reads slice on byte offsets of multibyte text."""
+        vfs.write("/file.txt", "αβγ\nδεζ\nηθι")
+        result = vfs.read("/file.txt", start=1, end=2)
+        assert result["content"] == "δεζ"
+
+    def test_read_start_beyond_file(self, vfs):
+        """Start beyond the last line returns empty content."""
+        vfs.write("/file.txt", "line0\nline1")
+        result = vfs.read("/file.txt", start=5)
+        assert result["content"] == ""
+
 
 class TestGlob:
     """Tests for glob pattern matching."""
@@ -247,6 +386,36 @@ class TestGlob:
         assert len(result) == 1
         assert result[0]["name"] == "file.txt"
 
+    def test_glob_recursive_extension(self, vfs):
+        """Recursive extension patterns match at every depth."""
+        vfs.mkdir("/artifacts/a/b")
+        vfs.write("/artifacts/top.md", "x")
+        vfs.write("/artifacts/a/b/deep.md", "x")
+        vfs.write("/artifacts/a/b/deep.txt", "x")
+        vfs.write("/memories/other.md", "x")
+        result = vfs.glob("/artifacts/**/*.md")
+        assert [r["path"] for r in result] == [
+            "/artifacts/a/b/deep.md",
+            "/artifacts/top.md",
+        ]
+
+    def test_glob_directories(self, vfs):
+        """Trailing slash matches directories, trailing ** matches both."""
+        vfs.mkdir("/artifacts/sub")
+        vfs.write("/artifacts/sub/file.txt", "x")
+        assert [r["path"] for r in vfs.glob("/artifacts/*/")] == ["/artifacts/sub"]
+        assert [r["path"] for r in vfs.glob("/artifacts/**")] == [
+            "/artifacts",
+            "/artifacts/sub",
+            "/artifacts/sub/file.txt",
+        ]
+
+    def test_glob_relative_to_cwd(self, vfs):
+        """Relative patterns resolve against the working directory."""
+        vfs.write("/artifacts/a.txt", "x")
+        vfs.cwd = "/artifacts"
+        assert [r["path"] for r in vfs.glob("*.txt")] == ["/artifacts/a.txt"]
+
 
 class TestGrep:
     """Tests for regex search."""
@@ -334,3 +503,856 @@ class TestGrep:
         vfs.write("/file.txt", "hello world")
         results = vfs.grep("world", "/file.txt")
         assert results[0]["match_range"] == [6, 11]
+
+
+class TestTrigramIndex:
+    """Tests for trigram-accelerated grep."""
+
+    @pytest.fixture
+    def indexed_vfs(self):
+        """VirtualFilesystem with the trigram index enabled."""
+        return VirtualFilesystem(trigram_index=True)
+
+    def test_candidates_skip_non_matching_files(self, indexed_vfs):
+        """Only files containing the literal trigrams are candidates."""
+        indexed_vfs.write("/memories/a.md", "quantum field theory")
+        indexed_vfs.write("/memories/b.md", "general relativity")
+        candidates = indexed_vfs._grep_candidates(re.compile("field"))
+        assert candidates == {"/memories/a.md"}
+
+    def test_grep_results_unchanged(self, indexed_vfs):
+        """Indexed grep returns the same matches as a full scan."""
+        indexed_vfs.write("/artifacts/a.txt", "Findme here\nnothing")
+        indexed_vfs.write("/artifacts/b.txt", "nothing")
+        results = indexed_vfs.grep("findme", "/artifacts", ignore_case=True)
+        assert [r["path"] for r in results] == ["/artifacts/a.txt"]
+        assert results[0]["match"] == "Findme"
+
+    def test_append_indexes_boundary_trigrams(self, indexed_vfs):
+        """Trigrams spanning the old and appended content are indexed."""
+        indexed_vfs.write("/file.txt", "entan")
+        indexed_vfs.write("/file.txt", "glement", mode="append")
+        results = indexed_vfs.grep("entanglement", "/file.txt")
+        assert len(results) == 1
+
+    def test_overwrite_drops_old_trigrams(self, indexed_vfs):
+        """Overwritten content is no longer a candidate."""
+        indexed_vfs.write("/file.txt", "boson")
+        indexed_vfs.write("/file.txt", "fermion")
+        assert indexed_vfs._grep_candidates(re.compile("boson")) == set()
+
+    def test_pattern_without_literals_scans_all(self, indexed_vfs):
+        """Patterns without extractable literals fall back to a full scan."""
+        indexed_vfs.write("/file.txt", "cat\ncar")
+        assert indexed_vfs._grep_candidates(re.compile(r"ca[rt]|dog")) is None
+        assert len(indexed_vfs.grep(r"ca[rt]|dog", "/file.txt")) == 2
+
+
+class TestIterGrep:
+    """Tests for streaming grep with limits and output modes."""
+
+    @pytest.fixture
+    def corpus(self, vfs):
+        """A few files with a known number of matches."""
+        vfs.write("/artifacts/a.txt", "foo\nfoo foo")
+        vfs.write("/artifacts/b.txt", "bar")
+        vfs.write("/artifacts/c.txt", "foo")
+        return vfs
+
+    def test_iter_grep_is_lazy(self, corpus):
+        """iter_grep returns a generator."""
+        results = corpus.iter_grep("foo", "/artifacts")
+        assert next(results)["path"] == "/artifacts/a.txt"
+
+    def test_max_results(self, corpus):
+        """Stops after max_results matches."""
+        results = corpus.grep("foo", "/artifacts", max_results=2)
+        assert len(results) == 2
+
+    def test_max_files(self, corpus):
+        """Stops after max_files files have matched."""
+        results = corpus.grep("foo", "/artifacts", max_files=1)
+        assert {r["path"] for r in results} == {"/artifacts/a.txt"}
+        assert len(results) == 3
+
+    def test_files_with_matches_mode(self, corpus):
+        """Only paths of matching files are returned."""
+        results = corpus.grep("foo", "/artifacts", output_mode="files_with_matches")
+        assert results == [{"path": "/artifacts/a.txt"}, {"path": "/artifacts/c.txt"}]
+
+    def test_count_mode(self, corpus):
+        """Match counts per matching file are returned."""
+        results = corpus.grep("foo", "/artifacts", output_mode="count")
+        assert results == [
+            {"path": "/artifacts/a.txt", "count": 3},
+            {"path": "/artifacts/c.txt", "count": 1},
+        ]
+
+
+class TestParallelGrep:
+    """Tests for grep over a worker pool."""
+
+    @pytest.fixture
+    def corpus(self, vfs):
+        """Enough files to spread across workers."""
+        for i in range(12):
+            vfs.write(f"/artifacts/paper{i:02d}.txt", f"abstract {i}\nlemma {i} holds")
+        return vfs
+
+    def test_thread_pool_matches_sequential(self, corpus):
+        """Thread pool results equal sequential results, in path order."""
+        expected = corpus.grep(r"lemma \d+", "/artifacts")
+        results = corpus.grep(r"lemma \d+", "/artifacts", workers=4)
+        assert results == expected
+
+    def test_process_pool_matches_sequential(self, corpus):
+        """Process pool results equal sequential results, in path order."""
+        expected = corpus.grep("abstract", "/artifacts", output_mode="count")
+        results = corpus.grep(
+            "abstract", "/artifacts", output_mode="count", workers=2, executor="process"
+        )
+        assert results == expected
+
+    def test_parallel_respects_max_results(self, corpus):
+        """Early termination keeps the first results in path order."""
+        results = corpus.grep("lemma", "/artifacts", workers=4, max_results=3)
+        assert [r["path"] for r in results] == [
+            "/artifacts/paper00.txt",
+            "/artifacts/paper01.txt",
+            "/artifacts/paper02.txt",
+        ]
+
+
+class TestMultilineGrep:
+    """Tests for whole-buffer grep with matches spanning lines."""
+
+    def test_match_spans_lines(self, vfs):
+        """Patterns can match across a line break."""
+        vfs.write("/file.txt", "see Einstein\net al. 1935\nlater")
+        results = vfs.grep(r"Einstein\s+et al\.", "/file.txt", multiline=True)
+        assert len(results) == 1
+        assert results[0]["line_number"] == 0
+        assert results[0]["end_line_number"] == 1
+        assert results[0]["snippet"] == "see Einstein\net al. 1935"
+
+    def test_line_numbers_from_offsets(self, vfs):
+        """Match offsets map back to line numbers and columns."""
+        vfs.write("/file.txt", "alpha\nbeta\ngamma beta")
+        results = vfs.grep("beta", "/file.txt", multiline=True)
+        assert [r["line_number"] for r in results] == [1, 2]
+        assert results[1]["match_range"] == [6, 10]
+
+    def test_anchors_are_per_line(self, vfs):
+        """^ and $ still anchor at line boundaries."""
+        vfs.write("/file.txt", "x = 1\n# note\ny = 2")
+        results = vfs.grep(r"^#.*$", "/file.txt", multiline=True)
+        assert [r["match"] for r in results] == ["# note"]
+
+    def test_line_window(self, vfs):
+        """Line window extends around all matched lines."""
+        vfs.write("/file.txt", "l0\nl1\nbegin\nend\nl4\nl5")
+        results = vfs.grep(r"begin\nend", "/file.txt", multiline=True, line_window=1)
+        assert results[0]["snippet"] == "l1\nbegin\nend\nl4"
+
+    def test_line_starts_refreshed_after_append(self, vfs):
+        """Cached line starts follow appended content."""
+        vfs.write("/file.txt", "a\nb")
+        vfs.grep("b", "/file.txt", multiline=True)
+        vfs.write("/file.txt", "\nc", mode="append")
+        results = vfs.grep("c", "/file.txt", multiline=True)
+        assert results[0]["line_number"] == 2
+
+
+class TestSnapshots:
+    """Tests for copy-on-write snapshots, restore and fork."""
+
+    def test_restore_rolls_back(self, vfs):
+        """Restoring a snapshot undoes later writes and creations."""
+        vfs.write("/artifacts/a.txt", "v1")
+        snap = vfs.snapshot()
+        vfs.write("/artifacts/a.txt", "v2")
+        vfs.write("/artifacts/b.txt", "new")
+        vfs.restore(snap)
+        assert vfs.read("/artifacts/a.txt")["content"] == "v1"
+        assert [r["name"] for r in vfs.glob("/artifacts/*")] == ["a.txt"]
+
+    def test_append_after_snapshot(self, vfs):
+        """Appends do not leak into a snapshot sharing the content."""
+        vfs.write("/file.txt", "a\nb")
+        vfs.read("/file.txt")
+        snap = vfs.snapshot()
+        vfs.write("/file.txt", "\nc", mode="append")
+        vfs.restore(snap)
+        result = vfs.read("/file.txt")
+        assert (result["content"], result["total_lines"]) == ("a\nb", 2)
+        vfs.write("/file.txt", "\nd", mode="append")
+        assert vfs.read("/file.txt")["content"] == "a\nb\nd"
+
+    def test_fork_is_independent(self, vfs):
+        """Writes on a fork and its origin do not affect each other."""
+        vfs.write("/artifacts/a.txt", "shared")
+        vfs.cwd = "/artifacts"
+        fork = vfs.fork()
+        fork.write("a.txt", "fork")
+        vfs.write("/artifacts/b.txt", "origin")
+        assert vfs.read("/artifacts/a.txt")["content"] == "shared"
+        assert fork.read("/artifacts/a.txt")["content"] == "fork"
+        assert fork.glob("/artifacts/*.txt") == [fork.info("/artifacts/a.txt")]
+
+    def test_fork_shares_untouched_directories(self, vfs):
+        """Only directories on the path of a write are copied."""
+        vfs.write("/memories/m.md", "memory")
+        fork = vfs.fork()
+        fork.write("/artifacts/a.txt", "x")
+        assert fork.fs._root is not vfs.fs._root
+        assert fork.fs._root.entries["memories"] is vfs.fs._root.entries["memories"]
+
+    def test_restore_rebuilds_trigram_index(self):
+        """Indexed grep sees the restored files."""
+        vfs = VirtualFilesystem(trigram_index=True)
+        vfs.write("/artifacts/a.txt", "needle")
+        snap = vfs.snapshot()
+        vfs.write("/artifacts/a.txt", "haystack")
+        vfs.restore(snap)
+        assert [r["path"] for r in vfs.grep("needle", "/")] == ["/artifacts/a.txt"]
+        assert vfs.grep("haystack", "/") == []
+
+
+class TestMmapStorage:
+    """Tests for memory-mapped file storage."""
+
+    @pytest.fixture
+    def mapped_vfs(self, tmp_path):
+        """VirtualFilesystem mapping files of 16 bytes or more."""
+        return VirtualFilesystem(
+            storage="mmap", spill_dir=str(tmp_path), mmap_threshold=16
+        )
+
+    def test_large_files_mapped(self, mapped_vfs):
+        """Only files over the threshold are mapped."""
+        mapped_vfs.write("/artifacts/small.txt", "tiny")
+        mapped_vfs.write("/artifacts/large.txt", "x" * 32)
+        assert isinstance(mapped_vfs.fs.getblob("/artifacts/small.txt"), Blob)
+        assert isinstance(mapped_vfs.fs.getblob("/artifacts/large.txt"), MappedBlob)
+
+    def test_append_moves_file_to_mapping(self, mapped_vfs):
+        """A file growing past the threshold is mapped."""
+        mapped_vfs.write("/file.txt", "line one\n")
+        mapped_vfs.write("/file.txt", "line two\nline three", mode="append")
+        assert isinstance(mapped_vfs.fs.getblob("/file.txt"), MappedBlob)
+        result = mapped_vfs.read("/file.txt", 1, 3)
+        assert result["content"] == "line two\nline three"
+
+    def test_grep_matches_memory_storage(self, vfs, mapped_vfs):
+        """Grep over mapped files returns the same results."""
+        text = "\n".join(
+            f"row {i} {'hit' if i % 3 == 0 else 'miss'}" for i in range(50)
+        )
+        for fs in (vfs, mapped_vfs):
+            fs.write("/artifacts/rows.txt", text)
+        for kwargs in ({}, {"line_window": 1}, {"output_mode": "count"}):
+            assert mapped_vfs.grep("hit", "/artifacts", **kwargs) == vfs.grep(
+                "hit", "/artifacts", **kwargs
+            )
+
+    def test_grep_never_decodes_whole_file(self, vfs, mapped_vfs, monkeypatch):
+        """Merged, parallel and multi-pattern grep scan mapped files a chunk at a time."""
+        # over 1 MiB, so the lines are decoded in several chunks
+        text = "\n".join(
+            f"row {i} {'dark matter' if i % 997 == 0 else 'filler text'} é"
+            for i in range(60_000)
+        )
+        calls = [
+            (
+                "grep",
+                ("matter", "/artifacts"),
+                {"line_window": 1, "merge_context": True},
+            ),
+            (
+                "grep",
+                ("matter", "/artifacts"),
+                {"character_window": 3, "merge_context": True},
+            ),
+            ("grep", ("matter", "/artifacts"), {"workers": 2}),
+            ("grep_many", (["dark", "matter", "row 59"], "/artifacts"), {}),
+            ("grep_many", (["matter", "é"], "/artifacts"), {"output_mode": "count"}),
+        ]
+        vfs.write("/artifacts/rows.txt", text)
+        expected = [getattr(vfs, name)(*args, **kwargs) for name, args, kwargs in calls]
+        mapped_vfs.write("/artifacts/rows.txt", text)
+
+        def readtext(*args, **kwargs):
+            raise AssertionError("whole file decoded")
+
+        monkeypatch.setattr(mapped_vfs.fs, "readtext", readtext)
+        for (name, args, kwargs), result in zip(calls, expected):
+            assert getattr(mapped_vfs, name)(*args, **kwargs) == result
+
+    def test_snapshot_isolates_mapped_appends(self, mapped_vfs):
+        """Appends to a mapped file do not leak into a snapshot."""
+        mapped_vfs.write("/file.txt", "x" * 20)
+        snap = mapped_vfs.snapshot()
+        mapped_vfs.write("/file.txt", "y", mode="append")
+        fork = mapped_vfs.fork(snap)
+        fork.write("/file.txt", "z", mode="append")
+        assert mapped_vfs.read("/file.txt")["content"] == "x" * 20 + "y"
+        assert fork.read("/file.txt")["content"] == "x" * 20 + "z"
+        assert fork.storage == "mmap"
+
+
+class TestMemoryQuota:
+    """Tests for the per-instance memory quota."""
+
+    @pytest.fixture
+    def quota_vfs(self, tmp_path):
+        """VirtualFilesystem holding at most 64 bytes of file content in memory."""
+        return VirtualFilesystem(spill_dir=str(tmp_path), memory_quota=64)
+
+    def test_spilled_files_read_back(self, quota_vfs):
+        """Files spilled past the quota are still readable and greppable."""
+        for i in range(8):
+            quota_vfs.write(f"/artifacts/f{i}.txt", f"line {i}\n" + "x" * 20)
+        assert quota_vfs.fs.resident_bytes <= 64
+        assert quota_vfs.read("/artifacts/f0.txt")["content"].startswith("line 0")
+        assert len(quota_vfs.grep("line", "/artifacts")) == 8
+        stats = quota_vfs.memory_stats()
+        assert stats["evictions"] > 0 and stats["misses"] > 0
+
+    def test_info_reports_quota(self, quota_vfs):
+        """The root info shows the quota and the bytes in memory."""
+        quota_vfs.write("/file.txt", "x" * 32)
+        info = quota_vfs.info("/")
+        assert info["memory_quota"] == "64.00 B"
+        assert info["memory_used"] == "32.00 B"
+        assert "memory_quota" not in VirtualFilesystem().info("/")
+
+    def test_fork_keeps_quota(self, quota_vfs):
+        """Forks enforce the same quota on their own files."""
+        quota_vfs.write("/file.txt", "x" * 32)
+        fork = quota_vfs.fork()
+        assert fork.memory_quota == 64
+        assert fork.memory_stats()["resident_bytes"] == 32
+
+
+class TestCompression:
+    """Tests for transparent compression."""
+
+    @pytest.fixture
+    def zvfs(self):
+        """VirtualFilesystem compressing files of 256 bytes or more."""
+        return VirtualFilesystem(compression="zlib", compress_threshold=256)
+
+    def test_read_and_grep_unchanged(self, vfs, zvfs):
+        """Compressed files read and grep like uncompressed ones."""
+        text = "\n".join(
+            f"- note {i}: {'todo' if i % 4 else 'done'}" for i in range(60)
+        )
+        for fs in (vfs, zvfs):
+            fs.write("/memories/notes.md", text)
+        assert (
+            zvfs.read("/memories/notes.md", 10, 20)["content"]
+            == vfs.read("/memories/notes.md", 10, 20)["content"]
+        )
+        assert zvfs.grep("done", "/memories", line_window=1) == vfs.grep(
+            "done", "/memories", line_window=1
+        )
+
+    def test_info_reports_stored_size(self, zvfs):
+        """Info shows the logical and the compressed size."""
+        zvfs.write("/memories/notes.md", "# heading\n" * 100)
+        info = zvfs.info("/memories/notes.md")
+        assert info["size"] == "1000.00 B"
+        assert info["stored_size"] != info["size"]
+        root = zvfs.info("/")
+        assert root["logical_size"] == "1000.00 B"
+        assert root["stored_size"] == info["stored_size"]
+        assert "stored_size" not in VirtualFilesystem().info("/")
+
+    def test_idle_files_compressed(self):
+        """Notes below the compression threshold are compressed once idle and stay readable."""
+        vfs = VirtualFilesystem(compression="zlib")
+        note = "a note on the hubble tension\n" * 40
+        vfs.write("/memories/a.md", note)
+        assert vfs.fs.compress_cold(0) == 1
+        assert vfs.read("/memories/a.md")["content"] == note
+
+    def test_tiny_notes_left_raw(self, zvfs):
+        """Compressing idle notes of a few bytes never grows memory use."""
+        for i in range(50):
+            zvfs.write(f"/memories/{i}.md", "ok")
+        zvfs.fs.compress_cold(0)
+        stats = zvfs.memory_stats()
+        assert stats["stored_bytes"] == stats["logical_bytes"] == 100
+
+
+class TestDedup:
+    """Tests for content deduplication across filesystems."""
+
+    def test_identical_files_stored_once(self):
+        """The same paper ingested by two threads is stored once."""
+        paper = os.urandom(100_000).hex()
+        first, second = VirtualFilesystem(dedup=True), VirtualFilesystem(dedup=True)
+        before = first.dedup_stats()
+        first.write("/artifacts/paper.md", paper)
+        second.write("/artifacts/copy.md", paper)
+        after = second.dedup_stats()
+        assert after["logical_bytes"] - before["logical_bytes"] == 2 * len(paper)
+        assert after["stored_bytes"] - before["stored_bytes"] == len(paper)
+        assert after["dedup_ratio"] > 1
+        assert second.read("/artifacts/copy.md")["content"] == paper
+        assert VirtualFilesystem().dedup_stats() is None
+
+    def test_grep_and_append(self):
+        """Deduplicated files grep and append like regular ones."""
+        dvfs = VirtualFilesystem(dedup=True)
+        dvfs.write("/memories/log.md", "alpha\nbeta")
+        dvfs.write("/memories/log.md", "\ngamma", mode="append")
+        assert dvfs.read("/memories/log.md")["content"] == "alpha\nbeta\ngamma"
+        matches = dvfs.grep("gamma", "/memories")
+        assert [(m["path"], m["line_number"]) for m in matches] == [
+            ("/memories/log.md", 2)
+        ]
+
+
+class TestBatchOperations:
+    """Tests for read_many and write_many."""
+
+    def test_read_many_matches_read(self, vfs):
+        """Each entry equals the result of read for the same range."""
+        vfs.write("/a.md", "zero\none\ntwo")
+        vfs.write("/b.md", "only")
+        results = vfs.read_many(["/a.md", "/b.md"], [(1, 2), None])
+        assert results == [vfs.read("/a.md", 1, 2), vfs.read("/b.md")]
+
+    def test_read_many_reports_errors(self, vfs):
+        """A missing file yields an error entry, the others are still read."""
+        vfs.write("/a.md", "text")
+        missing, found = vfs.read_many(["/missing.md", "/a.md"])
+        assert missing["path"] == "/missing.md" and "error" in missing
+        assert found["content"] == "text"
+        with pytest.raises(ValueError):
+            vfs.read_many(["/a.md"], [None, None])
+
+    def test_write_many(self, vfs):
+        """All entries are written, honouring their modes."""
+        vfs.write("/log.md", "a")
+        infos = vfs.write_many(
+            [
+                {"path": "/log.md", "content": "b", "mode": "append"},
+                {"path": "/memories/new.md", "content": "fresh"},
+            ]
+        )
+        assert [i["path"] for i in infos] == ["/log.md", "/memories/new.md"]
+        assert vfs.read("/log.md")["content"] == "ab"
+        assert vfs.read("/memories/new.md", 0, 1)["total_lines"] == 1
+
+    def test_write_many_rolls_back(self, vfs):
+        """A failing entry undoes the writes before it."""
+        vfs.write("/log.md", "a")
+        with pytest.raises(FSError):
+            vfs.write_many(
+                [
+                    {"path": "/log.md", "content": "b", "mode": "append"},
+                    {"path": "/missing/dir/x.md", "content": "x"},
+                ]
+            )
+        assert vfs.read("/log.md")["content"] == "a"
+        assert vfs.glob("/**/*.md") == [vfs.info("/log.md")]
+
+
+class TestRWLock:
+    """Tests for the reader-writer lock."""
+
+    def test_readers_share(self):
+        """Readers in different threads hold the lock at the same time."""
+        lock = RWLock()
+        inside = threading.Barrier(2, timeout=5)
+
+        def reader():
+            with lock.read():
+                inside.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not inside.broken
+
+    def test_writer_excludes_readers(self):
+        """A writer waits for readers to leave and readers wait for it."""
+        lock = RWLock()
+        events = []
+        writing = threading.Event()
+
+        def writer():
+            with lock.write():
+                writing.set()
+                events.append("write")
+
+        with lock.read():
+            t = threading.Thread(target=writer)
+            t.start()
+            assert not writing.wait(0.05)
+            events.append("read")
+        t.join()
+        assert events == ["read", "write"]
+
+    def test_reentrancy(self):
+        """The writer may read and write again, a reader may not upgrade."""
+        lock = RWLock()
+        with lock.write():
+            with lock.read(), lock.write():
+                pass
+        with lock.read():
+            with lock.read():
+                pass
+            with pytest.raises(RuntimeError):
+                with lock.write():
+                    pass
+
+
+class TestConcurrency:
+    """Tests for concurrent use of one VirtualFilesystem."""
+
+    def test_concurrent_appends(self, vfs):
+        """Appends from many threads are all applied and indexed."""
+
+        def append(n):
+            for i in range(50):
+                vfs.write("/log.md", f"{n}-{i}\n", mode="append")
+
+        threads = [threading.Thread(target=append, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        result = vfs.read("/log.md")
+        assert result["total_lines"] == 201
+        assert sorted(result["content"].split()) == sorted(
+            f"{n}-{i}" for n in range(4) for i in range(50)
+        )
+
+    def test_grep_during_writes(self, vfs):
+        """Greps running while files grow and disappear never fail."""
+        for i in range(20):
+            vfs.write(f"/f{i}.md", "needle\n" * 10)
+        stop = threading.Event()
+
+        def churn():
+            while not stop.is_set():
+                for i in range(20):
+                    mode = (
+                        "append"
+                        if vfs.read(f"/f{i}.md", 0, 1)["total_lines"] < 50
+                        else "overwrite"
+                    )
+                    vfs.write(f"/f{i}.md", "needle\n", mode=mode)
+                vfs.remove("/f0.md")
+                vfs.write("/f0.md", "needle\n")
+
+        t = threading.Thread(target=churn)
+        t.start()
+        try:
+            for _ in range(20):
+                for match in vfs.grep("needle", "/"):
+                    assert match["snippet"] == "needle"
+        finally:
+            stop.set()
+            t.join()
+
+
+class TestWorkingDirectory:
+    """Tests for per-call and per-session working directories."""
+
+    def test_per_call_cwd(self, vfs):
+        """A cwd argument resolves relative paths without changing vfs.cwd."""
+        vfs.write("notes.md", "text", cwd="/memories")
+        assert vfs.read("/memories/notes.md")["content"] == "text"
+        assert vfs.glob("*.md", cwd="/memories")[0]["path"] == "/memories/notes.md"
+        assert vfs.grep("text", ".", cwd="/memories")[0]["path"] == (
+            "/memories/notes.md"
+        )
+        assert vfs.cwd == "/"
+
+    def test_sessions_are_independent(self, vfs):
+        """Each session resolves relative paths against its own cwd."""
+        memories = vfs.session("/memories")
+        artifacts = vfs.session("/artifacts")
+        memories.write("a.md", "memory")
+        artifacts.write("a.md", "artifact")
+        assert memories.read("a.md")["content"] == "memory"
+        assert artifacts.read("a.md")["content"] == "artifact"
+        assert [e["path"] for e in artifacts.ls(".")] == ["/artifacts/a.md"]
+
+    def test_session_cd(self, vfs):
+        """cd moves a session between directories and rejects files."""
+        session = vfs.session()
+        session.cd("memories")
+        session.write("x.md", "x")
+        assert session.cwd == "/memories"
+        with pytest.raises(FSError):
+            session.cd("x.md")
+        with pytest.raises(FSError):
+            session.cd("/missing")
+        assert vfs.cwd == "/"
+
+
+class TestAsync:
+    """Tests for the async API."""
+
+    def test_async_matches_sync(self, vfs):
+        """aread, awrite, aglob and agrep return what their sync variants do."""
+
+        async def run():
+            await vfs.awrite("/notes.md", "alpha\nbeta")
+            await vfs.awrite("notes.md", "\ngamma", mode="append", cwd="/memories")
+            return (
+                await vfs.aread("/notes.md", 1),
+                await vfs.aglob("**/*.md"),
+                await vfs.agrep("a$", "/", output_mode="files_with_matches"),
+            )
+
+        read, globbed, grepped = asyncio.run(run())
+        assert read == vfs.read("/notes.md", 1)
+        assert globbed == vfs.glob("**/*.md")
+        assert grepped == vfs.grep("a$", "/", output_mode="files_with_matches")
+
+    def test_cancel_event_stops_scan(self, vfs):
+        """iter_grep stops before the next entry once the event is set."""
+        for i in range(3):
+            vfs.write(f"/f{i}.md", "hit\nhit")
+        cancel = threading.Event()
+        found = []
+        for entry in vfs.iter_grep("hit", "/", cancel_event=cancel):
+            found.append(entry)
+            cancel.set()
+        assert len(found) == 1
+
+    def test_cancelled_agrep_stops_scanning(self, vfs, monkeypatch):
+        """Cancelling agrep leaves the files after the current one unscanned."""
+        for i in range(3):
+            vfs.write(f"/f{i}.md", "hit")
+        started, release, finished = (threading.Event() for _ in range(3))
+        scanned = []
+        process_file = vfs._process_file
+        iter_grep = vfs.iter_grep
+
+        def slow_process_file(f, *args, **kwargs):
+            scanned.append(f)
+            started.set()
+            release.wait(5)
+            return process_file(f, *args, **kwargs)
+
+        def tracked_iter_grep(*args, **kwargs):
+            try:
+                yield from iter_grep(*args, **kwargs)
+            finally:
+                finished.set()
+
+        monkeypatch.setattr(vfs, "_process_file", slow_process_file)
+        monkeypatch.setattr(vfs, "iter_grep", tracked_iter_grep)
+
+        async def run():
+            task = asyncio.create_task(vfs.agrep("hit", "/"))
+            await asyncio.to_thread(started.wait, 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        release.set()
+        assert finished.wait(5)
+        assert scanned == ["/f0.md"]
+
+
+class TestChangeFeed:
+    """Tests for the change feed."""
+
+    def test_changes_record_operations(self, vfs):
+        """Each mutation gets the next version and its op and path."""
+        since = vfs.version
+        vfs.write("/a.md")
+        vfs.write("/a.md", "text")
+        vfs.write("/a.md", "more", mode="append")
+        vfs.mkdir("/dir/sub")
+        vfs.write("/dir/sub/b.md", "b")
+        vfs.remove("/dir")
+        changes = vfs.changes(since)
+        assert [c.version for c in changes] == list(range(since + 1, vfs.version + 1))
+        assert [(c.op, c.path) for c in changes] == [
+            ("create", "/a.md"),
+            ("write", "/a.md"),
+            ("append", "/a.md"),
+            ("mkdir", "/dir/sub"),
+            ("write", "/dir/sub/b.md"),
+            ("remove", "/dir/sub/b.md"),
+            ("remove", "/dir"),
+        ]
+        assert vfs.changes(vfs.version) == []
+
+    def test_overflowed_log_asks_for_rescan(self):
+        """Changes that fell out of the ring buffer make changes return None."""
+        vfs = VirtualFilesystem(change_log_size=4)
+        since = vfs.version
+        for i in range(5):
+            vfs.write(f"/{i}.md", "x")
+        assert vfs.changes(since) is None
+        assert [c.path for c in vfs.changes(vfs.version - 2)] == ["/3.md", "/4.md"]
+
+    def test_subscribe(self, vfs):
+        """Subscribers see every change until they unsubscribe."""
+        seen = []
+        unsubscribe = vfs.subscribe(seen.append)
+        vfs.write("/a.md", "x")
+        snapshot = vfs.snapshot()
+        vfs.restore(snapshot)
+        unsubscribe()
+        vfs.write("/b.md", "y")
+        assert [(c.op, c.path) for c in seen] == [("write", "/a.md"), ("restore", "/")]
+
+
+class TestSearch:
+    """Tests for BM25 search."""
+
+    @pytest.fixture
+    def svfs(self):
+        vfs = VirtualFilesystem(search_index=True)
+        vfs.write("/memories/a.md", "dark matter\n\ndark matter detection with axions")
+        vfs.write("/memories/b.md", "string theory\nand branes")
+        vfs.write("/artifacts/c.md", "dark energy")
+        return vfs
+
+    def test_ranks_files_and_passages(self, svfs):
+        """The best file comes first with its best passage and line range."""
+        results = svfs.search("dark matter detection")
+        assert [r["path"] for r in results] == ["/memories/a.md", "/artifacts/c.md"]
+        best = results[0]["passages"][0]
+        assert best["snippet"] == "dark matter detection with axions"
+        assert (best["line_number"], best["end_line_number"]) == (2, 2)
+        assert results[0]["score"] == best["score"] > results[1]["score"]
+        assert [r["path"] for r in svfs.search("dark", "memories", k=5)] == [
+            "/memories/a.md"
+        ]
+
+    def test_follows_writes(self, svfs):
+        """Writes, appends, removes and restores are reflected in results."""
+        snapshot = svfs.snapshot()
+        svfs.write("/memories/b.md", "\n\naxions too", mode="append")
+        svfs.remove("/memories/a.md")
+        assert [r["path"] for r in svfs.search("axions")] == ["/memories/b.md"]
+        svfs.restore(snapshot)
+        assert [r["path"] for r in svfs.search("axions")] == ["/memories/a.md"]
+        assert svfs.fork().search("branes")[0]["path"] == "/memories/b.md"
+
+    def test_requires_index(self, vfs):
+        """search raises without search_index."""
+        with pytest.raises(ValueError):
+            vfs.search("anything")
+
+
+class TestContextMerging:
+    """Tests for merged context blocks and snippet byte caps."""
+
+    def test_same_line_matches_share_block(self, vfs):
+        """Several matches on one line yield a single block."""
+        vfs.write("/file.txt", "foo bar foo baz foo")
+        results = vfs.grep("foo", "/file.txt", merge_context=True)
+        assert len(results) == 1
+        assert results[0]["snippet"] == "foo bar foo baz foo"
+        assert [m["match_range"] for m in results[0]["matches"]] == [
+            [0, 3],
+            [8, 11],
+            [16, 19],
+        ]
+
+    def test_overlapping_windows_merged(self, vfs):
+        """Overlapping and adjacent line windows are merged."""
+        vfs.write("/file.txt", "a\nhit\nb\nhit\nc\nd\ne\nhit")
+        results = vfs.grep("hit", "/file.txt", line_window=1, merge_context=True)
+        assert len(results) == 2
+        assert results[0]["snippet"] == "a\nhit\nb\nhit\nc"
+        assert (results[0]["line_number"], results[0]["end_line_number"]) == (0, 4)
+        assert [m["line_number"] for m in results[0]["matches"]] == [1, 3]
+        assert results[1]["snippet"] == "e\nhit"
+
+    def test_match_range_relative_to_snippet(self, vfs):
+        """Match ranges index into the block snippet."""
+        vfs.write("/file.txt", "x\ny hit\nz")
+        block = vfs.grep("hit", "/file.txt", line_window=1, merge_context=True)[0]
+        start, end = block["matches"][0]["match_range"]
+        assert block["snippet"][start:end] == "hit"
+
+    def test_max_snippet_bytes(self, vfs):
+        """Snippets are cut at the per-file byte cap."""
+        vfs.write("/artifacts/a.txt", "hit one\nhit two\nhit three")
+        vfs.write("/artifacts/b.txt", "hit four")
+        results = vfs.grep("hit", "/artifacts", max_snippet_bytes=10)
+        assert [r["snippet"] for r in results] == ["hit one", "hit", "hit four"]
+        assert results[1]["truncated"] is True
+
+    def test_truncated_block_keeps_fitting_matches(self, vfs):
+        """A truncated block drops matches beyond the cut."""
+        vfs.write("/file.txt", "hit and hit")
+        results = vfs.grep("hit", "/file.txt", merge_context=True, max_snippet_bytes=5)
+        assert results[0]["snippet"] == "hit a"
+        assert len(results[0]["matches"]) == 1
+
+
+class TestGrepMany:
+    """Tests for single-pass multi-pattern search."""
+
+    def test_hits_per_pattern(self, vfs):
+        """Each pattern gets its own list of hits."""
+        vfs.write("/memories/a.md", "dark matter\ndark energy")
+        vfs.write("/memories/b.md", "dark energy")
+        hits = vfs.grep_many(["matter", "energy", "axion"], "/memories")
+        assert [h["path"] for h in hits["matter"]] == ["/memories/a.md"]
+        assert [h["line_number"] for h in hits["energy"]] == [1, 0]
+        assert hits["axion"] == []
+
+    def test_overlapping_patterns(self, vfs):
+        """Overlapping occurrences of different patterns are all found."""
+        vfs.write("/file.txt", "she")
+        hits = vfs.grep_many(["she", "he"], "/file.txt")
+        assert hits["she"][0]["match_range"] == [0, 3]
+        assert hits["he"][0]["match_range"] == [1, 3]
+
+    def test_prefix_and_straddling_patterns(self, vfs):
+        """Patterns sharing a start or straddling another's end are found in one scan."""
+        vfs.write("/file.txt", "dark matter aaaa")
+        patterns = ["dark", "dark matter", "k m", "matter", "aa"]
+        hits = vfs.grep_many(patterns, "/file.txt")
+        assert {p: [h["match_range"] for h in hits[p]] for p in patterns} == {
+            "dark": [[0, 4]],
+            "dark matter": [[0, 11]],
+            "k m": [[3, 6]],
+            "matter": [[5, 11]],
+            "aa": [[12, 14], [14, 16]],
+        }
+
+    def test_ignore_case(self, vfs):
+        """Case insensitive matching keeps original text in matches."""
+        vfs.write("/file.txt", "Hubble Tension")
+        hits = vfs.grep_many(["hubble", "tension"], "/file.txt", ignore_case=True)
+        assert hits["hubble"][0]["match"] == "Hubble"
+        assert hits["tension"][0]["match"] == "Tension"
+
+    def test_count_and_files_modes(self, vfs):
+        """Count and files_with_matches modes summarise per file."""
+        vfs.write("/file.txt", "spin spin\nspin")
+        assert vfs.grep_many(["spin"], "/file.txt", output_mode="count") == {
+            "spin": [{"path": "/file.txt", "count": 3}]
+        }
+        assert vfs.grep_many(
+            ["spin"], "/file.txt", output_mode="files_with_matches"
+        ) == {"spin": [{"path": "/file.txt"}]}
+
+    def test_trigram_index_prunes_files(self):
+        """With the trigram index, results match a full scan."""
+        vfs = VirtualFilesystem(trigram_index=True)
+        vfs.write("/artifacts/a.txt", "neutrino oscillation")
+        vfs.write("/artifacts/b.txt", "gravitational waves")
+        hits = vfs.grep_many(["neutrino", "waves"], "/artifacts")
+        assert [h["path"] for h in hits["neutrino"]] == ["/artifacts/a.txt"]
+        assert [h["path"] for h in hits["waves"]] == ["/artifacts/b.txt"]
@@ -0,0 +1,275 @@
+"""
+pytest test suite for FileSystemToolsMiddleware
+
+Tests the custom tools the middleware adds on top of the deepagents filesystem
+tools, run against a FilesystemBackend rooted in a temporary directory.
+
+Run with: uv run pytest tests/tools/test_filesystem_middleware.py -v
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from deepagents.backends import FilesystemBackend
+
+from src.tools.filesystem import FileSystemToolsMiddleware, _SearchIndexes
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """FilesystemBackend over a fresh temporary directory."""
+    return FilesystemBackend(root_dir=tmp_path, virtual_mode=True)
+
+
+@pytest.fixture
+def get_tool(backend):
+    """Helper to get a middleware tool function by name."""
+    middleware = FileSystemToolsMiddleware(backend=backend)
+
+    def _get(name):
+        return next(t for t in middleware.tools if t.name == name).func
+
+    return _get
+
+
+@pytest.fixture
+def get_coroutine(backend):
+    """Helper to get a middleware tool's async function by name."""
+    middleware = FileSystemToolsMiddleware(backend=backend)
+
+    def _get(name):
+        return next(t for t in middleware.tools if t.name == name).coroutine
+
+    return _get
+
+
+class TestToolSelection:
+    """Tests for custom tool registration."""
+
+    def test_custom_tools_registered(self, backend):
+        """Custom tools are added next to the default ones."""
+        middleware = FileSystemToolsMiddleware(backend=backend)
+        names = [t.name for t in middleware.tools]
+        assert "grep_many" in names
+        assert "execute" not in names
+
+    def test_include_filters_custom_tools(self, backend):
+        """include_tools_by_name also applies to custom tools."""
+        middleware = FileSystemToolsMiddleware(
+            backend=backend, include_tools_by_name=["ls"]
+        )
+        assert [t.name for t in middleware.tools] == ["ls"]
+
+
+class TestGrepManyTool:
+    """Tests for the grep_many tool."""
+
+    @pytest.fixture(autouse=True)
+    def files(self, backend):
+        backend.write("/notes/a.md", "quantum gravity\nloop quantum")
+        backend.write("/b.md", "string theory")
+
+    def test_files_with_matches(self, get_tool):
+        """Default output lists matching files per pattern."""
+        out = get_tool("grep_many")(patterns=["quantum", "axion"], runtime=None)
+        assert out == "quantum:\n  /notes/a.md\naxion: No matches found"
+
+    def test_count(self, get_tool):
+        """Count mode reports occurrences per file."""
+        out = get_tool("grep_many")(
+            patterns=["quantum"], runtime=None, output_mode="count"
+        )
+        assert out == "quantum:\n  /notes/a.md: 2"
+
+    def test_content_with_glob(self, get_tool):
+        """Content mode shows 1-indexed matching lines of filtered files."""
+        out = get_tool("grep_many")(
+            patterns=["theory", "loop"],
+            runtime=None,
+            glob="*.md",
+            path="/",
+            output_mode="content",
+        )
+        assert "  /b.md:1: string theory" in out
+        assert "  /notes/a.md:2: loop quantum" in out
+
+    def test_downloads_in_batches(self, get_tool, backend, monkeypatch):
+        """Files are downloaded and scanned a batch at a time."""
+        monkeypatch.setattr("src.tools.filesystem.GREP_MANY_BATCH", 2)
+        backend.write("/c.md", "quantum foam")
+        batches = []
+        download = backend.download_files
+
+        def download_files(paths):
+            batches.append(len(paths))
+            return download(paths)
+
+        monkeypatch.setattr(backend, "download_files", download_files)
+        out = get_tool("grep_many")(
+            patterns=["quantum"], runtime=None, output_mode="count"
+        )
+        assert batches == [2, 1]
+        assert out == "quantum:\n  /c.md: 1\n  /notes/a.md: 2"
+
+
+class TestReadManyFilesTool:
+    """Tests for the read_many_files tool."""
+
+    @pytest.fixture(autouse=True)
+    def files(self, backend):
+        backend.write("/notes/a.md", "alpha\nbeta")
+        backend.write("/notes/b.md", "gamma")
+
+    def test_reads_all_files(self, get_tool):
+        """Every file is shown under its own header."""
+        out = get_tool("read_many_files")(
+            file_paths=["/notes/a.md", "/notes/b.md"], runtime=None
+        )
+        assert out.startswith("==> /notes/a.md <==\n")
+        assert "==> /notes/b.md <==\n" in out
+        assert "beta" in out and "gamma" in out
+
+    def test_missing_file_reported(self, get_tool):
+        """A missing file is reported without failing the others."""
+        out = get_tool("read_many_files")(
+            file_paths=["/missing.md", "/notes/b.md"], runtime=None
+        )
+        assert "==> /missing.md <==\nError" in out
+        assert "gamma" in out
+
+
+class TestWriteManyFilesTool:
+    """Tests for the write_many_files tool."""
+
+    def test_writes_all_files(self, get_tool, backend):
+        """Each file is created and reported."""
+        out = get_tool("write_many_files")(
+            files=[
+                {"file_path": "/a.md", "content": "one"},
+                {"file_path": "/b.md", "content": "two"},
+            ],
+            runtime=None,
+        )
+        assert out == "Updated file /a.md\nUpdated file /b.md"
+        assert backend.download_files(["/b.md"])[0].content == b"two"
+
+    def test_existing_file_reported(self, get_tool, backend):
+        """A file that already exists is reported and the rest are written."""
+        backend.write("/a.md", "old")
+        out = get_tool("write_many_files")(
+            files=[
+                {"file_path": "/a.md", "content": "new"},
+                {"file_path": "/b.md", "content": "two"},
+            ],
+            runtime=None,
+        )
+        first, second = out.split("\n")
+        assert "already exists" in first
+        assert second == "Updated file /b.md"
+
+
+class TestSearchTool:
+    """Tests for the search tool."""
+
+    @pytest.fixture(autouse=True)
+    def files(self, backend):
+        backend.write("/notes/a.md", "dark matter detection\n\nunrelated text")
+        backend.write("/notes/b.md", "string theory and branes")
+
+    def test_ranks_relevant_file_first(self, get_tool):
+        """The best file and passage are reported with 1-indexed lines."""
+        out = get_tool("search")(query="dark matter", runtime=None)
+        assert out.startswith("/notes/a.md (score ")
+        assert "  lines 1-1 (score " in out
+        assert "    dark matter detection" in out
+        assert "/notes/b.md" not in out
+
+    def test_follows_changes(self, get_tool, backend):
+        """Edited and new files are re-indexed on the next search."""
+        search = get_tool("search")
+        assert search(query="axion", runtime=None) == "No matches found"
+        backend.edit("/notes/b.md", "branes", "axion halos")
+        backend.write("/notes/c.md", "axion")
+        out = search(query="axion halos", runtime=None)
+        assert out.index("/notes/b.md") < out.index("/notes/c.md")
+
+    def test_index_per_graph_thread(self, tmp_path):
+        """Graph threads searching in turn keep their own index."""
+        backends, downloads = {}, []
+        for thread_id in "ab":
+            backend = FilesystemBackend(
+                root_dir=tmp_path / thread_id, virtual_mode=True
+            )
+            for i in range(3):
+                backend.write(f"/f{i}.md", f"{thread_id} axion {i}")
+            download = backend.download_files
+            backend.download_files = lambda paths, d=download: (
+                downloads.append(len(paths)) or d(paths)
+            )
+            backends[thread_id] = backend
+        middleware = FileSystemToolsMiddleware(
+            backend=lambda rt: backends[rt.config["configurable"]["thread_id"]]
+        )
+        search = next(t for t in middleware.tools if t.name == "search").func
+        for thread_id in "abab":
+            runtime = SimpleNamespace(config={"configurable": {"thread_id": thread_id}})
+            assert f"{thread_id} axion" in search(query="axion", runtime=runtime)
+        # every search downloads its stale files, then its hits
+        assert downloads[::2] == [3, 3, 0, 0]
+
+    def test_indexes_evicted(self):
+        """Only the indexes of the most recently searching threads are kept."""
+        indexes = _SearchIndexes(max_indexes=2)
+        runtimes = [
+            SimpleNamespace(config={"configurable": {"thread_id": t}}) for t in "abc"
+        ]
+        first = indexes.get(runtimes[0])
+        indexes.get(runtimes[1])
+        assert indexes.get(runtimes[0]) is first
+        indexes.get(runtimes[2])
+        assert indexes.get(runtimes[0]) is first
+        assert len(indexes._indexes) == 2
+
+
+class TestAsyncTools:
+    """Tests for the async variants of the custom tools."""
+
+    @pytest.fixture(autouse=True)
+    def files(self, backend):
+        backend.write("/notes/a.md", "quantum gravity\nloop quantum")
+        backend.write("/b.md", "string theory")
+
+    def test_grep_many(self, get_tool, get_coroutine):
+        """The async grep_many returns the sync output."""
+        kwargs = dict(patterns=["quantum", "theory"], runtime=None)
+        out = asyncio.run(get_coroutine("grep_many")(**kwargs))
+        assert out == get_tool("grep_many")(**kwargs)
+
+    def test_read_many_files(self, get_tool, get_coroutine):
+        """The async read_many_files returns the sync output, in order."""
+        kwargs = dict(file_paths=["/b.md", "/notes/a.md", "/b.md"], runtime=None)
+        out = asyncio.run(get_coroutine("read_many_files")(**kwargs))
+        assert out == get_tool("read_many_files")(**kwargs)
+        assert out.index("/b.md") < out.index("/notes/a.md")
+
+    def test_write_many_files(self, get_coroutine, backend):
+        """The async write_many_files creates and reports each file."""
+        out = asyncio.run(
+            get_coroutine("write_many_files")(
+                files=[
+                    {"file_path": "/c.md", "content": "one"},
+                    {"file_path": "/b.md", "content": "two"},
+                ],
+                runtime=None,
+            )
+        )
+        first, second = out.split("\n")
+        assert first == "Updated file /c.md"
+        assert "already exists" in second
+
+    def test_search(self, get_tool, get_coroutine):
+        """The async search returns the sync output."""
+        kwargs = dict(query="quantum gravity", runtime=None, path="/notes")
+        out = asyncio.run(get_coroutine("search")(**kwargs))
+        assert out == get_tool("search")(**kwargs)